@@ -0,0 +1,83 @@
+from django.conf import settings
+from functools import lru_cache
+from .models import ApiItem
+from .cache import get_generation, bump_generation
+import time
+
+ACCESS_RESOURCE = 'api_access'
+ACCESS_VERSION_CHECK_INTERVAL = getattr(settings, 'API_ACCESS_VERSION_CHECK_INTERVAL', 5) # MEH: Second between redis version check
+ROLE = 'role'
+EMPLOYEE_LEVEL = 'employee_level'
+EMPTY_KEYS = frozenset()
+
+_access_state = {'version': None, 'checked_at': 0.0} # MEH: Per process version stamp
+
+
+@lru_cache(maxsize=1024)
+def _compile_api_keys(kind, pk):
+    """
+    MEH: Compile api key of 1 Role or Employee-Level to frozenset (1 query for each, per process)
+    """
+    lookup = 'roles' if kind == ROLE else 'employee_levels'
+    return frozenset(ApiItem.objects.filter(**{lookup: pk}).values_list('key', flat=True))
+
+
+def _sync_access_version():
+    """
+    MEH: Check redis version stamp at most once per interval, clear local LRU if other worker changed it
+    """
+    now = time.monotonic()
+    if now - _access_state['checked_at'] < ACCESS_VERSION_CHECK_INTERVAL:
+        return
+    version = get_generation(ACCESS_RESOURCE)
+    _access_state['checked_at'] = now
+    if version != _access_state['version']:
+        _compile_api_keys.cache_clear()
+        _access_state['version'] = version
+
+
+def invalidate_api_access():
+    """
+    MEH: Call when any Role / Employee-Level api items changed -> all workers rebuild their matrix
+    """
+    _access_state['version'] = bump_generation(ACCESS_RESOURCE)
+    _access_state['checked_at'] = time.monotonic()
+    _compile_api_keys.cache_clear()
+
+
+def get_api_keys(kind, pk):
+    """
+    MEH: Get compiled api keys of Role or Employee-Level
+    """
+    if not pk:
+        return EMPTY_KEYS
+    _sync_access_version()
+    return _compile_api_keys(kind, pk)
+
+
+def has_api_access(kind, pk, required_keys):
+    """
+    MEH: 1 set intersection (required keys most be frozenset or set)
+    """
+    if not required_keys:
+        return False
+    return not get_api_keys(kind, pk).isdisjoint(required_keys)
+
+
+def compile_required_api_keys(required_api_keys):
+    """
+    MEH: Convert viewset required_api_keys to {action: frozenset} (at import time)
+    """
+    compiled = {}
+    for action, keys in (required_api_keys or {}).items():
+        if not isinstance(keys, (list, tuple, set, frozenset)):
+            keys = [keys]
+        compiled[action] = frozenset(keys)
+    return compiled
+
+
+def get_action_api_keys(compiled_api_keys, action):
+    """
+    MEH: Keys of action, if not set (or empty) keys of __all__
+    """
+    return compiled_api_keys.get(action) or compiled_api_keys.get('__all__', EMPTY_KEYS)
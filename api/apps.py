@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api.tree import connect_tree_signals
+        connect_tree_signals() # MEH: Cached tree of all MPTT models
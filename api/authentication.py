@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Model
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .cache import get_generation, bump_generation
+from .access import has_api_access, ROLE, EMPLOYEE_LEVEL
+
+User = get_user_model()
+
+PRINCIPAL_RESOURCE = 'principal'
+PRINCIPAL_CACHE_TIMEOUT = 60 * 60 * 24 # MEH: 1 day (invalidate with user/role/employee signals before that)
+
+
+def get_principal_cache_key(user_id):
+    """
+    MEH: Principal snapshot key -> principal:version:user_id
+    """
+    return f'{PRINCIPAL_RESOURCE}:{get_generation(PRINCIPAL_RESOURCE)}:{user_id}'
+
+
+def invalidate_principal(user_id):
+    """
+    MEH: Remove cached snapshot of 1 user (user, employee changed)
+    """
+    cache.delete(get_principal_cache_key(user_id))
+
+
+def invalidate_all_principals():
+    """
+    MEH: New version for all snapshot (role, level api keys changed) with 1 INCR
+    """
+    bump_generation(PRINCIPAL_RESOURCE)
+
+
+def load_full_user(user_id):
+    """
+    MEH: Full User with relation needed in most views (Only when view touch something not in snapshot)
+    """
+    return User.objects.select_related('employee_profile__level', 'role').get(pk=user_id)
+
+
+def build_principal_snapshot(user):
+    """
+    MEH: Compact snapshot of user for authentication & permission (api keys come from access matrix)
+    """
+    level_id = None
+    if user.is_employee:
+        level_id = getattr(getattr(user, 'employee_profile', None), 'level_id', None)
+    return {
+        'id': user.pk,
+        'pk': user.pk,
+        'is_active': user.is_active,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'is_employee': user.is_employee,
+        'role_id': user.role_id,
+        'employee_level_id': level_id,
+    }
+
+
+def get_principal(user_id):
+    """
+    MEH: Get principal from cache (0 query), or build snapshot 1 time & cache it
+    return None if user not exist
+    """
+    cache_key = get_principal_cache_key(user_id)
+    snapshot = cache.get(cache_key)
+    if snapshot is not None:
+        return CachedPrincipal(snapshot)
+    try:
+        user = load_full_user(user_id)
+    except User.DoesNotExist:
+        return None
+    snapshot = build_principal_snapshot(user)
+    cache.set(cache_key, snapshot, timeout=PRINCIPAL_CACHE_TIMEOUT)
+    return CachedPrincipal(snapshot, user=user) # MEH: User already loaded, don't load it again
+
+
+class CachedPrincipal(SimpleLazyObject):
+    """
+    MEH: request.user from cached snapshot,
+    full User object only loaded (1 query) if view touch attribute not in snapshot
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, snapshot, user=None):
+        self.__dict__['_snapshot'] = snapshot
+        super().__init__(lambda: load_full_user(snapshot['id']))
+        if user is not None:
+            self._wrapped = user
+
+    def __getattr__(self, name):
+        snapshot = self.__dict__['_snapshot']
+        if self._wrapped is empty and name in snapshot: # MEH: After load, real User is source of truth
+            return snapshot[name]
+        return super().__getattr__(name)
+
+    def __eq__(self, other):
+        if isinstance(other, CachedPrincipal):
+            return self.pk == other.pk
+        if isinstance(other, Model):
+            return other._meta.concrete_model is User and other.pk == self.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __repr__(self):
+        return f'<CachedPrincipal: {self.pk}>'
+
+    def has_api_permission(self, keys):
+        """
+        MEH: Same as User.has_api_permission with snapshot ids & per process access matrix (no query)
+        """
+        if not keys:
+            return False
+        snapshot = self.__dict__['_snapshot']
+        if snapshot['is_employee']:
+            return has_api_access(EMPLOYEE_LEVEL, snapshot['employee_level_id'], keys)
+        return has_api_access(ROLE, snapshot['role_id'], keys)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    MEH: JWT authentication with user id claim -> cached principal (instead of query User in each request)
+    """
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD not in ('id', 'pk'):
+            return super().get_user(validated_token) # MEH: Need full User anyway
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        principal = get_principal(user_id)
+        if principal is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not principal.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return principal
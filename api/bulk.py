@@ -0,0 +1,119 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.deletion import Collector
+from django.dispatch import Signal
+from mptt.models import MPTTModel
+from .tree import mark_trees_dirty, delayed_tree_maintenance
+import time
+
+post_bulk_update = Signal() # MEH: Sent after 1 UPDATE of a model (qs.update() send no post_save) -> sender, fields, cascade
+
+
+def get_elapsed_ms(started):
+    """
+    MEH: Elapsed time from perf_counter start (ms)
+    """
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def get_model_update_fields(model, update_fields):
+    """
+    MEH: Only real model fields (ignore field that model doesn't have)
+    """
+    concrete_fields = {field.name for field in model._meta.concrete_fields}
+    return {name: value for name, value in update_fields.items() if name in concrete_fields}
+
+
+def bulk_update_querysets(queryset_list, update_fields, update_sub=False):
+    """
+    MEH: 1 UPDATE ... WHERE id IN (...) for each model,
+    per object save only for model that declare bulk_update_with_save = True,
+    subtree cascade of all updated categories merged in 1 tree query,
+    post_bulk_update sent for each model (cache invalidation of save based signals)
+    """
+    report = {}
+    with transaction.atomic():
+        for qs in queryset_list:
+            model = qs.model
+            fields = get_model_update_fields(model, update_fields)
+            if not fields:
+                continue
+            started = time.perf_counter()
+            cascade = update_sub and hasattr(model, 'bulk_update_subcategories_and_items')
+            if getattr(model, 'bulk_update_with_save', False): # MEH: Model with custom save logic on this fields
+                objs = list(qs.all())
+                for obj in objs:
+                    for field_name, field_value in fields.items():
+                        setattr(obj, field_name, field_value)
+                    obj.save(update_fields=list(fields.keys()))
+                updated_count = len(objs)
+            else:
+                updated_count = qs.update(**fields)
+                objs = list(qs.all()) if cascade and updated_count else [] # MEH: Fresh obj with new value for cascade
+            if cascade and objs:
+                model.bulk_update_subcategories_and_items(objs) # MEH: Nested update until the end!
+            if updated_count:
+                post_bulk_update.send(sender=model, fields=fields, cascade=cascade)
+            report[model._meta.label_lower] = {
+                'count': updated_count,
+                'duration_ms': get_elapsed_ms(started),
+            }
+    return report
+
+
+def get_delete_protected_filter(model):
+    """
+    MEH: Rows that delete() of model never allow (model delete_protected_fields, else is_default)
+    None if model has no guard
+    """
+    fields = getattr(model, 'delete_protected_fields', None)
+    if fields is None:
+        fields = ['is_default'] if hasattr(model, 'is_default') else []
+    protected = Q()
+    for field_name in fields:
+        protected |= Q(**{field_name: True})
+    return protected or None
+
+
+def bulk_delete_querysets(queryset_list):
+    """
+    MEH: Plan & run delete of all querysets with 1 deletion collector,
+    skip obj protected in model delete() (is_default, ...), handle M2M child & close MPTT gaps only in affected trees
+    """
+    skipped_ids = []
+    collector = None
+    with transaction.atomic(), delayed_tree_maintenance(): # MEH: Gaps closed 1 time for each tree at the end
+        for qs in queryset_list:
+            model = qs.model
+            if collector is None:
+                collector = Collector(using=qs.db, origin=qs)
+            protected = get_delete_protected_filter(model)
+            if protected is not None: # MEH: In any case, just skipped protected obj (collector don't call delete())
+                ids = list(qs.filter(protected).values_list('id', flat=True))
+                if ids:
+                    skipped_ids.extend(ids)
+                    qs = qs.exclude(id__in=ids)
+            if hasattr(model, 'get_recursive_delete_querysets'): # MEH: M2M child (not deleted with CASCADE)
+                for related_qs in model.get_recursive_delete_querysets(qs):
+                    collector.collect(related_qs)
+            collector.collect(qs)
+        if collector is None:
+            return 0, {}, skipped_ids
+        affected_trees = get_collected_trees(collector)
+        deleted_count, deleted_per_model = collector.delete()
+        for model, tree_ids in affected_trees.items():
+            mark_trees_dirty(model, tree_ids) # MEH: Instead of rebuild all forest (or later in delayed mode)
+    deleted_per_model = {label: count for label, count in deleted_per_model.items() if count}
+    return deleted_count, deleted_per_model, skipped_ids
+
+
+def get_collected_trees(collector):
+    """
+    MEH: tree_id of all MPTT obj in collector (only this trees need gap close after delete)
+    """
+    affected_trees = {}
+    for model, instances in collector.data.items():
+        if issubclass(model, MPTTModel) and instances:
+            tree_attr = model._mptt_meta.tree_id_attr
+            affected_trees.setdefault(model, set()).update(getattr(obj, tree_attr) for obj in instances)
+    return affected_trees
@@ -0,0 +1,128 @@
+from django.core.cache import cache
+from collections import Counter
+import hashlib
+import time
+
+_cache_stats = Counter() # MEH: Per process hit/miss counter (no network round-trip for counting)
+CACHE_STATS_FLUSH_EVERY = 100 # MEH: Push per process counter to shared cache after this count of access
+CACHE_STATS_KINDS = ('hit', 'miss')
+
+
+def get_generation_key(resource):
+    """
+    MEH: Redis key of generation counter for each resource (cache_key)
+    """
+    return f'{resource}:generation'
+
+
+def get_generation(resource):
+    """
+    MEH: Get current generation of resource (create it at first time)
+    """
+    key = get_generation_key(resource)
+    generation = cache.get(key)
+    if generation is None:
+        # MEH: Start from now, so if counter evicted, never reuse the old generation keys
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def get_generations(resources):
+    """
+    MEH: Current generation of many resources with 1 round-trip (missing one created like get_generation)
+    """
+    keys = {get_generation_key(resource): resource for resource in resources}
+    found = cache.get_many(list(keys))
+    return tuple(found[key] if key in found else get_generation(resource) for key, resource in keys.items())
+
+
+def bump_generation(resource):
+    """
+    MEH: Invalidate all cached data of resource with 1 INCR (old keys expire with their own TTL)
+    """
+    key = get_generation_key(resource)
+    try:
+        return cache.incr(key)
+    except ValueError: # MEH: Counter not exist (never used or evicted)
+        generation = time.time_ns()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def get_query_hash(request, vary=None):
+    """
+    MEH: Hash of query params (sorted, so ?a=1&b=2 & ?b=2&a=1 is same) & vary value (like user id)
+    """
+    query_string = '&'.join(f'{key}={value}' for key, value in sorted(request.GET.lists()))
+    if vary is not None:
+        query_string = f'{vary}|{query_string}'
+    return hashlib.md5(query_string.encode()).hexdigest()
+
+
+def build_cache_key(resource, generation, query_hash):
+    """
+    MEH: Full cache key -> resource:generation:query-hash
+    """
+    return f'{resource}:{generation}:{query_hash}'
+
+
+def get_content_etag(content):
+    """
+    MEH: Strong ETag from rendered content (bytes)
+    """
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def get_key_etag(full_cache_key, representation=''):
+    """
+    MEH: Strong ETag from generation cache key (known before serialize anything)
+    """
+    return f'"{hashlib.md5(f"{full_cache_key}:{representation}".encode()).hexdigest()}"'
+
+
+def get_stats_key(resource, kind):
+    """
+    MEH: Shared (all process) counter key of hit or miss for each resource
+    """
+    return f'{resource}:stats:{kind}'
+
+
+def record_cache_access(resource, hit):
+    """
+    MEH: Count hit & miss of each resource (in memory, flushed to shared cache each CACHE_STATS_FLUSH_EVERY access)
+    """
+    _cache_stats[(resource, 'hit' if hit else 'miss')] += 1
+    if _cache_stats.total() >= CACHE_STATS_FLUSH_EVERY:
+        flush_cache_stats()
+
+
+def flush_cache_stats():
+    """
+    MEH: Add counter of this process to shared counters with INCR (atomic between workers) & reset it
+    """
+    pending = dict(_cache_stats)
+    _cache_stats.clear()
+    for (resource, kind), count in pending.items():
+        key = get_stats_key(resource, kind)
+        try:
+            cache.incr(key, count)
+        except ValueError: # MEH: Counter not exist (first flush or evicted)
+            if not cache.add(key, count, timeout=None):
+                cache.incr(key, count)
+
+
+def get_cache_stats(resources):
+    """
+    MEH: Shared hit/miss counter of resources with 1 round-trip -> {resource: {'hit': n, 'miss': n}}
+    """
+    keys = {get_stats_key(resource, kind): (resource, kind) for resource in resources for kind in CACHE_STATS_KINDS}
+    found = cache.get_many(list(keys))
+    stats = {}
+    for key, (resource, kind) in keys.items():
+        stats.setdefault(resource, {'hit': 0, 'miss': 0})[kind] = found.get(key, 0)
+    return stats
+
+
+def reset_cache_stats(resources):
+    cache.delete_many([get_stats_key(resource, kind) for resource in resources for kind in CACHE_STATS_KINDS])
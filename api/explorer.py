@@ -0,0 +1,83 @@
+from django.db.models import Exists, OuterRef
+from django.utils.functional import cached_property
+
+HAS_CHILDREN_ANNOTATION = 'children_exists'
+
+
+def annotate_has_children(queryset, parent_field):
+    """
+    MEH: has_children of each category in SQL (EXISTS sub query) instead of 1 query for each row in serializer
+    """
+    model = queryset.model
+    children = model._default_manager.filter(**{parent_field: OuterRef('pk')})
+    return queryset.annotate(**{HAS_CHILDREN_ANNOTATION: Exists(children)})
+
+
+def resolve_has_children(obj, related_name):
+    """
+    MEH: Annotated value if exist (explorer), else 1 exists query
+    """
+    if hasattr(obj, HAS_CHILDREN_ANNOTATION):
+        return getattr(obj, HAS_CHILDREN_ANNOTATION)
+    return getattr(obj, related_name).exists()
+
+
+def get_stable_queryset(queryset):
+    """
+    MEH: Add pk at the end of ordering -> same row never seen in 2 pages (equal sort_number)
+    """
+    ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+    if not {'pk', '-pk', 'id', '-id'} & set(ordering):
+        ordering.append('pk')
+    return queryset.order_by(*ordering)
+
+
+class ExplorerSequence:
+    """
+    MEH: Categories then items as 1 sequence for Paginator (count & slice in DB),
+    only rows of current page loaded: slice of categories + rest of page from items (2 phase offset)
+    """
+    ordered = True # MEH: Paginator ordered check
+
+    def __init__(self, categories, items):
+        self.categories = get_stable_queryset(categories)
+        self.items = get_stable_queryset(items)
+
+    @cached_property
+    def category_count(self):
+        return self.categories.count()
+
+    @cached_property
+    def item_count(self):
+        return self.items.count()
+
+    def count(self):
+        return self.category_count + self.item_count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            stop = self.count()
+        result = []
+        if start < self.category_count:
+            result.extend(self.categories[start:min(stop, self.category_count)])
+        if stop > self.category_count:
+            item_start = max(start - self.category_count, 0)
+            result.extend(self.items[item_start:stop - self.category_count])
+        return result
+
+
+def serialize_explorer_rows(rows, category_model, category_serializer, item_serializer, context):
+    """
+    MEH: Page rows (categories always before items) -> same mixed data as before
+    """
+    categories = [row for row in rows if isinstance(row, category_model)]
+    items = [row for row in rows if not isinstance(row, category_model)]
+    cat_data = category_serializer(categories, many=True, context=context).data
+    item_data = item_serializer(items, many=True, context=context).data
+    return list(cat_data) + list(item_data)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from api.cache import get_cache_stats, reset_cache_stats, CACHE_STATS_FLUSH_EVERY
+from api.routers import get_combined_router
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counter of cached list endpoints (shared between all workers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Reset counters after show')
+
+    def handle(self, *args, **options):
+        resources = sorted({viewset.cache_key for prefix, viewset, basename in get_combined_router().registry
+                            if getattr(viewset, 'cache_key', None)})
+        stats = get_cache_stats(resources)
+        for resource in resources:
+            hit, miss = stats[resource]['hit'], stats[resource]['miss']
+            total = hit + miss
+            rate = f'{hit / total * 100:.1f}%' if total else '-'
+            self.stdout.write(f'{resource}: hit={hit} miss={miss} rate={rate}')
+        if options['reset']:
+            reset_cache_stats(resources)
+            self.stdout.write(self.style.SUCCESS('Cache stats reset'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Cache stats finished (each worker flush its counter every {CACHE_STATS_FLUSH_EVERY} access, '
+            f'last ones may not counted yet)'
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from api.tree import get_tree_models, verify_tree, close_tree_gaps, rebuild_tree_paths
+from api.models import TreePathModel
+
+
+class Command(BaseCommand):
+    help = 'Verify integrity of all MPTT trees (lft, rght, level, parent) and optionally fix broken trees'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Close gaps & partial rebuild only broken trees')
+        parser.add_argument('--paths', action='store_true',
+                            help='Recompute stored path (titles & ids) of all nodes (old data)')
+
+    def handle(self, *args, **options):
+        broken_count = 0
+        for model in get_tree_models():
+            problems = verify_tree(model)
+            label = model._meta.label
+            if not problems:
+                self.stdout.write(self.style.SUCCESS(f'{label}: OK'))
+                continue
+            broken_count += len(problems)
+            for tree_id, kinds in sorted(problems.items()):
+                self.stdout.write(self.style.WARNING(f'{label}: tree {tree_id} -> {", ".join(sorted(kinds))}'))
+                if not options['fix']:
+                    continue
+                if 'structure' in kinds: # MEH: Rebuild only this tree from parent field
+                    model._tree_manager.partial_rebuild(tree_id)
+                else:
+                    close_tree_gaps(model, [tree_id])
+                self.stdout.write(self.style.SUCCESS(f'{label}: tree {tree_id} fixed'))
+        if options['paths']:
+            for model in get_tree_models():
+                if issubclass(model, TreePathModel):
+                    updated_count = rebuild_tree_paths(model)
+                    self.stdout.write(self.style.SUCCESS(f'{model._meta.label}: {updated_count} path updated'))
+        if broken_count and not options['fix']:
+            self.stdout.write(self.style.ERROR(f'{broken_count} broken tree found (run with --fix)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Tree check finished'))
@@ -1,21 +1,14 @@
 from django.utils.deprecation import MiddlewareMixin
-from django.contrib.auth import get_user_model
+from api.authentication import get_principal
 
-User = get_user_model()
 
 class EnrichUserMiddleware(MiddlewareMixin):
     def process_request(self, request):
         """
-        MEH: Replace request.user with an enriched version with select_related fields.
+        MEH: Replace request.user with cached principal (snapshot),
+        full User with select_related fields only loaded if view need it.
         """
         if request.user.is_authenticated:
-            request.user = (
-                User.objects
-                .select_related(
-                    'employee_profile__level',  # nested
-                    'role',                     # for customer roles
-                    'introducer',               # if needed
-                    'introduce_from'            # if needed
-                )
-                .get(pk=request.user.pk)
-            )
\ No newline at end of file
+            principal = get_principal(request.user.pk)
+            if principal is not None:
+                request.user = principal
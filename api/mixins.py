@@ -14,7 +14,16 @@ from file_manager.images import *
 from typing import Optional, Dict
 from django.db import transaction
 from django.core.cache import cache
-import hashlib
+import time
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from .access import compile_required_api_keys, get_action_api_keys
+from .bulk import bulk_update_querysets, bulk_delete_querysets, get_elapsed_ms
+from .tree import get_tree_forest, resolve_tree_paths
+from .explorer import ExplorerSequence, annotate_has_children, serialize_explorer_rows
+from .cache import get_generation, bump_generation, get_query_hash, build_cache_key, record_cache_access, \
+    get_content_etag, get_key_etag
 
 class CustomModelSerializer(serializers.ModelSerializer):
     """
@@ -128,20 +137,40 @@ class CustomMixinModelViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPagination
     required_api_keys = None # MEH: Override this In each model view set for handle Access
     cache_key = None # MEH: Override this if used cached for list
+    cache_timeout = 60 * 60 * 24 # MEH: Override this for list cache TTL (Default 1 day!)
+    cache_per_user = False # MEH: Set True if list queryset depend on request user
+    cache_rendered = False # MEH: Set True for cache final JSON bytes (skip serializer & renderer on hit)
+    conditional_actions = ['list', 'retrieve', 'tree'] # MEH: ETag & 304 support (+ all *_explore_view actions)
+    last_modified_fields = ['last_update', 'last_change_date'] # MEH: Model fields used for Last-Modified
+
+    compiled_api_keys = {} # MEH: Auto set from required_api_keys -> {action: frozenset}
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        MEH: Compile required api keys of each viewset 1 time (at import time)
+        """
+        super().__init_subclass__(**kwargs)
+        cls.compiled_api_keys = compile_required_api_keys(cls.required_api_keys)
 
     def get_required_api_key(self):
         """
         MEH: get required key for check in permission class
         """
-        return self.required_api_keys.get(self.action) or self.required_api_keys.get('__all__')
+        return get_action_api_keys(self.compiled_api_keys, self.action)
 
     def get_cache_key(self, request):
         """
-        MEH: for pagination & filtering cached
+        MEH: for pagination & filtering cached -> resource:generation:query-hash
         """
-        query_string = request.GET.urlencode()
-        hashed = hashlib.md5(query_string.encode()).hexdigest()
-        return f"{self.cache_key}_{hashed}"
+        vary = request.user.pk if self.cache_per_user else None
+        return build_cache_key(self.cache_key, get_generation(self.cache_key), get_query_hash(request, vary=vary))
+
+    def invalidate_list_cache(self):
+        """
+        MEH: Invalidate all cached list of this resource (1 INCR instead of scan keys)
+        """
+        if self.cache_key:
+            bump_generation(self.cache_key)
 
     def throttled(self, request, wait):
         from rest_framework.exceptions import Throttled
@@ -180,25 +209,115 @@ class CustomMixinModelViewSet(viewsets.ModelViewSet):
         except ValueError:
             raise NotFound(TG_EXPECTED_ID_NUMBER)
 
-    def list(self, request, timeout=60 * 60 * 24, *args, **kwargs):
+    @staticmethod
+    def get_lookup_id(lookup_value):
+        """
+        MEH: ID of url as int before any query or cache key (NotFound like get_object)
+        """
+        try:
+            return int(lookup_value)
+        except (TypeError, ValueError):
+            raise NotFound(TG_EXPECTED_ID_NUMBER)
+
+    def list(self, request, *args, **kwargs):
         """
         MEH: Override list (GET) ViewSet logic for Cached data
         """
         if self.cache_key:
             full_cache_key = self.get_cache_key(request) # MEH: different cache key for different request
+            renderer = getattr(request, 'accepted_renderer', None)
+            etag = get_key_etag(full_cache_key, getattr(renderer, 'format', ''))
+            not_modified = get_conditional_response(request, etag=etag) # MEH: 304 before touch any data
+            if not_modified is not None:
+                return not_modified
+            if self.cache_rendered and self.is_json_request(request):
+                return self.rendered_cached_list(request, full_cache_key, etag, *args, **kwargs)
             cached_data = cache.get(full_cache_key)
-            if cached_data:
-                return Response(cached_data)
+            record_cache_access(self.cache_key, hit=cached_data is not None)
+            if cached_data is not None: # MEH: Empty list is valid cache too
+                return Response(cached_data, headers={'ETag': etag})
             res = super().list(request, *args, **kwargs)
-            cache.set(self.cache_key, res.data, timeout=timeout) # MEH: Default 1 day!
+            cache.set(full_cache_key, res.data, timeout=self.cache_timeout)
+            res['ETag'] = etag
             return res
         return super().list(request, *args, **kwargs)
 
+    @staticmethod
+    def is_json_request(request):
+        """
+        MEH: Rendered cache only for JSON renderer (not Browsable API)
+        """
+        renderer = getattr(request, 'accepted_renderer', None)
+        return getattr(renderer, 'format', None) == 'json'
+
+    def rendered_cached_list(self, request, full_cache_key, etag, *args, **kwargs):
+        """
+        MEH: Cache final rendered JSON bytes with ETag & Content-Type,
+        on hit return raw HttpResponse without serializer, renderer & content negotiation again
+        """
+        rendered_cache_key = f'{full_cache_key}:rendered'
+        cached = cache.get(rendered_cache_key)
+        record_cache_access(self.cache_key, hit=cached is not None)
+        if cached is not None:
+            return HttpResponse(cached['content'], content_type=cached['content_type'], headers={'ETag': cached['etag']})
+        res = super().list(request, *args, **kwargs)
+
+        def store_rendered(response): # MEH: Run after render, so content is final bytes
+            if response.status_code == status.HTTP_200_OK:
+                response['ETag'] = etag
+                cache.set(rendered_cache_key, {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'etag': etag,
+                }, timeout=self.cache_timeout)
+
+        res.add_post_render_callback(store_rendered)
+        return res
+
     def retrieve(self, request, *args, **kwargs):
         """
-        MEH: for override retrieve (GET) ViewSet logic, noting change for now
+        MEH: for override retrieve (GET) ViewSet logic, with custom get for handle Last-Modified
+        """
+        return self.custom_get(self.get_object())
+
+    def is_conditional_request(self, request):
+        """
+        MEH: Check ETag & 304 only for safe read actions
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        return self.action in self.conditional_actions or str(self.action).endswith('_explore_view')
+
+    def get_last_modified(self, instance):
+        """
+        MEH: Get Last-Modified timestamp of obj (if model has last update field)
         """
-        return super().retrieve(request, *args, **kwargs)
+        for field_name in self.last_modified_fields:
+            value = getattr(instance, field_name, None)
+            if value is not None:
+                return int(value.timestamp())
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        MEH: Add strong ETag (content hash) after render & return 304 if client has same content
+        """
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == status.HTTP_200_OK and self.is_conditional_request(request):
+            response.add_post_render_callback(lambda res: self.get_conditional_content_response(request, res))
+        return response
+
+    @staticmethod
+    def get_conditional_content_response(request, response):
+        """
+        MEH: Compare rendered content ETag (or generation ETag if set before) with If-None-Match
+        """
+        if response.status_code != status.HTTP_200_OK:
+            return None
+        if not response.has_header('ETag'):
+            response['ETag'] = get_content_etag(response.content)
+        last_modified = parse_http_date_safe(response['Last-Modified']) if response.has_header('Last-Modified') else None
+        return get_conditional_response(request, etag=response['ETag'], last_modified=last_modified, response=response)
 
     def create(self, request, *args, **kwargs): # MEH: override ->
         """
@@ -241,8 +360,18 @@ class CustomMixinModelViewSet(viewsets.ModelViewSet):
             if page is not None:
                 serializer = self.get_serializer(page, many=True)
                 return self.get_paginated_response(serializer.data)
+        last_modified = None
+        if not is_many and self.request.method in ('GET', 'HEAD'):
+            last_modified = self.get_last_modified(data)
+            if last_modified is not None: # MEH: If-Modified-Since check before serialize
+                not_modified = get_conditional_response(self.request, last_modified=last_modified)
+                if not_modified is not None:
+                    return not_modified
         serializer = self.get_serializer(data, many=is_many)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        res = Response(serializer.data, status=status.HTTP_200_OK)
+        if last_modified is not None:
+            res['Last-Modified'] = http_date(last_modified)
+        return res
 
     def custom_create(self, request, many=False, response_data_back=None, full_data=None, **kwargs):
         """
@@ -356,59 +485,39 @@ class CustomMixinModelViewSet(viewsets.ModelViewSet):
             raise NotFound(TG_DATA_EMPTY)
         return update_field
 
-    @staticmethod
-    def custom_list_destroy(queryset_list: list):
+    def custom_list_destroy(self, queryset_list: list):
         """
-        MEH: Handle bulk delete list of object with 1 request
+        MEH: Handle bulk delete list of object with 1 request (1 deletion collector for all list)
         """
-        total_delete = 0
-        skipped_ids = []
         try:
-            with transaction.atomic():
-                for qs in queryset_list:
-                    model = qs.model
-                    if hasattr(model, 'is_default'): # MEH: In any case, just skipped is_default
-                        default_objs = qs.filter(is_default=True)
-                        if default_objs.exists():
-                            ids = list(default_objs.values_list('id', flat=True))
-                            skipped_ids.extend(ids)
-                            qs = qs.exclude(id__in=ids)
-                    if not qs.exists():
-                        continue
-                    # if model.delete is models.Model.delete: # MEH: Safe to do bulk delete
-                    #     deleted_count, _ = qs.delete()
-                    #     total_delete += deleted_count
-                    # else: # MEH: Delete obj 1 by 1 (for M2M sub child)
-                    for obj in qs:
-                        sub_delete, _ = obj.delete()
-                        total_delete += sub_delete
+            total_delete, deleted_per_model, skipped_ids = bulk_delete_querysets(queryset_list)
+        except ProtectedError: # Model on_delete=PROTECT
+            raise PermissionDenied(TG_PREVENT_DELETE_PROTECTED)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         if total_delete == 0:
             return Response({"detail": TG_DATA_NOT_FOUND}, status=status.HTTP_400_BAD_REQUEST)
-        return Response({"detail": TG_DATA_DELETED, "deleted_count": total_delete, "skipped_ids": skipped_ids,}, status=status.HTTP_200_OK)
+        self.invalidate_list_cache()
+        return Response({"detail": TG_DATA_DELETED, "deleted_count": total_delete, "models": deleted_per_model,
+                         "skipped_ids": skipped_ids,}, status=status.HTTP_200_OK)
 
-    @staticmethod
-    def custom_list_update(queryset_list: list, update_fields: dict, update_sub=False):
+    def custom_list_update(self, queryset_list: list, update_fields: dict, update_sub=False):
         """
         MEH: Handle bulk update list of fields in list of object with 1 request,
-        for simplify, handle here instead of ListSerializer update method
+        for simplify, handle here instead of ListSerializer update method (1 UPDATE for each model)
         """
+        started = time.perf_counter()
         try:
-            with transaction.atomic():
-                for qs in queryset_list:
-                    if not qs.exists():
-                        continue
-                    for obj in qs:
-                        for field_name, field_value in update_fields.items():
-                            if hasattr(obj, field_name):
-                                setattr(obj, field_name, field_value)
-                        obj.save(update_fields=list(update_fields.keys()))
-                        if update_sub and hasattr(obj, 'update_all_subcategories_and_items'):
-                            obj.update_all_subcategories_and_items() # MEH: Nested update until the end!
+            report = bulk_update_querysets(queryset_list, update_fields, update_sub=update_sub)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        return Response({"detail": TG_DATA_UPDATED}, status=status.HTTP_200_OK)
+        self.invalidate_list_cache()
+        return Response({
+            "detail": TG_DATA_UPDATED,
+            "updated_count": sum(item['count'] for item in report.values()),
+            "models": report,
+            "duration_ms": get_elapsed_ms(started),
+        }, status=status.HTTP_200_OK)
 
     @staticmethod
     def get_parent_with_id(request, category_model):
@@ -458,14 +567,17 @@ class CustomMixinModelViewSet(viewsets.ModelViewSet):
         if type_param:
             types = type_param.split(',')
             items = items.filter(type__in=types)
-        cat_data = category_serializer(categories, many=True, context={'request': request}).data
-        item_data = item_serializer(items, many=True, context={'request': request}).data
-        if paginate:
-            combined = list(cat_data) + list(item_data)
+        categories = annotate_has_children(categories.select_related(parent_field), parent_field) # MEH: No query for each row
+        sequence = ExplorerSequence(categories, items)
+        context = {'request': request}
+        if paginate: # MEH: Count & slice in DB, only rows of this page loaded
             paginator = PageNumberPagination()
             paginator.page_size = 50
-            paginated = paginator.paginate_queryset(combined, request)
-            return paginator.get_paginated_response(paginated)
+            paginated = paginator.paginate_queryset(sequence, request)
+            data = serialize_explorer_rows(paginated, category_model, category_serializer, item_serializer, context)
+            return paginator.get_paginated_response(data)
+        cat_data = category_serializer(sequence.categories, many=True, context=context).data
+        item_data = item_serializer(sequence.items, many=True, context=context).data
         return Response(cat_data + item_data, status=status.HTTP_200_OK)
 
     def perform_create(self, serializer, **kwargs):
@@ -474,8 +586,7 @@ class CustomMixinModelViewSet(viewsets.ModelViewSet):
         """
         with transaction.atomic(): # MEH: With transaction if anything wrong, Everything in DB roll back to first place
             res = serializer.save(**kwargs)
-        if self.cache_key:
-            cache.delete_pattern(f'{self.cache_key}*')
+        self.invalidate_list_cache()
         return res
 
     def perform_update(self, serializer, **kwargs):
@@ -484,8 +595,7 @@ class CustomMixinModelViewSet(viewsets.ModelViewSet):
         """
         with transaction.atomic():
             res = serializer.save(**kwargs)
-        if self.cache_key:
-            cache.delete_pattern(f'{self.cache_key}*') # MEH: Delete all cache begin with this key
+        self.invalidate_list_cache() # MEH: New generation, old cache never read again
         return self.get_serializer(res).data
 
     def perform_destroy(self, instance):
@@ -494,8 +604,7 @@ class CustomMixinModelViewSet(viewsets.ModelViewSet):
         """
         with transaction.atomic():
             res = instance.delete()
-        if self.cache_key:
-            cache.delete_pattern(f'{self.cache_key}*')
+        self.invalidate_list_cache()
         return res
 
 
@@ -525,3 +634,58 @@ class CustomBulkListSerializer(serializers.ListSerializer):
         else:
             self._errors = {}
         return not bool(errors)
+
+
+class CustomTreeListSerializer(serializers.ListSerializer):
+    """
+    MEH: Build MPTT tree with 1 query in memory (cached for each tree generation) instead of query for each node
+    most be set in tree serializer Meta -> list_serializer_class = CustomTreeListSerializer (& tree_label_field)
+    """
+    def to_representation(self, data):
+        meta = self.child.Meta
+        forest = get_tree_forest(meta.model, getattr(meta, 'tree_label_field', 'title'), list(meta.fields))
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        node_ids = [obj.pk for obj in iterable]
+        nodes = {}
+        stack = list(forest)
+        while stack: # MEH: Index all nodes (roots are most common, but any node can be asked)
+            node = stack.pop()
+            nodes[node['id']] = node
+            stack.extend(node.get('children', []))
+        return [nodes[pk] for pk in node_ids if pk in nodes]
+
+
+class CustomSlugPathListSerializer(serializers.ListSerializer):
+    """
+    MEH: Path of parent node of all rows with 1 query (no select_related of node for each row)
+    most be set in serializer Meta -> list_serializer_class = CustomSlugPathListSerializer (& slug_path_model, slug_path_source)
+    child read it with get_context_path(obj)
+    """
+    def to_representation(self, data):
+        meta = self.child.Meta
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        rows = list(iterable)
+        node_ids = {get_slug_path_node_id(obj, meta.slug_path_source) for obj in rows}
+        node_ids.discard(None)
+        self.context['tree_paths'] = resolve_tree_paths(meta.slug_path_model, node_ids)
+        return super().to_representation(rows)
+
+
+def get_slug_path_node_id(obj, source):
+    """
+    MEH: Node id from dotted source (parent_category_id, product.parent_category_id)
+    """
+    for attr in source.split('.'):
+        obj = getattr(obj, attr, None)
+    return obj
+
+
+def get_context_path(serializer, obj):
+    """
+    MEH: Path titles of parent node of obj resolved by CustomSlugPathListSerializer,
+    None for single obj (not many) -> caller load it from node
+    """
+    paths = serializer.context.get('tree_paths')
+    if paths is None:
+        return None
+    return paths.get(get_slug_path_node_id(obj, serializer.Meta.slug_path_source), [])
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core import validators
+from .tree import refresh_subtree_paths
 
 
 class ApiCategory(models.Model):
@@ -36,3 +37,39 @@ class ApiItem(models.Model):
 
     def __str__(self):
         return f'{self.key}'
+
+
+class TreePathModel(models.Model):
+    """
+    MEH: Abstract for MPTT models -> stored path (titles & ids from root until self) on each node,
+    refreshed in bulk for subtree on rename or move (no get_ancestors query for each row)
+    """
+    path_titles = models.JSONField(default=list, blank=True, editable=False, verbose_name='Path Titles')
+    path_ids = models.JSONField(default=list, blank=True, editable=False, verbose_name='Path IDs')
+
+    path_label_field = 'title' # MEH: Override with name field of node
+
+    class Meta:
+        abstract = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._original_path_state = self.get_path_state()
+
+    def get_path_state(self):
+        parent_attname = self._meta.get_field(self._mptt_meta.parent_attr).attname
+        return self.__dict__.get(self.path_label_field), self.__dict__.get(parent_attname) # MEH: No query for deferred
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        path_state = self.get_path_state()
+        if path_state != self._original_path_state or not self.path_ids: # MEH: New, renamed or moved
+            refresh_subtree_paths(self)
+            self._original_path_state = path_state
+
+    def get_slug_path(self, separator=' - '):
+        if self.path_titles:
+            return separator.join(self.path_titles)
+        return separator.join( # MEH: Path not stored yet (old data)
+            [getattr(node, self.path_label_field) for node in self.get_ancestors(include_self=True)]
+        )
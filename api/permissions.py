@@ -1,6 +1,7 @@
 from rest_framework import permissions
 from rest_framework.exceptions import PermissionDenied
 from .responses import TG_PERMISSION_DENIED
+from .access import compile_required_api_keys, get_action_api_keys
 
 
 class ApiAccess(permissions.BasePermission):
@@ -10,10 +11,10 @@ class ApiAccess(permissions.BasePermission):
     def has_permission(self, request, view): # MEH: Check permission before get_queryset and get_object
         if view.action is None:
             return True
-        required_keys = getattr(view, 'required_api_keys', {}).get(view.action) or \
-                        getattr(view, 'required_api_keys', {}).get('__all__', [])
-        if not isinstance(required_keys, list):
-            required_keys = [required_keys]
+        compiled_api_keys = getattr(view, 'compiled_api_keys', None) # MEH: Compiled at import time in viewset
+        if compiled_api_keys is None:
+            compiled_api_keys = compile_required_api_keys(getattr(view, 'required_api_keys', None))
+        required_keys = get_action_api_keys(compiled_api_keys, view.action)
         if 'allow_any' in required_keys: # MEH: Set action key (allow_any) -> Show to any User even not authenticated
             return True
         if request.user.is_authenticated: # MEH: If There is a key except (allow_any), so User most be authenticated
@@ -40,6 +40,7 @@ TG_MAX_IMAGE_DIMENSIONS = 'حداکثر ابعاد تصویر قبول: '
 TG_UNSUPPORTED_FORMAT = 'عدم پشتیبانی فرمت: '
 TG_INVALID_IMAGE = 'تصویر ارسالی مشکل دارد!'
 TG_PREVENT_CIRCULAR_CATEGORY = 'نمی توان زیرمجموعه دسته زیرمجموعه شد!'
+TG_PREVENT_CIRCULAR_OPTION = 'وابستگی آپشن ها چرخشی است!'
 TG_WRONG_REPEAT_PASSWORD = 'تکرار رمز عبور همخوانی ندارد!'
 TG_PASSWORD_SET = 'رمز عبور جدید با موفقیت ثبت شد.'
 TG_PASSWORD_CHANGED = 'رمز عبور با موفقیت تغییر کرد.'
@@ -52,6 +53,11 @@ TG_WAIT_FOR_RESPONSE = 'لطفا منتظر پاسخ بمانید'
 TG_MESSAGE_CLOSED = 'این گفت و گو بسته شده است.'
 TG_DATA_SET = 'با موفقیت ثبت شد.'
 TG_SIGN_OUT = 'با موفقیت خارج شدید'
+TG_JOB_QUEUED = 'درخواست در صف پردازش قرار گرفت.'
+TG_EXPORT_JOB_TIMEOUT = 'زمان ساخت فایل به پایان رسید، دوباره درخواست دهید.'
+TG_EXPORT_NOT_READY = 'فایل خروجی آماده نیست یا منقضی شده است!'
+TG_FORMULA_INVALID = 'فرمول وارد شده معتبر نیست!'
+TG_PDF_FONT_MISSING = 'فونت فارسی برای ساخت PDF تنظیم نشده است!'
 
 from rest_framework.renderers import JSONRenderer
 
@@ -25,6 +25,13 @@ class BulkListSerializer(serializers.Serializer):
     ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, required=True)
 
 
+class CopyListWithIdSerializer(BulkListSerializer):
+    """
+    MEH: Get a list of IDs for copy all of them (and optional new parent ID for copies)
+    """
+    parent_id = serializers.IntegerField(allow_null=True, required=False)
+
+
 class CombineBulkDeleteSerializer(serializers.Serializer):
     """
     MEH: Get 2 list of IDs for bulk delete
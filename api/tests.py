@@ -1,3 +1,179 @@
-from django.test import TestCase
+from django.db.models.deletion import Collector
+from django.test import TestCase, override_settings
+from product.models import ProductCategory, Product, ProductStatus, ProductType, PriceListCategory, PriceListTable
+from user.models import Role
+from .bulk import bulk_update_querysets, bulk_delete_querysets, post_bulk_update
+from .tree import verify_tree, close_tree_gaps, mark_trees_dirty, delayed_tree_maintenance, get_cascade_ids
 
-# Create your tests here.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}} # MEH: No redis in tests
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkUpdateTest(TestCase):
+    """
+    MEH: 1 UPDATE for each model, only real fields, subtree cascade & post_bulk_update signal
+    """
+    def setUp(self):
+        self.roles = [Role.objects.create(title=f'Role {index}') for index in range(3)]
+        self.signals = []
+        post_bulk_update.connect(self.record_signal)
+        self.addCleanup(post_bulk_update.disconnect, self.record_signal)
+
+    def record_signal(self, sender, fields, cascade, **kwargs):
+        self.signals.append((sender, fields, cascade))
+
+    def test_update_only_model_fields(self):
+        ids = [role.pk for role in self.roles[:2]]
+        report = bulk_update_querysets([Role.objects.filter(pk__in=ids)], {'sort_number': 5, 'unknown': 1})
+        self.assertEqual(report['user.role']['count'], 2)
+        self.assertEqual(set(Role.objects.filter(sort_number=5).values_list('pk', flat=True)), set(ids))
+        self.assertEqual(self.signals, [(Role, {'sort_number': 5}, False)])
+
+    def test_no_model_field(self):
+        report = bulk_update_querysets([Role.objects.all()], {'unknown': 1})
+        self.assertEqual(report, {})
+        self.assertEqual(self.signals, [])
+
+    def test_cascade_status_to_subtree_and_products(self):
+        root = ProductCategory.objects.create(title='Root category')
+        child = ProductCategory.objects.create(title='Child category', parent_category=root)
+        locked = ProductCategory.objects.create(title='Locked category', parent_category=root, status_lock=True)
+        locked_child = ProductCategory.objects.create(title='Locked child category', parent_category=locked)
+        product = Product.objects.create(title='Child product', type=ProductType.SOLID, parent_category=child)
+        locked_product = Product.objects.create(title='Locked product', type=ProductType.SOLID, parent_category=child,
+                                                status_lock=True)
+        bulk_update_querysets([ProductCategory.objects.filter(pk=root.pk)], {'status': ProductStatus.INACTIVE},
+                              update_sub=True)
+        statuses = dict(ProductCategory.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[root.pk], ProductStatus.INACTIVE)
+        self.assertEqual(statuses[child.pk], ProductStatus.INACTIVE)
+        self.assertEqual(statuses[locked.pk], ProductStatus.ACTIVE) # MEH: Locked branch skipped
+        self.assertEqual(statuses[locked_child.pk], ProductStatus.ACTIVE)
+        product.refresh_from_db()
+        locked_product.refresh_from_db()
+        self.assertEqual(product.status, ProductStatus.INACTIVE)
+        self.assertEqual(locked_product.status, ProductStatus.ACTIVE)
+        self.assertIn((ProductCategory, {'status': ProductStatus.INACTIVE}, True), self.signals)
+        self.assertIn((Product, {'status': ProductStatus.INACTIVE}, True), self.signals)
+
+    def test_cascade_without_update_sub(self):
+        root = ProductCategory.objects.create(title='Root category')
+        child = ProductCategory.objects.create(title='Child category', parent_category=root)
+        bulk_update_querysets([ProductCategory.objects.filter(pk=root.pk)], {'status': ProductStatus.INACTIVE})
+        child.refresh_from_db()
+        self.assertEqual(child.status, ProductStatus.ACTIVE)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkDeleteTest(TestCase):
+    """
+    MEH: 1 collector for all querysets, protected rows skipped, M2M child deleted & MPTT gaps closed
+    """
+    def test_skip_delete_protected_fields(self):
+        default_role = Role.objects.create(title='Default role', is_default=True)
+        cashback_role = Role.objects.create(title='Cashback role', cashback_active=True)
+        role = Role.objects.create(title='Simple role')
+        deleted_count, deleted_per_model, skipped_ids = bulk_delete_querysets([Role.objects.all()])
+        self.assertEqual(deleted_count, 1)
+        self.assertEqual(deleted_per_model, {'user.Role': 1})
+        self.assertEqual(set(skipped_ids), {default_role.pk, cashback_role.pk})
+        self.assertFalse(Role.objects.filter(pk=role.pk).exists())
+        self.assertEqual(Role.objects.count(), 2)
+
+    def test_empty_queryset_list(self):
+        self.assertEqual(bulk_delete_querysets([]), (0, {}, []))
+
+    def test_recursive_delete_querysets(self):
+        root = PriceListCategory.objects.create(title='Price root')
+        child = PriceListCategory.objects.create(title='Price child', parent_category=root)
+        product_category = ProductCategory.objects.create(title='Product category')
+        table = PriceListTable.objects.create(title='Child table', product_category=product_category,
+                                              type=ProductType.OFFSET)
+        other_table = PriceListTable.objects.create(title='Other table', product_category=product_category,
+                                                    type=ProductType.OFFSET)
+        table.price_list_categories.add(child)
+        bulk_delete_querysets([PriceListCategory.objects.filter(pk=child.pk)])
+        self.assertFalse(PriceListTable.objects.filter(pk=table.pk).exists()) # MEH: M2M child not CASCADE
+        self.assertTrue(PriceListTable.objects.filter(pk=other_table.pk).exists())
+        self.assertTrue(PriceListCategory.objects.filter(pk=root.pk).exists())
+
+    def test_tree_gaps_closed_after_delete(self):
+        root = ProductCategory.objects.create(title='Root category')
+        first = ProductCategory.objects.create(title='First category', parent_category=root, sort_number=1)
+        second = ProductCategory.objects.create(title='Second category', parent_category=root, sort_number=2)
+        ProductCategory.objects.create(title='Second child category', parent_category=second)
+        third = ProductCategory.objects.create(title='Third category', parent_category=root, sort_number=3)
+        deleted_count, _, _ = bulk_delete_querysets([ProductCategory.objects.filter(pk=second.pk)])
+        self.assertEqual(deleted_count, 2) # MEH: Subtree with CASCADE
+        self.assertEqual(verify_tree(ProductCategory), {})
+        root.refresh_from_db()
+        self.assertEqual((root.lft, root.rght), (1, 6))
+        self.assertEqual(list(root.get_children().values_list('pk', flat=True)), [first.pk, third.pk])
+
+
+def delete_without_tree_update(queryset):
+    """
+    MEH: Raw SQL delete (no MPTT update) -> gap in lft & rght like collector of bulk delete
+    """
+    collector = Collector(using=queryset.db)
+    collector.collect(queryset)
+    collector.delete()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TreeGapTest(TestCase):
+    """
+    MEH: Gaps closed only in affected trees, order kept, delayed mode close 1 time at exit
+    """
+    def setUp(self):
+        self.root = ProductCategory.objects.create(title='Root category')
+        self.first = ProductCategory.objects.create(title='First category', parent_category=self.root, sort_number=1)
+        self.second = ProductCategory.objects.create(title='Second category', parent_category=self.root, sort_number=2)
+        self.third = ProductCategory.objects.create(title='Third category', parent_category=self.root, sort_number=3)
+        self.other_root = ProductCategory.objects.create(title='Other root category')
+        self.other_child = ProductCategory.objects.create(title='Other child category', parent_category=self.other_root)
+
+    def get_tree_rows(self, root):
+        return list(ProductCategory.objects.filter(tree_id=root.tree_id).order_by('lft')
+                    .values_list('pk', 'lft', 'rght'))
+
+    def test_close_tree_gaps(self):
+        delete_without_tree_update(ProductCategory.objects.filter(pk=self.second.pk))
+        self.assertEqual(verify_tree(ProductCategory), {self.root.tree_id: {'gap'}})
+        self.assertEqual(close_tree_gaps(ProductCategory, {self.root.tree_id}), 2) # MEH: Root & third only
+        self.assertEqual(verify_tree(ProductCategory), {})
+        self.assertEqual(self.get_tree_rows(self.root), [
+            (self.root.pk, 1, 6),
+            (self.first.pk, 2, 3),
+            (self.third.pk, 4, 5),
+        ])
+
+    def test_other_tree_not_touched(self):
+        other_rows = self.get_tree_rows(self.other_root)
+        delete_without_tree_update(ProductCategory.objects.filter(pk=self.first.pk))
+        close_tree_gaps(ProductCategory, {self.root.tree_id})
+        self.assertEqual(self.get_tree_rows(self.other_root), other_rows)
+
+    def test_no_tree_ids(self):
+        self.assertEqual(close_tree_gaps(ProductCategory, set()), 0)
+        self.assertEqual(close_tree_gaps(ProductCategory, {self.other_root.tree_id}), 0) # MEH: No gap, no write
+
+    def test_delayed_tree_maintenance(self):
+        with delayed_tree_maintenance():
+            delete_without_tree_update(ProductCategory.objects.filter(pk=self.first.pk))
+            mark_trees_dirty(ProductCategory, {self.root.tree_id})
+            delete_without_tree_update(ProductCategory.objects.filter(pk=self.second.pk))
+            mark_trees_dirty(ProductCategory, {self.root.tree_id})
+            self.assertEqual(verify_tree(ProductCategory), {self.root.tree_id: {'gap'}}) # MEH: Not closed yet
+        self.assertEqual(verify_tree(ProductCategory), {})
+        self.assertEqual(self.get_tree_rows(self.root), [(self.root.pk, 1, 4), (self.third.pk, 2, 3)])
+
+    def test_cascade_ids_skip_locked_branch(self):
+        ProductCategory.objects.filter(pk=self.second.pk).update(status_lock=True)
+        second_child = ProductCategory.objects.create(title='Second child category', parent_category=self.second)
+        self.root.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(get_cascade_ids(ProductCategory, [self.root], lock_field='status_lock'),
+                         [self.root.pk, self.first.pk, self.third.pk])
+        self.assertEqual(get_cascade_ids(ProductCategory, [self.second], lock_field='status_lock'),
+                         [self.second.pk, second_child.pk]) # MEH: Selected locked node itself
@@ -0,0 +1,336 @@
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from mptt.models import MPTTModel
+from mptt.signals import node_moved
+from itertools import groupby
+from operator import attrgetter, itemgetter
+from .cache import get_generation, bump_generation
+import threading
+
+TREE_CACHE_TIMEOUT = 60 * 60 * 24 * 7 # MEH: 1 week (new generation on any change before that)
+
+
+class _TreeState(threading.local):
+    def __init__(self):
+        self.stack = [] # MEH: Delayed tree maintenance batches (nested, per thread)
+
+
+_tree_state = _TreeState()
+
+
+def get_tree_attrs(model):
+    """
+    MEH: Real field name of tree_id, lft, rght in MPTT model
+    """
+    opts = model._mptt_meta
+    return opts.tree_id_attr, opts.left_attr, opts.right_attr
+
+
+def get_subtree_filter(model, nodes, include_self=True):
+    """
+    MEH: 1 Q for all subtrees of nodes (range on tree_id, lft, rght) instead of get_descendants for each node
+    """
+    tree_attr, left_attr, right_attr = get_tree_attrs(model)
+    left_lookup, right_lookup = ('gte', 'lte') if include_self else ('gt', 'lt')
+    condition = Q(pk__in=[])
+    for node in nodes:
+        condition |= Q(**{
+            tree_attr: getattr(node, tree_attr),
+            f'{left_attr}__{left_lookup}': getattr(node, left_attr),
+            f'{right_attr}__{right_lookup}': getattr(node, right_attr),
+        })
+    return condition
+
+
+def get_cascade_ids(model, nodes, lock_field=None):
+    """
+    MEH: All ids in subtrees of nodes with 1 query (in tree order),
+    node with lock_field=True block its own branch (unless selected itself)
+    """
+    selected_ids = {node.pk for node in nodes}
+    if not selected_ids:
+        return []
+    tree_attr, left_attr, right_attr = get_tree_attrs(model)
+    fields = ['pk', tree_attr, left_attr, right_attr] + ([lock_field] if lock_field else [])
+    rows = (model.objects.filter(get_subtree_filter(model, nodes))
+            .order_by(tree_attr, left_attr).values_list(*fields))
+    cascade_ids = []
+    stack = [] # MEH: (tree_id, rght, allowed) of open ancestors
+    for row in rows:
+        pk, tree_id, lft, rght = row[:4]
+        while stack and (stack[-1][0] != tree_id or stack[-1][1] < lft):
+            stack.pop()
+        if pk in selected_ids:
+            allowed = True
+        elif lock_field and row[4]:
+            allowed = False
+        else:
+            allowed = stack[-1][2] if stack else True
+        stack.append((tree_id, rght, allowed))
+        if allowed:
+            cascade_ids.append(pk)
+    return cascade_ids
+
+
+def group_nodes_by(nodes, field_name):
+    """
+    MEH: Group nodes with same value of field (Cascade 1 update for each value)
+    """
+    key = lambda node: getattr(node, field_name)
+    for value, group in groupby(sorted(nodes, key=lambda node: str(key(node))), key=key):
+        yield value, list(group)
+
+
+def close_tree_gaps(model, tree_ids):
+    """
+    MEH: Renumber lft & rght only in affected trees after delete (keep order, remove gap of deleted nodes),
+    1 query for read & bulk update only changed nodes (no rebuild for all forest)
+    """
+    if not tree_ids:
+        return 0
+    tree_attr, left_attr, right_attr = get_tree_attrs(model)
+    nodes = list(model._tree_manager.filter(**{f'{tree_attr}__in': tree_ids})
+                 .order_by(tree_attr, left_attr).only('pk', tree_attr, left_attr, right_attr))
+    changed = []
+    for tree_id, group in groupby(nodes, key=attrgetter(tree_attr)):
+        group = list(group)
+        values = sorted(value for node in group for value in (getattr(node, left_attr), getattr(node, right_attr)))
+        rank = {value: index + 1 for index, value in enumerate(values)} # MEH: Dense 1..2n numbering
+        for node in group:
+            new_left, new_right = rank[getattr(node, left_attr)], rank[getattr(node, right_attr)]
+            if new_left != getattr(node, left_attr) or new_right != getattr(node, right_attr):
+                setattr(node, left_attr, new_left)
+                setattr(node, right_attr, new_right)
+                changed.append(node)
+    if changed:
+        model._tree_manager.bulk_update(changed, [left_attr, right_attr], batch_size=500)
+    return len(changed)
+
+
+class delayed_tree_maintenance:
+    """
+    MEH: Batch mode for many delete in 1 request -> collect dirty trees & close gaps 1 time at exit
+    with delayed_tree_maintenance():
+        ...
+    """
+    def __enter__(self):
+        _tree_state.stack.append({'dirty': {}, 'changed': set()})
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        batch = _tree_state.stack.pop()
+        if exc_type is None:
+            for model, tree_ids in batch['dirty'].items():
+                mark_trees_dirty(model, tree_ids) # MEH: Nested mode -> parent batch, else close now
+        for model in batch['changed']: # MEH: Even on error, cached tree may be changed
+            mark_tree_changed(model)
+        return False
+
+
+def mark_trees_dirty(model, tree_ids):
+    """
+    MEH: Close gaps of trees now, or later if in delayed mode
+    """
+    tree_ids = set(tree_ids)
+    if not tree_ids:
+        return
+    if _tree_state.stack:
+        _tree_state.stack[-1]['dirty'].setdefault(model, set()).update(tree_ids)
+    else:
+        close_tree_gaps(model, tree_ids)
+
+
+def get_tree_resource(model):
+    """
+    MEH: Generation resource of each tree model (for cached tree)
+    """
+    return f'tree:{model._meta.label_lower}'
+
+
+def mark_tree_changed(model):
+    """
+    MEH: New generation for cached tree of model (1 time at the end in delayed mode)
+    """
+    if _tree_state.stack:
+        _tree_state.stack[-1]['changed'].add(model)
+    else:
+        bump_generation(get_tree_resource(model))
+
+
+def tree_changed_receiver(sender, **kwargs):
+    mark_tree_changed(sender)
+
+
+def tree_moved_receiver(sender, instance, **kwargs):
+    if hasattr(instance, 'path_label_field'): # MEH: move_to() don't call save, refresh stored path here
+        refresh_subtree_paths(instance)
+    mark_tree_changed(sender)
+
+
+def connect_tree_signals():
+    """
+    MEH: Any save, move & delete on MPTT models -> cached tree invalid (call in ApiConfig.ready)
+    """
+    for model in get_tree_models():
+        post_save.connect(tree_changed_receiver, sender=model, dispatch_uid=f'tree_changed_save_{model._meta.label_lower}')
+        post_delete.connect(tree_changed_receiver, sender=model, dispatch_uid=f'tree_changed_delete_{model._meta.label_lower}')
+        node_moved.connect(tree_moved_receiver, sender=model, dispatch_uid=f'tree_moved_{model._meta.label_lower}')
+
+
+def build_tree_forest(model, label_field, fields):
+    """
+    MEH: Load whole MPTT forest with 1 ordered query (tree_id, lft),
+    build nested nodes (children, has_children, parent_path) in memory, nodes key ordered like fields
+    """
+    tree_attr, left_attr, right_attr = get_tree_attrs(model)
+    parent_name = model._mptt_meta.parent_attr
+    parent_attname = model._meta.get_field(parent_name).attname
+    rows = (model._tree_manager.order_by(tree_attr, left_attr)
+            .values_list('pk', label_field, parent_attname))
+    nodes = {}
+    forest = []
+    for pk, label, parent_id in rows:
+        parent = nodes.get(parent_id)
+        values = {
+            'id': pk,
+            label_field: label,
+            parent_name: parent_id,
+            'parent_path': f"{parent['parent_path']} - {label}" if parent else label, # MEH: Same as get_slug_path
+            'has_children': False,
+            'children': [],
+        }
+        node = {name: values[name] for name in fields}
+        nodes[pk] = values
+        values['node'] = node
+        if parent:
+            parent['children'].append(node) # MEH: Same list object in node
+            if 'has_children' in parent['node']:
+                parent['node']['has_children'] = True
+        else:
+            forest.append(node)
+    return forest
+
+
+def get_tree_forest(model, label_field, fields):
+    """
+    MEH: Cached forest for each tree generation
+    """
+    resource = get_tree_resource(model)
+    cache_key = f'{resource}:{get_generation(resource)}:{"-".join(fields)}'
+    forest = cache.get(cache_key)
+    if forest is None:
+        forest = build_tree_forest(model, label_field, fields)
+        cache.set(cache_key, forest, timeout=TREE_CACHE_TIMEOUT)
+    return forest
+
+
+def verify_tree(model):
+    """
+    MEH: Check integrity of all trees of MPTT model with 1 query (offline check)
+    return {tree_id: set of problem} -> 'gap' (fix with close gaps) or 'structure' (need partial rebuild)
+    """
+    opts = model._mptt_meta
+    tree_attr, left_attr, right_attr = get_tree_attrs(model)
+    parent_attr = model._meta.get_field(opts.parent_attr).attname
+    rows = (model._tree_manager.order_by(tree_attr, left_attr)
+            .values_list('pk', parent_attr, tree_attr, left_attr, right_attr, opts.level_attr))
+    problems = {}
+    for tree_id, group in groupby(rows, key=itemgetter(2)):
+        group = list(group)
+        values = sorted(value for row in group for value in (row[3], row[4]))
+        if values != list(range(1, len(values) + 1)):
+            problems.setdefault(tree_id, set()).add('gap')
+        stack = [] # MEH: Open ancestors (pk, rght)
+        for pk, parent_id, _, lft, rght, level in group:
+            while stack and stack[-1][1] < lft:
+                stack.pop()
+            expected_parent = stack[-1][0] if stack else None
+            if lft >= rght or parent_id != expected_parent or level != len(stack):
+                problems.setdefault(tree_id, set()).add('structure')
+            stack.append((pk, rght))
+    return problems
+
+
+def get_tree_models():
+    """
+    MEH: All MPTT models in project (ProductCategory, OptionCategory, GalleryCategory, PriceListCategory, FileDirectory, ...)
+    """
+    from django.apps import apps
+    return [model for model in apps.get_models() if issubclass(model, MPTTModel)]
+
+
+def compute_tree_paths(rows, base_paths=None):
+    """
+    MEH: rows (pk, label, parent_id) ordered by (tree_id, lft) -> {pk: (titles, ids)} from root until node
+    """
+    paths = dict(base_paths or {})
+    for pk, label, parent_id in rows:
+        parent_titles, parent_ids = paths.get(parent_id, ([], []))
+        paths[pk] = (parent_titles + [label], parent_ids + [pk])
+    return paths
+
+
+def save_tree_paths(model, paths):
+    """
+    MEH: Bulk write stored path of nodes (CASE WHEN update in batch)
+    """
+    nodes = [model(pk=pk, path_titles=titles, path_ids=ids) for pk, (titles, ids) in paths.items()]
+    model._tree_manager.bulk_update(nodes, ['path_titles', 'path_ids'], batch_size=500)
+    return len(nodes)
+
+
+def refresh_subtree_paths(node):
+    """
+    MEH: Recompute stored path of node & all descendants (on rename or move) with 1 read & bulk update
+    """
+    model = node.__class__
+    tree_attr, left_attr, right_attr = get_tree_attrs(model)
+    parent_attname = model._meta.get_field(model._mptt_meta.parent_attr).attname
+    label_field = model.path_label_field
+    parent_id = getattr(node, parent_attname)
+    base_paths = {}
+    if parent_id:
+        parent = model._tree_manager.get(pk=parent_id)
+        if parent.path_ids:
+            base_paths[parent_id] = (parent.path_titles, parent.path_ids)
+        else: # MEH: Parent path not stored yet (old data)
+            ancestors = list(parent.get_ancestors(include_self=True).values_list('pk', label_field))
+            base_paths[parent_id] = ([label for _, label in ancestors], [pk for pk, _ in ancestors])
+    node._mptt_refresh() # MEH: Fresh lft & rght after move
+    rows = (model._tree_manager.filter(get_subtree_filter(model, [node]))
+            .order_by(left_attr).values_list('pk', label_field, parent_attname))
+    paths = compute_tree_paths(rows, base_paths)
+    paths.pop(parent_id, None)
+    node.path_titles, node.path_ids = paths.get(node.pk, ([], []))
+    return save_tree_paths(model, paths)
+
+
+def rebuild_tree_paths(model):
+    """
+    MEH: Recompute stored path of all nodes of model (1 query & bulk update), for old data or check_trees --paths
+    """
+    tree_attr, left_attr, right_attr = get_tree_attrs(model)
+    parent_attname = model._meta.get_field(model._mptt_meta.parent_attr).attname
+    rows = (model._tree_manager.order_by(tree_attr, left_attr)
+            .values_list('pk', model.path_label_field, parent_attname))
+    return save_tree_paths(model, compute_tree_paths(rows))
+
+
+def resolve_tree_paths(model, ids):
+    """
+    MEH: Stored path titles of many nodes with 1 query (for list endpoints) -> {pk: [titles]}
+    node without stored path yet (old data) resolved from ancestors
+    """
+    paths = dict(model._tree_manager.filter(pk__in=set(ids)).values_list('pk', 'path_titles'))
+    for pk in [pk for pk, titles in paths.items() if not titles]:
+        paths[pk] = [getattr(node, model.path_label_field)
+                     for node in model._tree_manager.get(pk=pk).get_ancestors(include_self=True)]
+    return paths
+
+
+def resolve_slug_paths(model, ids, separator=' - '):
+    """
+    MEH: Slug path of many nodes with 1 query -> {pk: path}
+    """
+    return {pk: separator.join(titles) for pk, titles in resolve_tree_paths(model, ids).items()}
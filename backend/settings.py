@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -28,7 +29,7 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -147,6 +148,8 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified'] # MEH: SPA can read validator for conditional GET
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -192,8 +195,16 @@ CACHES = {
 }
 
 CELERY_BROKER_URL = 'redis://127.0.0.1:6379/1'
+CELERY_BEAT_SCHEDULE = {
+    'expire-export-job-files': { # MEH: Remove old export artifacts (synced to DB scheduler)
+        'task': 'file_manager.tasks.expire_export_job_files',
+        'schedule': 60 * 60,
+    },
+}
 # CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379/1'
 
+PRICE_LIST_PDF_FONT = os.environ.get('PRICE_LIST_PDF_FONT') # MEH: Path of .ttf with Farsi glyphs (like Vazirmatn) for price list pdf, no pdf if not set
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -233,6 +244,7 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+EXPORT_ROOT = BASE_DIR / 'private' / 'exports' # MEH: Excel export jobs (customer data), out of MEDIA_ROOT
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -23,9 +23,8 @@ class ProvinceViewSet(CustomMixinModelViewSet):
     search_fields = ['name']
     http_method_names = ['get', 'head', 'options']
     cache_key = 'province'
-
-    def list(self, request, *args, **kwargs): # MEH: for set time out to 1 year (always!)
-        return super().list(request, timeout=60 * 60 * 24 * 365)
+    cache_timeout = 60 * 60 * 24 * 365 # MEH: 1 year (always!) until change
+    cache_rendered = True
 
 
 @extend_schema(tags=['Province'])
@@ -45,6 +44,5 @@ class CityViewSet(CustomMixinModelViewSet):
     search_fields = ['name']
     http_method_names = ['get', 'head', 'options']
     cache_key = 'city'
-
-    def list(self, request, *args, **kwargs): # MEH: for set time out to 1 year (always!)
-        return super().list(request, timeout=60 * 60 * 24 * 365)
\ No newline at end of file
+    cache_timeout = 60 * 60 * 24 * 365 # MEH: 1 year (always!) until change
+    cache_rendered = True
\ No newline at end of file
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont, features
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from config.models import PriceListConfig, price_list_upload_path
+from product.models import PriceListTable, Column
+from product.services.price_table import get_table_rows
+
+try: # MEH: Farsi shaping without libraqm (join letters & right to left order)
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+except ImportError:
+    arabic_reshaper = get_display = None
+
+PDF_PAGE_SIZE = (1240, 1754) # MEH: A4 in 150 dpi
+PDF_RESOLUTION = 150
+PDF_MARGIN = 60
+PDF_ROW_HEIGHT = 44
+PDF_TITLE_HEIGHT = 80
+PDF_FONT_SIZE = 22
+PDF_FRAGMENT_TIMEOUT = 60 * 60 * 24 * 7 # MEH: 1 week (new key on any cells change before that)
+PDF_DIGEST_KEY = 'config:price_list_pdf:digest'
+PDF_LOCK_KEY = 'config:price_list_pdf:lock'
+PDF_LOCK_TIMEOUT = 60 * 30
+PDF_RERUN_KEY = 'config:price_list_pdf:rerun' # MEH: Call while locked -> run again after current one (value: force)
+
+
+@lru_cache(maxsize=None)
+def has_raqm():
+    return features.check_feature('raqm')
+
+
+def check_pdf_font():
+    """
+    MEH: Raise ImproperlyConfigured if pdf can't show Farsi (no font, or no shaping with raqm or reshaper & bidi)
+    """
+    font_path = getattr(settings, 'PRICE_LIST_PDF_FONT', None)
+    if not font_path or not os.path.isfile(font_path):
+        raise ImproperlyConfigured('PRICE_LIST_PDF_FONT must be path of a .ttf font with Farsi glyphs')
+    if not has_raqm() and arabic_reshaper is None:
+        raise ImproperlyConfigured('Farsi text need Pillow with libraqm or arabic-reshaper & python-bidi')
+    return font_path
+
+
+def get_pdf_font(size=PDF_FONT_SIZE):
+    """
+    MEH: Font with Farsi glyphs from settings (PRICE_LIST_PDF_FONT), raqm layout if Pillow has it
+    """
+    layout_engine = ImageFont.Layout.RAQM if has_raqm() else ImageFont.Layout.BASIC
+    return ImageFont.truetype(str(check_pdf_font()), size, layout_engine=layout_engine)
+
+
+def shape_text(text):
+    """
+    MEH: Basic layout draw letters alone & left to right -> joined forms in visual order (raqm do it itself)
+    """
+    if has_raqm():
+        return text
+    return get_display(arabic_reshaper.reshape(text))
+
+
+def get_fragment_key(table):
+    """
+    MEH: Table render key, new key when cells or display field of table changed
+    """
+    source = f'{table["title"]}|{table["size_unit"]}|{table["label_text"]}|{table["cells_update"]}'
+    return f'config:price_list_pdf:table:{table["id"]}:{hashlib.md5(source.encode()).hexdigest()}'
+
+
+def get_table_lines(table):
+    """
+    MEH: Materialized cells -> header & text rows (label of each id, price with thousand separator)
+    """
+    cells = table['cells'] or {}
+    dims, labels = cells.get('dims', []), cells.get('labels', {})
+    header = [Column(dim).label for dim in dims] + ['قیمت']
+    lines = []
+    for row in get_table_rows(cells):
+        *values, price = row
+        line = [labels.get(dim, {}).get(str(value), '-' if value is None else str(value))
+                for dim, value in zip(dims, values)]
+        lines.append(line + ['-' if price is None else f'{price:,}'])
+    return header, lines
+
+
+def render_table_pages(table):
+    """
+    MEH: 1 table -> list of page images (table always start in new page, so each table can be reused alone)
+    """
+    font, title_font = get_pdf_font(), get_pdf_font(PDF_FONT_SIZE + 10)
+    header, lines = get_table_lines(table)
+    width, height = PDF_PAGE_SIZE
+    column_width = (width - PDF_MARGIN * 2) // len(header)
+    rows_per_page = max((height - PDF_MARGIN * 2 - PDF_TITLE_HEIGHT) // PDF_ROW_HEIGHT - 1, 1)
+    pages = []
+    for start in range(0, max(len(lines), 1), rows_per_page):
+        page = Image.new('RGB', PDF_PAGE_SIZE, 'white')
+        draw = ImageDraw.Draw(page)
+        draw.text((width - PDF_MARGIN, PDF_MARGIN), shape_text(table['title']), fill='black', font=title_font,
+                  anchor='ra')
+        top = PDF_MARGIN + PDF_TITLE_HEIGHT
+        for index, line in enumerate([header, *lines[start:start + rows_per_page]]):
+            y = top + index * PDF_ROW_HEIGHT
+            if index == 0:
+                draw.rectangle((PDF_MARGIN, y, width - PDF_MARGIN, y + PDF_ROW_HEIGHT), fill=(230, 230, 230))
+            draw.line((PDF_MARGIN, y + PDF_ROW_HEIGHT, width - PDF_MARGIN, y + PDF_ROW_HEIGHT), fill=(200, 200, 200))
+            for column, text in enumerate(line): # MEH: Right to left columns
+                x = width - PDF_MARGIN - column * column_width - 10
+                draw.text((x, y + PDF_ROW_HEIGHT // 2), shape_text(text), fill='black', font=font, anchor='rm')
+        pages.append(page)
+    return pages
+
+
+def get_table_pages(table):
+    """
+    MEH: Rendered pages of table from cache (PNG bytes), render only tables changed after last pdf
+    return (pages, rendered or not)
+    """
+    key = get_fragment_key(table)
+    fragment = cache.get(key)
+    if fragment is not None:
+        return [Image.open(BytesIO(page)) for page in fragment], False
+    pages = render_table_pages(table)
+    fragment = []
+    for page in pages:
+        buffer = BytesIO()
+        page.save(buffer, format='PNG', optimize=True)
+        fragment.append(buffer.getvalue())
+    cache.set(key, fragment, timeout=PDF_FRAGMENT_TIMEOUT)
+    return pages, True
+
+
+def get_active_tables():
+    return list(PriceListTable.objects.filter(is_active=True).order_by('sort_number', 'pk').values(
+        'id', 'title', 'size_unit', 'label_text', 'cells', 'cells_update'
+    ))
+
+
+def get_tables_digest(tables):
+    return hashlib.md5('|'.join(get_fragment_key(table) for table in tables).encode()).hexdigest()
+
+
+def generate_price_list_pdf(force=False):
+    """
+    MEH: Render all active tables to 1 PDF (only changed table rendered), write to temp file & save to storage,
+    then switch pdf_file with 1 UPDATE (download see old file until new one is complete)
+    return stats dict (or None if nothing changed)
+    """
+    config = PriceListConfig.objects.first()
+    if config is None or not config.is_active:
+        return None
+    tables = get_active_tables()
+    digest = get_tables_digest(tables)
+    if not force and config.pdf_file and cache.get(PDF_DIGEST_KEY) == digest:
+        return None
+    pages, rendered = [], 0
+    for table in tables:
+        table_pages, is_rendered = get_table_pages(table)
+        pages.extend(table_pages)
+        rendered += is_rendered
+    if not pages:
+        pages = [Image.new('RGB', PDF_PAGE_SIZE, 'white')]
+    pages = [page.convert('RGB') for page in pages]
+    fd, temp_path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            pages[0].save(temp_file, format='PDF', save_all=True, append_images=pages[1:], resolution=PDF_RESOLUTION)
+        with open(temp_path, 'rb') as temp_file:
+            storage = config.pdf_file.storage
+            new_name = storage.save(price_list_upload_path(config, 'price-list.pdf'), File(temp_file))
+    finally:
+        os.remove(temp_path)
+    old_name = config.pdf_file.name if config.pdf_file else None
+    now = timezone.now()
+    with transaction.atomic():
+        PriceListConfig.objects.filter(pk=config.pk).update(pdf_file=new_name, last_pdf_update=now)
+        if old_name and old_name != new_name:
+            transaction.on_commit(lambda: storage.delete(old_name))
+    cache.set(PDF_DIGEST_KEY, digest, timeout=None)
+    return {'file': new_name, 'tables': len(tables), 'rendered': rendered, 'pages': len(pages)}
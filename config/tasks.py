@@ -0,0 +1,32 @@
+import logging
+from celery import shared_task
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from .services.price_list_pdf import generate_price_list_pdf, check_pdf_font, PDF_LOCK_KEY, PDF_LOCK_TIMEOUT, \
+    PDF_RERUN_KEY
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_price_list_pdf_task(force=False):
+    """
+    MEH: Build price list pdf out of request (1 worker at a time),
+    call while running recorded & queued again after current run (forced call never lost),
+    skipped with log if Farsi font not configured (auto run after each price change)
+    """
+    try:
+        check_pdf_font()
+    except ImproperlyConfigured as e:
+        logger.warning('Price list pdf skipped: %s', e)
+        return None
+    if not cache.add(PDF_LOCK_KEY, True, timeout=PDF_LOCK_TIMEOUT):
+        cache.set(PDF_RERUN_KEY, bool(cache.get(PDF_RERUN_KEY)) or force, timeout=PDF_LOCK_TIMEOUT)
+        return None
+    try:
+        return generate_price_list_pdf(force=force)
+    finally:
+        rerun = cache.get(PDF_RERUN_KEY)
+        cache.delete_many([PDF_LOCK_KEY, PDF_RERUN_KEY])
+        if rerun is not None:
+            generate_price_list_pdf_task.delay(force=rerun)
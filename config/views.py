@@ -3,6 +3,9 @@ from api.mixins import CustomMixinModelViewSet
 from api.permissions import ApiAccess
 from .models import PriceListConfig
 from .serializers import PriceListConfigSerializer
+from .tasks import generate_price_list_pdf_task
+from .services.price_list_pdf import check_pdf_font
+from django.core.exceptions import ImproperlyConfigured
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound
 from rest_framework import status
@@ -39,5 +42,14 @@ class PriceListConfigViewSet(CustomMixinModelViewSet):
     @action(detail=False, methods=['get'], http_method_names=['get'],
             url_path='generate-pdf')
     def generate_auto_pdf(self, request):
-        # MEH todo: generate new pdf list from price_list_category (and set last_update_pdf)
-        return Response({"detail": TG_DATA_CREATED}, status=status.HTTP_201_CREATED)
+        """
+        MEH: New pdf of active price list tables in celery (never in request), pdf_file & last_pdf_update set by task
+        """
+        if not PriceListConfig.objects.exists():
+            raise NotFound(TG_DATA_NOT_FOUND)
+        try:
+            check_pdf_font() # MEH: Fail now, not with broken glyphs in customer pdf
+        except ImproperlyConfigured as e:
+            return Response({"detail": TG_PDF_FONT_MISSING, "error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        generate_price_list_pdf_task.delay(force=True)
+        return Response({"detail": TG_JOB_QUEUED}, status=status.HTTP_202_ACCEPTED)
@@ -1,8 +1,9 @@
 from django.db.models.signals import post_delete, post_save, pre_save, m2m_changed
 from django.dispatch import receiver
-from django.core.cache import cache
 from .models import Employee, EmployeeLevel
 from user.models import User
+from api.authentication import invalidate_principal
+from api.access import invalidate_api_access
 
 
 @receiver(pre_save, sender=Employee)
@@ -41,7 +42,15 @@ def employee_post_delete(sender, instance, **kwargs):
         pass
 
 
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def clear_employee_principal_cache(sender, instance, **kwargs):
+    """
+    MEH: Employee level is in user snapshot
+    """
+    invalidate_principal(instance.user_id)
+
+
 @receiver(m2m_changed, sender=EmployeeLevel.api_items.through)
 def clear_employee_level_api_keys_cache(sender, instance, **kwargs):
-    cache_key = f"employee_level_api_keys:{instance.pk}"
-    cache.delete(cache_key)
+    invalidate_api_access() # MEH: All workers compile access matrix again
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import FileDirectory, FileItem, ClearFileHistory
+from .models import FileDirectory, FileItem, ClearFileHistory, ExportJob
 from mptt.admin import DraggableMPTTAdmin
 
 
@@ -20,6 +20,12 @@ class ClearFileHistoryAdmin(admin.ModelAdmin):
     list_display = ['id', 'from_date', 'until_date', 'employee', 'submit_date']
 
 
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'row_count', 'created_by', 'create_date', 'expire_date']
+    list_filter = ['kind', 'status']
+
+
 admin.site.register(FileDirectory, FileDirectoryAdmin)
 admin.site.register(FileItem, FileItemAdmin)
 admin.site.register(ClearFileHistory, ClearFileHistoryAdmin)
+admin.site.register(ExportJob, ExportJobAdmin)
@@ -0,0 +1,81 @@
+from functools import lru_cache
+from typing import Any, Callable, NamedTuple
+import jdatetime
+from .excel_handler import ExcelHandler
+
+EXPORT_CHUNK_SIZE = 2000 # MEH: Rows read from DB cursor each time (.iterator)
+
+class ExportColumn(NamedTuple):
+    """
+    MEH: 1 Excel column -> name (check_field), header, source (values() path or DB expression), formatter(value)
+    """
+    name: str
+    header: str
+    source: Any = None
+    formatter: Callable | None = None
+
+
+@lru_cache(maxsize=4096)
+def get_jalali_date(date):
+    return jdatetime.date.fromgregorian(date=date).strftime('%Y/%m/%d')
+
+
+def format_jalali_datetime(value):
+    """
+    MEH: Gregorian datetime -> Jalali (date part converted 1 time for each day, many rows in same day)
+    """
+    if not value:
+        return value
+    return f'{get_jalali_date(value.date())} {value:%H:%M}'
+
+
+def format_number(value):
+    if isinstance(value, (int, float)):
+        return f'{value:,}'
+    return value
+
+
+def make_label_formatter(labels):
+    """
+    MEH: Value -> display label from dict (choices or bool labels)
+    """
+    return lambda value: labels.get(value, value)
+
+
+BOOLEAN_ACTIVE_LABELS = make_label_formatter({True: 'فعال', False: 'غیر فعال'})
+
+
+def get_export_source(column):
+    return column.source or column.name
+
+
+def iter_export_rows(queryset, columns, limit=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    MEH: 1 values() query (no model & no serializer), rows streamed from DB cursor with formatter of each column
+    """
+    expressions = {f'export_{index}': get_export_source(column) for index, column in enumerate(columns)}
+    fields = [name for name, source in expressions.items() if isinstance(source, str)]
+    annotations = {name: source for name, source in expressions.items() if not isinstance(source, str)}
+    queryset = queryset.annotate(**annotations) if annotations else queryset
+    paths = [expressions[name] if name in fields else name for name in expressions]
+    formatters = [column.formatter for column in columns]
+    rows = queryset.values_list(*paths)
+    if limit:
+        rows = rows[:limit]
+    for values in rows.iterator(chunk_size=chunk_size):
+        row = []
+        for value, formatter in zip(values, formatters):
+            if formatter and value is not None:
+                value = formatter(value)
+            row.append(str(value) if value else '-') # MEH: Default clean-up
+        yield row
+
+
+def export_excel(queryset, columns, file_name, check_field=None, limit=None):
+    """
+    MEH: Stream queryset to Excel file with declared columns (check_field is column name)
+    """
+    headers = [column.header or column.name for column in columns]
+    check_header = next((column.header or column.name for column in columns if column.name == check_field), None)
+    return ExcelHandler.generate_excel(headers, iter_export_rows(queryset, columns, limit=limit),
+                                       file_name=file_name, check_field=check_header)
@@ -1,58 +1,93 @@
+import tempfile
+from itertools import chain, islice
 from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
-from django.http import HttpResponse
+from django.http import FileResponse
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from api.responses import TG_EXCEL_FILE_INVALID, TG_EXCEL_FILE_REQUIRED_COL, TG_EXCEL_FILE_LIMIT_1000
 
 
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXCEL_WIDTH_SAMPLE_ROWS = 500 # MEH: Column width from header & first rows (write-only sheet need width before rows)
+EXCEL_MAX_COLUMN_WIDTH = 60
+
+
+def get_excel_styles():
+    """
+    MEH: Shared named styles (saved 1 time in styles.xml, not per cell)
+    """
+    side = Side(style='thin', color='888888')
+    border = Border(left=side, right=side, top=side, bottom=side)
+    alignment = Alignment(horizontal='center', vertical='center')
+    header = NamedStyle(name='tg_header', font=Font(size=10), border=border, alignment=alignment,
+                        fill=PatternFill(start_color='ffcc00', end_color='ffcc00', fill_type='solid'))
+    cell = NamedStyle(name='tg_cell', border=border, alignment=alignment)
+    checked = NamedStyle(name='tg_checked', border=border, alignment=alignment,
+                         fill=PatternFill(start_color='dedede', end_color='dedede', fill_type='solid'))
+    return header, cell, checked
+
+
 class ExcelHandler:
     @staticmethod
     def generate_excel(headers, rows, **kwargs):
-        wb = Workbook()
-        ws = wb.active
-        if not kwargs.get('file_name'):
-            ws.title = "Excel.xlsx"
-        else:
-            ws.title = kwargs['file_name']
+        """
+        MEH: Stream rows (list or generator) to write-only sheet in a temp file & return it as FileResponse,
+        memory stay same for 100 or 100,000 rows (only width sample rows kept)
+        """
+        file_name = kwargs.get('file_name') or 'Excel.xlsx'
+        temp_file = tempfile.TemporaryFile(suffix='.xlsx') # MEH: Removed on close (after response sent)
+        ExcelHandler.write_excel(temp_file, headers, rows, **kwargs)
+        temp_file.seek(0)
+        return FileResponse(temp_file, as_attachment=True, filename=file_name, content_type=EXCEL_CONTENT_TYPE)
+
+    @staticmethod
+    def write_excel(file, headers, rows, **kwargs):
+        """
+        MEH: Write rows to file object (response temp file or export job file)
+        """
+        file_name = kwargs.get('file_name') or 'Excel.xlsx'
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=file_name[:31]) # MEH: Excel sheet title limit
         ws.sheet_view.rightToLeft = True
-        thin_border = Border(
-            left=Side(style='thin', color='888888'),
-            right=Side(style='thin', color='888888'),
-            top=Side(style='thin', color='888888'),
-            bottom=Side(style='thin', color='888888')
-        )
-        header_font = Font(size=10)
-        header_fill = PatternFill(start_color='ffcc00', end_color='ffcc00', fill_type='solid')
+        for style in get_excel_styles():
+            wb.add_named_style(style)
         check_col_number = 0
         check_field = kwargs.get('check_field')
         if check_field:
             if check_field in headers:
                 check_col_number = headers.index(check_field) + 1
-        ws.append(headers)
-        for cell in ws[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-        for row in rows:
-            ws.append(row)
+        rows = iter(rows)
+        sample = list(islice(rows, EXCEL_WIDTH_SAMPLE_ROWS))
+        widths = [len(str(header)) for header in headers]
+        for row in sample: # MEH: Auto col Width
+            for col_num, value in enumerate(row):
+                if col_num < len(widths):
+                    widths[col_num] = max(widths[col_num], len(str(value)))
+        for col_num, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(col_num)].width = min(width + 4, EXCEL_MAX_COLUMN_WIDTH)
         ws.row_dimensions[1].height = 25  # MEH: Set row height for header row
-        for row in ws.iter_rows(min_row=1):  # MEH: Example: highlight without order users
-            for cell in row:  # MEH: Alignment Center all cel
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = thin_border
+
+        def make_row(values, style_name):
+            cells = []
+            for value in values:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.style = style_name
+                cells.append(cell)
+            return cells
+
+        ws.append(make_row(headers, 'tg_header'))
+        for row in chain(sample, rows):
+            style_name = 'tg_cell'
             if check_col_number: # MEH: Chack around chosen field and mark those row with fill color
-                if row[check_col_number-1].value == '-' or not row[check_col_number-1].value:
-                    for cell in row:
-                        cell.fill = PatternFill(start_color='dedede', end_color='dedede', fill_type='solid')
-        for col_num, column_cells in enumerate(ws.columns, 1):  # Auto col Width
-            length = max(len(str(cell.value)) for cell in column_cells)
-            ws.column_dimensions[get_column_letter(col_num)].width = length + 4
-        res = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')  # MEH: Prepare HTTP response
-        res['Content-Disposition'] = 'attachment; filename=users.xlsx'
-        wb.save(res)
-        return res
+                check_value = row[check_col_number - 1]
+                if check_value == '-' or not check_value:
+                    style_name = 'tg_checked'
+            ws.append(make_row(row, style_name))
+        wb.save(file)
 
     @staticmethod
     def import_excel(file, allowed_fields, required_field=None, **kwargs):
@@ -83,3 +118,40 @@ class ExcelHandler:
             cleaned_data.update(extra_fields) # MEH: Add extra fields if provided
             data_list.append(cleaned_data) # MEH: Clean Data to check validation in serializer later
         return data_list
+
+    @staticmethod
+    def iter_import_rows(file, allowed_fields, required_field=None, max_rows=None, **kwargs):
+        """
+        MEH: Same clean data of import_excel, but streamed from read-only workbook (row by row, no full sheet in memory)
+        yield (excel row number, clean data), raise ValidationError for invalid file or header
+        """
+        try: # MEH: Check for invalid file
+            wb = load_workbook(filename=file, read_only=True, data_only=True)
+            sheet = wb.active
+        except Exception as e:
+            raise ValidationError({'detail': TG_EXCEL_FILE_INVALID + str(e)})
+        rows = sheet.iter_rows(values_only=True)
+        header = list(next(rows, None) or []) # MEH: Header first row
+        if required_field and not all(col in header for col in required_field):
+            wb.close()
+            raise ValidationError({'detail': TG_EXCEL_FILE_REQUIRED_COL + str(required_field)})
+        nested_fields = kwargs.get('nested_fields', [])
+        nested_field_category = kwargs.get('nested_field_category')
+        extra_fields = kwargs.get('extra_fields', {})
+        try:
+            for row_number, row in enumerate(rows, 2):
+                if max_rows and row_number - 1 > max_rows:
+                    break
+                if not any(row):
+                    continue  # MEH: Skip empty rows
+                row_data = dict(zip(header, row))
+                nested_data = {k: row_data.pop(k) for k in list(row_data) if k in nested_fields}
+                cleaned_data = {k: v for k, v in row_data.items() if k in allowed_fields}
+                if nested_field_category:
+                    cleaned_data.pop(nested_field_category, None)
+                if nested_data and nested_field_category:
+                    cleaned_data[nested_field_category] = nested_data
+                cleaned_data.update(extra_fields)
+                yield row_number, cleaned_data
+        finally:
+            wb.close() # MEH: Read-only workbook keep file open until close
@@ -0,0 +1,133 @@
+import tempfile
+from datetime import timedelta
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
+from api.responses import TG_EXPORT_JOB_TIMEOUT
+from .excel_handler import ExcelHandler
+from .excel_export import iter_export_rows, EXPORT_CHUNK_SIZE
+from .models import ExportJob, ExportKind, ExportStatus
+
+EXPORT_JOB_EXPIRE = timedelta(days=2) # MEH: Artifact removed after this
+EXPORT_JOB_PENDING_TIMEOUT = timedelta(hours=1) # MEH: Never picked by a worker (message lost)
+EXPORT_JOB_RUNNING_TIMEOUT = timedelta(hours=3) # MEH: Worker died in the middle
+EXPORT_JOBS = { # MEH: Kind -> viewset & action (same filter/search/order as list), columns & file name
+    ExportKind.USER: {
+        'viewset': 'user.views.UserViewSet',
+        'action': 'download_user_list',
+        'columns': 'user.exports.USER_EXPORT_COLUMNS',
+        'file_name': 'users.xlsx',
+    },
+    ExportKind.DEPOSIT: {
+        'viewset': 'financial.views.DepositViewSet',
+        'action': 'download_deposit_list',
+        'columns': 'financial.exports.DEPOSIT_EXPORT_COLUMNS',
+        'file_name': 'deposit.xlsx',
+    },
+}
+
+
+def queue_export_job(request, kind):
+    """
+    MEH: Save job with query params of request & send to celery after commit, return job
+    """
+    from .tasks import run_export_job
+    params = {key: values for key, values in request.query_params.lists() if key != 'check_field'}
+    check_field = request.query_params.get('check_field')
+    job = ExportJob.objects.create(kind=kind, params=params, check_field=check_field, created_by=request.user)
+    transaction.on_commit(lambda: run_export_job.delay(job.pk))
+    return job
+
+
+def get_export_queryset(job):
+    """
+    MEH: Rebuild queryset out of request with viewset of export (synthetic GET request with saved params & user),
+    so worker apply exactly same get_queryset & filter_queryset of download action
+    """
+    config = EXPORT_JOBS[job.kind]
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    query = QueryDict(mutable=True)
+    for key, values in (job.params or {}).items():
+        query.setlist(key, values)
+    http_request.GET = query
+    request = Request(http_request)
+    request.user = job.created_by
+    view = import_string(config['viewset'])(action_map={'get': config['action']})
+    view.action = config['action']
+    view.request, view.args, view.kwargs, view.format_kwarg = request, (), {}, None
+    return view.filter_queryset(view.get_queryset())
+
+
+def set_export_job(job, **values):
+    for field_name, value in values.items():
+        setattr(job, field_name, value)
+    ExportJob.objects.filter(pk=job.pk).update(**values)
+
+
+def run_export(job):
+    """
+    MEH: Write full export (no row limit) to temp file in chunks & save to private export storage, progress saved each chunk
+    """
+    config = EXPORT_JOBS[job.kind]
+    columns = import_string(config['columns'])
+    queryset = get_export_queryset(job)
+    set_export_job(job, status=ExportStatus.RUNNING, start_date=timezone.now(), total_count=queryset.count(),
+                   row_count=0)
+
+    def iter_rows():
+        row_count = 0
+        for row in iter_export_rows(queryset, columns):
+            row_count += 1
+            if row_count % EXPORT_CHUNK_SIZE == 0:
+                set_export_job(job, row_count=row_count)
+            yield row
+        set_export_job(job, row_count=row_count)
+
+    headers = [column.header or column.name for column in columns]
+    check_header = next((column.header or column.name for column in columns if column.name == job.check_field), None)
+    with tempfile.TemporaryFile(suffix='.xlsx') as temp_file:
+        ExcelHandler.write_excel(temp_file, headers, iter_rows(), file_name=config['file_name'],
+                                 check_field=check_header)
+        temp_file.seek(0)
+        job.file.save(config['file_name'], File(temp_file), save=False)
+    now = timezone.now()
+    set_export_job(job, file=job.file.name, status=ExportStatus.DONE, end_date=now,
+                   expire_date=now + EXPORT_JOB_EXPIRE)
+
+
+def fail_stale_export_jobs():
+    """
+    MEH: PENDING or RUNNING job of dead worker never finish -> FAILED (late task skip it, only PENDING run)
+    return count
+    """
+    now = timezone.now()
+    stale = ExportJob.objects.filter(
+        Q(status=ExportStatus.PENDING, create_date__lte=now - EXPORT_JOB_PENDING_TIMEOUT) |
+        Q(status=ExportStatus.RUNNING, start_date__lte=now - EXPORT_JOB_RUNNING_TIMEOUT)
+    )
+    count = 0
+    for job in stale.iterator():
+        if job.file: # MEH: Died after save file, before DONE
+            job.file.delete(save=False)
+        set_export_job(job, file=None, status=ExportStatus.FAILED, detail=TG_EXPORT_JOB_TIMEOUT, end_date=now)
+        count += 1
+    return count
+
+
+def expire_export_jobs():
+    """
+    MEH: Delete artifact of expired jobs (keep job row for history) & fail stale jobs, return count of both
+    """
+    expired = ExportJob.objects.filter(status=ExportStatus.DONE, expire_date__lte=timezone.now())
+    count = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        set_export_job(job, file=None, status=ExportStatus.EXPIRED)
+        count += 1
+    return count + fail_stale_export_jobs()
@@ -1,13 +1,16 @@
 from django.db import models
+from django.conf import settings
 from django.core import validators
+from django.core.files.storage import FileSystemStorage
 from mptt.models import MPTTModel, TreeForeignKey
 from django.utils import timezone
 from employee.models import Employee
 from .images import *
 from django.core.exceptions import ValidationError
+from api.models import TreePathModel
 
 
-class FileDirectory(MPTTModel):
+class FileDirectory(TreePathModel, MPTTModel):
     name = models.CharField(max_length=78, validators=[validators.MinLengthValidator(1)],
                             blank=False, null=False)
     create_date = models.DateField(auto_now_add=True,
@@ -25,8 +28,10 @@ class FileDirectory(MPTTModel):
         order_insertion_by = ['create_date', 'name']
         parent_attr = 'parent_directory'
 
+    path_label_field = 'name'
+
     def __str__(self):
-        return '/'.join([ancestor.name for ancestor in self.get_ancestors(include_self=True)]) + '/'
+        return self.get_slug_path(separator='/') + '/'
 
     def clean(self): # MEH: Prevent circular reference A → B → C → A in Admin Panel
         if self.parent_directory:
@@ -35,15 +40,13 @@ class FileDirectory(MPTTModel):
             if self.pk and self.parent_directory.is_descendant_of(self):
                 raise ValidationError("You cannot assign a descendant as the parent directory.")
 
-    def get_slug_path(self):
-        return ' - '.join(
-            [directory.name for directory in self.get_ancestors(include_self=True)]
-        )
 
 def upload_path(instance): # MEH: Tree based Directory handle (and safe slug for names)
     if instance.for_order:
         return 'orders'
     directory = instance.parent_directory
+    if directory and directory.path_titles: # MEH: Stored path, no query for each parent
+        return '/'.join([safe_slug(name) for name in directory.path_titles])
     path_parts = []
     while directory:
         path_parts.insert(0, safe_slug(directory.name))
@@ -139,3 +142,73 @@ class ClearFileHistory(models.Model):
         self.delete_number = deleted_count
         self.save(update_fields=['delete_number'])
         return deleted_count
+
+
+class ExportKind(models.TextChoices):
+    USER = 'USR', 'لیست کاربران'
+    DEPOSIT = 'DEP', 'لیست تراکنش‌ها'
+
+
+class ExportStatus(models.TextChoices):
+    PENDING = 'PEN', 'در صف'
+    RUNNING = 'RUN', 'در حال ساخت'
+    DONE = 'DON', 'آماده'
+    FAILED = 'FAI', 'خطا'
+    EXPIRED = 'EXP', 'منقضی'
+
+
+def get_export_storage(): # MEH: Private storage out of MEDIA_ROOT (never served by /media/, only download action)
+    return FileSystemStorage(location=settings.EXPORT_ROOT)
+
+
+def export_file_path(instance, filename): # MEH: Export artifacts out of file manager tree (removed after expire)
+    return f'{instance.kind.lower()}/{uuid.uuid4().hex}-{safe_slug(filename)}' # MEH: Not guessable name
+
+
+class ExportJob(models.Model):
+    kind = models.CharField(max_length=3, validators=[validators.MinLengthValidator(3)],
+                            choices=ExportKind.choices,
+                            blank=False, null=False)
+    status = models.CharField(max_length=3, validators=[validators.MinLengthValidator(3)],
+                              choices=ExportStatus.choices, default=ExportStatus.PENDING, db_index=True,
+                              blank=False, null=False)
+    params = models.JSONField(default=dict,
+                              blank=True, null=True, verbose_name='Params') # MEH: Query params of list (filter, search, ordering)
+    check_field = models.CharField(max_length=73,
+                                   blank=True, null=True, verbose_name='Check Field')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                   blank=False, null=False, verbose_name='Created By',
+                                   related_name='export_jobs')
+    file = models.FileField(upload_to=export_file_path, storage=get_export_storage, blank=True, null=True)
+    row_count = models.PositiveIntegerField(default=0,
+                                            blank=False, null=False, verbose_name='Row Count')
+    total_count = models.PositiveIntegerField(default=0,
+                                              blank=False, null=False, verbose_name='Total Count')
+    detail = models.TextField(blank=True, null=True)
+    create_date = models.DateTimeField(auto_now_add=True,
+                                       verbose_name='Create Date')
+    start_date = models.DateTimeField(blank=True, null=True, verbose_name='Start Date')
+    end_date = models.DateTimeField(blank=True, null=True, verbose_name='End Date')
+    expire_date = models.DateTimeField(blank=True, null=True, db_index=True, verbose_name='Expire Date')
+
+    class Meta:
+        ordering = ['-create_date']
+        verbose_name = "Export Job"
+        verbose_name_plural = "Export Jobs"
+
+    def __str__(self):
+        return f'Export {self.get_kind_display()} #{self.pk}: {self.get_status_display()}'
+
+    @property
+    def progress(self):
+        if self.status == ExportStatus.DONE:
+            return 100
+        if not self.total_count:
+            return 0
+        return min(int(self.row_count * 100 / self.total_count), 99)
+
+    @property
+    def duration(self):
+        if self.start_date and self.end_date:
+            return (self.end_date - self.start_date).total_seconds()
+        return None
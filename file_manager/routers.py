@@ -1,6 +1,7 @@
 from rest_framework.routers import DefaultRouter
-from .views import FileDirectoryViewSet, FileItemViewSet
+from .views import FileDirectoryViewSet, FileItemViewSet, ExportJobViewSet
 
 router = DefaultRouter()
 router.register(r'file-manager/directory', FileDirectoryViewSet, basename='file-directory')
 router.register(r'file-manager/item', FileItemViewSet, basename='file-item')
+router.register(r'file-manager/export', ExportJobViewSet, basename='export-job')
@@ -1,7 +1,9 @@
 from rest_framework import serializers
-from .models import FileDirectory, FileItem, ClearFileHistory
+from rest_framework.reverse import reverse
+from .models import FileDirectory, FileItem, ClearFileHistory, ExportJob, ExportStatus
 from api.responses import *
-from api.mixins import CustomModelSerializer
+from api.mixins import CustomModelSerializer, CustomTreeListSerializer
+from api.explorer import resolve_has_children
 import jdatetime
 
 
@@ -15,6 +17,8 @@ class FileDirectoryTreeSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'parent_directory', 'parent_path', 'has_children', 'children'
         ]
+        list_serializer_class = CustomTreeListSerializer # MEH: Whole tree with 1 query
+        tree_label_field = 'name'
 
     @staticmethod
     def get_children(obj):
@@ -48,7 +52,7 @@ class FileDirectorySerializer(CustomModelSerializer):
 
     @staticmethod
     def get_has_children(obj):
-        return obj.sub_dirs.exists()
+        return resolve_has_children(obj, 'sub_dirs')
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -122,3 +126,34 @@ class ClearFileSerializer(CustomModelSerializer):
         )
         history.clear_order_files()
         return history
+
+
+class ExportJobSerializer(CustomModelSerializer):
+    """
+    MEH: Export Job state & progress (file url when done)
+    """
+    kind_display = serializers.SerializerMethodField()
+    status_display = serializers.SerializerMethodField()
+    file_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'kind', 'kind_display', 'status', 'status_display', 'progress', 'row_count', 'total_count',
+                  'file_url', 'detail', 'create_date', 'start_date', 'end_date', 'duration', 'expire_date']
+        read_only_fields = fields
+
+    @staticmethod
+    def get_kind_display(obj):
+        return obj.get_kind_display()
+
+    @staticmethod
+    def get_status_display(obj):
+        return obj.get_status_display()
+
+    def get_file_url(self, obj):
+        """
+        MEH: Authenticated download action (file in private storage, no media url)
+        """
+        if obj.file and obj.status == ExportStatus.DONE:
+            return reverse('export-job-download', args=[obj.pk], request=self.context.get('request'))
+        return None
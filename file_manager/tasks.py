@@ -0,0 +1,27 @@
+from celery import shared_task
+from django.utils import timezone
+from .models import ExportJob, ExportStatus
+from .export_jobs import run_export, set_export_job, expire_export_jobs
+
+
+@shared_task
+def run_export_job(job_id):
+    """
+    MEH: Build export file out of request (full list, no 10,000 limit), progress in ExportJob row
+    """
+    claimed = ExportJob.objects.filter(pk=job_id, status=ExportStatus.PENDING).update(status=ExportStatus.RUNNING,
+                                                                                      start_date=timezone.now())
+    if not claimed: # MEH: Redelivered task or job already run / timed out
+        return None
+    job = ExportJob.objects.select_related('created_by').get(pk=job_id)
+    try:
+        run_export(job)
+    except Exception as e:
+        set_export_job(job, status=ExportStatus.FAILED, detail=str(e), end_date=timezone.now())
+        raise
+    return job.row_count
+
+
+@shared_task
+def expire_export_job_files():
+    return expire_export_jobs()
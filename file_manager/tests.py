@@ -1,3 +1,68 @@
-from django.test import TestCase
+from unittest import mock
+from openpyxl import load_workbook
+from django.test import TestCase, override_settings
+from user.exports import USER_EXPORT_COLUMNS
+from user.models import User, Role
+from .models import ExportJob, ExportKind, ExportStatus
+from .tasks import run_export_job
 
-# Create your tests here.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}} # MEH: No redis in tests
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExportJobTaskTest(TestCase):
+    """
+    MEH: Only PENDING job claimed (1 run for redelivered task), full file & progress saved, error -> FAILED
+    """
+    def setUp(self):
+        Role.objects.create(title='Default role', is_default=True)
+        self.admin = User.objects.create(username='09120000000', phone_number='09120000000', is_superuser=True,
+                                         is_staff=True)
+        for index in range(1, 4):
+            User.objects.create(username=f'0912000000{index}', phone_number=f'0912000000{index}',
+                                first_name=f'User {index}')
+        self.job = ExportJob.objects.create(kind=ExportKind.USER, created_by=self.admin, params={})
+
+    def tearDown(self):
+        for job in ExportJob.objects.all():
+            if job.file:
+                job.file.delete(save=False) # MEH: Private export storage out of test DB
+
+    def test_run_export_job(self):
+        self.assertEqual(run_export_job(self.job.pk), 3)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ExportStatus.DONE)
+        self.assertEqual((self.job.row_count, self.job.total_count, self.job.progress), (3, 3, 100))
+        self.assertIsNotNone(self.job.expire_date)
+        with self.job.file.open('rb') as file:
+            rows = list(load_workbook(file, read_only=True).active.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), [column.header for column in USER_EXPORT_COLUMNS])
+        self.assertEqual(len(rows), 4) # MEH: Header & customers (admin not in list)
+        phone_index = [column.name for column in USER_EXPORT_COLUMNS].index('phone_number')
+        self.assertNotIn('09120000000', {row[phone_index] for row in rows[1:]})
+
+    def test_search_params_applied(self):
+        self.job.params = {'search': ['09120000002']}
+        self.job.save()
+        self.assertEqual(run_export_job(self.job.pk), 1)
+
+    def test_job_claimed_once(self):
+        run_export_job(self.job.pk)
+        self.assertIsNone(run_export_job(self.job.pk)) # MEH: Redelivered task
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ExportStatus.DONE)
+
+    def test_not_pending_job_skipped(self):
+        ExportJob.objects.filter(pk=self.job.pk).update(status=ExportStatus.FAILED)
+        self.assertIsNone(run_export_job(self.job.pk))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ExportStatus.FAILED)
+        self.assertFalse(self.job.file)
+
+    def test_failed_job(self):
+        with mock.patch('file_manager.tasks.run_export', side_effect=ValueError('Broken export')):
+            with self.assertRaises(ValueError):
+                run_export_job(self.job.pk)
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.detail), (ExportStatus.FAILED, 'Broken export'))
+        self.assertIsNotNone(self.job.end_date)
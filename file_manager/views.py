@@ -3,13 +3,19 @@ from rest_framework.response import Response
 from api.permissions import ApiAccess
 from rest_framework.decorators import action
 from .filters import TypeFilter
-from .models import FileDirectory, FileItem, ClearFileHistory
-from .serializers import FileDirectorySerializer, FileItemSerializer, ClearFileSerializer, FileDirectoryTreeSerializer
+from .models import FileDirectory, FileItem, ClearFileHistory, ExportJob, ExportStatus
+from .serializers import FileDirectorySerializer, FileItemSerializer, ClearFileSerializer, FileDirectoryTreeSerializer, \
+    ExportJobSerializer
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 from api.mixins import CustomMixinModelViewSet
 from api.serializers import CombineBulkDeleteSerializer
 from django.core.cache import cache
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, NotFound
+from django.http import FileResponse
+from django.utils import timezone
+from .excel_handler import EXCEL_CONTENT_TYPE
+from .export_jobs import EXPORT_JOBS
+from api.responses import TG_PERMISSION_DENIED, TG_EXPORT_NOT_READY
 from django_filters.rest_framework import DjangoFilterBackend
 
 
@@ -119,3 +125,37 @@ class FileItemViewSet(CustomMixinModelViewSet):
         res = self.custom_get(histories)
         cache.set(cache_key, res.data, timeout=60 * 60 * 24 * 365) # MEH: 1 year (always) until change
         return res
+
+
+@extend_schema(tags=['File-Manager'])
+class ExportJobViewSet(CustomMixinModelViewSet):
+    """
+    MEH: Export Job progress (poll) & download link, each user see only own jobs
+    """
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+    http_method_names = ['get', 'head', 'options']
+    permission_classes = [ApiAccess]
+    required_api_keys = {
+        '__all__': ['download_user_list', 'deposit_list'], # MEH: Same keys of export actions
+    }
+
+    def get_queryset(self, *args, **kwargs):
+        qs = super().get_queryset()
+        if self.request.user.is_superuser:
+            return qs
+        return qs.filter(created_by=self.request.user)
+
+    @extend_schema(summary='Download file of done Export Job (only creator of job)')
+    @action(detail=True, methods=['get'], url_path='download', filter_backends=[None])
+    def download(self, request, pk=None):
+        """
+        MEH: Stream export file from private storage (never public media url), only for user that created job
+        """
+        job = self.get_object(pk=pk)
+        if job.created_by_id != request.user.id:
+            raise PermissionDenied(TG_PERMISSION_DENIED)
+        if job.status != ExportStatus.DONE or not job.file or (job.expire_date and job.expire_date <= timezone.now()):
+            raise NotFound(TG_EXPORT_NOT_READY)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=EXPORT_JOBS[job.kind]['file_name'],
+                            content_type=EXCEL_CONTENT_TYPE)
@@ -0,0 +1,19 @@
+from django.db.models import Case, When, Value, F, BigIntegerField
+from django.db.models.functions import Concat
+from file_manager.excel_export import ExportColumn, format_jalali_datetime, format_number, make_label_formatter
+from .models import DepositType, TransactionType
+
+DEPOSIT_EXPORT_COLUMNS = [ # MEH: Same columns & order of DepositDownloadDataSerializer
+    ExportColumn('submit_date', 'تاریخ ثبت', formatter=format_jalali_datetime),
+    ExportColumn('user_display', 'نام مشتری',
+                 Concat('credit__owner__first_name', Value(' '), 'credit__owner__last_name')),
+    ExportColumn('receive_amount', 'بستانکار (تومان)',
+                 Case(When(increase=True, then=F('total_price')), default=Value(0), output_field=BigIntegerField()), format_number),
+    ExportColumn('pay_amount', 'بدهکار (تومان)',
+                 Case(When(increase=False, then=F('total_price')), default=Value(0), output_field=BigIntegerField()), format_number),
+    ExportColumn('deposit_type_display', 'نوع تراکنش', 'deposit_type', make_label_formatter(dict(DepositType.choices))),
+    ExportColumn('transaction_type_display', 'نحوه پرداحت', 'transaction_type',
+                 make_label_formatter(dict(TransactionType.choices))),
+    ExportColumn('deposit_date', 'تاریخ پرداخت', formatter=format_jalali_datetime),
+    ExportColumn('description', 'توضیحات'),
+]
@@ -16,9 +16,11 @@ from .filters import DepositFilter
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
-from api.responses import TG_DATA_CREATED
-import jdatetime
-from file_manager.excel_handler import ExcelHandler
+from api.responses import TG_DATA_CREATED, TG_JOB_QUEUED
+from file_manager.excel_export import export_excel
+from file_manager.export_jobs import queue_export_job
+from file_manager.models import ExportKind
+from .exports import DEPOSIT_EXPORT_COLUMNS
 
 
 @extend_schema(tags=['Financial'])
@@ -140,49 +142,19 @@ class DepositViewSet(CustomMixinModelViewSet):
         MEH: Direct Download Excel of Deposit List with Filter (up to 1000) (GET ACTION)
         """
         check_field = request.query_params.get('check_field')
-        queryset = self.filter_queryset(self.get_queryset())[:10000]  # MEH: For apply filters/search/order like list()
+        queryset = self.filter_queryset(self.get_queryset())  # MEH: For apply filters/search/order like list()
+        return export_excel(queryset, DEPOSIT_EXPORT_COLUMNS, file_name='deposit.xlsx', check_field=check_field,
+                            limit=10000)
 
-        persian_header = {
-            'user_display': 'نام مشتری',
-            'submit_date': 'تاریخ ثبت',
-            'deposit_date': 'تاریخ پرداخت',
-            'deposit_type_display': 'نوع تراکنش',
-            'receive_amount': 'بستانکار (تومان)',
-            'pay_amount': 'بدهکار (تومان)',
-            'description': 'توضیحات',
-            'transaction_type_display': 'نحوه پرداحت',
-        }
-        serializer_class = DepositDownloadDataSerializer
-        base_fields = list(serializer_class().get_fields().keys())
-        headers = [persian_header.get(f, f) for f in base_fields]  # MEH: Get Header from Serializer
-
-        rows = []
-        for deposit in queryset:
-            serializer = serializer_class(deposit)
-            row = []
-            for field in base_fields:
-                value = serializer.data.get(field)
-
-                # Convert Gregorian to Jalali for specific fields
-                if field in ['submit_date', 'deposit_date'] and value:
-                    try:
-                        g_date = deposit.submit_date if field == 'submit_date' else deposit.deposit_date
-                        if g_date:
-                            jdate = jdatetime.datetime.fromgregorian(datetime=g_date)
-                            value = jdate.strftime('%Y/%m/%d %H:%M')
-                    except Exception:
-                        pass
-
-                # Add comma separators for numeric fields
-                if field in ['receive_amount', 'pay_amount'] and isinstance(value, (int, float)):
-                    value = f"{value:,}"
-
-                # Default clean-up
-                if not value:
-                    value = '-'
-                row.append(str(value))
-            rows.append(row)
-        return ExcelHandler.generate_excel(headers, rows, file_name='deposit.xlsx', check_field=str(check_field))
+    @extend_schema(summary="Export full Deposit list in background (same query params of download)")
+    @action(detail=False, methods=['post'], http_method_names=['post'],
+            url_path='download-job', serializer_class=None)
+    def download_deposit_list_job(self, request):
+        """
+        MEH: Queue Excel of full Deposit List (no limit) in celery, poll progress in file-manager/export/{id}
+        """
+        job = queue_export_job(request, ExportKind.DEPOSIT)
+        return Response({'detail': TG_JOB_QUEUED, 'job_id': job.pk}, status=status.HTTP_202_ACCEPTED)
 
 
 @extend_schema(tags=['Financial'])
@@ -33,9 +33,7 @@ class DepartmentViewSet(CustomMixinModelViewSet):
         '__all__': ['department_manager']
     }
     cache_key = 'department_list'
-
-    def list(self, request, *args, **kwargs): # MEH: for set time out to 1 year (always!)
-        return super().list(request, timeout=60 * 60 * 24 * 365)
+    cache_timeout = 60 * 60 * 24 * 365 # MEH: 1 year (always!) until change
 
 
 @extend_schema(tags=['Message'])
@@ -81,6 +79,7 @@ class WebMessageViewSet(CustomMixinModelViewSet):
         'send_group_message': ['send_group_message']
     }
     cache_key = 'web_message_list'
+    cache_per_user = True # MEH: Each user see different list
 
     def get_queryset(self):
         qs = super().get_queryset().select_related('user', 'department', 'employee')
@@ -162,6 +161,7 @@ class WebMessageViewSet(CustomMixinModelViewSet):
         web_message = self.get_object(pk=pk)
         web_message.status = MessageStatus.ENDED
         web_message.save(update_fields=['status'])
+        self.invalidate_list_cache()
         return Response({"detail": TG_DATA_SET, "results": {"web_message": str(web_message), "status": web_message.status}}, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'], http_method_names = ['post'],
@@ -205,6 +205,7 @@ class WebMessageViewSet(CustomMixinModelViewSet):
         ]
         for i in range(0, len(contents), batch_size):
             WebMessageContent.objects.bulk_create(contents[i:i + batch_size])
+        self.invalidate_list_cache() # MEH: bulk_create not pass perform_create
         return Response({"detail": f"{len(web_messages)} messages sent."}, status=status.HTTP_201_CREATED)
 
 
@@ -221,9 +222,8 @@ class AlarmMessageViewSet(CustomMixinModelViewSet):
         'create': ['alarm_message_create']
     }
     cache_key = 'alarm_message_list'
-
-    def list(self, request, *args, **kwargs): # MEH: for set time out to 1 year (always!)
-        return super().list(request, timeout=60 * 60 * 24 * 365, *args, **kwargs)
+    cache_timeout = 60 * 60 * 24 * 365 # MEH: 1 year (always!) until change
+    cache_rendered = True
 
     def create(self, request, *args, **kwargs): # MEH: for parse employee that create this alarm
         if hasattr(request.user, 'employee_profile'): # MEH: Just make sure, employee got here
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from product.models import Paper
+from product.services.paper_pricing import reprice_papers
+
+
+class Command(BaseCommand):
+    help = 'Recalculate per paper price of all papers (after supplier price change) with 1 query & bulk update'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sheet-paper', type=int, help='Only papers of this Sheet Paper ID')
+        parser.add_argument('--size', type=int, help='Only papers of this Size ID')
+        parser.add_argument('--dry-run', action='store_true', help='Only count changed papers')
+
+    def handle(self, *args, **options):
+        queryset = Paper.objects.all()
+        if options['sheet_paper']:
+            queryset = queryset.filter(sheet_paper_id=options['sheet_paper'])
+        if options['size']:
+            queryset = queryset.filter(size_id=options['size'])
+        changed_count = reprice_papers(queryset, dry_run=options['dry_run'])
+        action = 'need reprice' if options['dry_run'] else 'repriced'
+        self.stdout.write(self.style.SUCCESS(f'{changed_count} paper {action}'))
@@ -7,6 +7,9 @@ from file_manager.images import *
 from django.core.exceptions import ValidationError
 from api.responses import TG_PREVENT_CIRCULAR_CATEGORY
 from django.db.models import Q
+from api.tree import get_cascade_ids, group_nodes_by
+from api.bulk import post_bulk_update
+from api.models import TreePathModel
 
 
 class ProductStatus(models.TextChoices):
@@ -28,7 +31,7 @@ class RoundPriceType(models.IntegerChoices):
     DEF = -1
 
 
-class ProductCategory(MPTTModel):
+class ProductCategory(TreePathModel, MPTTModel):
     title = models.CharField(max_length=78, unique=True, validators=[validators.MinLengthValidator(3)],
                              blank=False, null=False)
     description = models.TextField(max_length=236,
@@ -113,31 +116,21 @@ class ProductCategory(MPTTModel):
                 raise ValidationError("You cannot assign a descendant as the parent category.")
 
     def update_all_subcategories_and_items(self):
-        new_status = self.status
-        descendants = self.get_descendants()
-        locked = descendants.filter(status_lock=True)
-        blocked_ids = set()
-        for node in locked:
-            blocked_ids.update(
-                node.get_descendants(include_self=True)
-                .values_list('id', flat=True)
-            )
-        allowed_ids = (
-            descendants
-            .exclude(id__in=blocked_ids)
-            .values_list('id', flat=True)
-        )
-        allowed_ids = list(allowed_ids) + [self.id]
-        self.__class__.objects.filter(id__in=allowed_ids).update(status=new_status)
-        Product.objects.filter(
-            parent_category_id__in=allowed_ids,
-            status_lock=False
-        ).update(status=new_status)
-
-    def get_slug_path(self):
-        return ' - '.join(
-            [cat.title for cat in self.get_ancestors(include_self=True)]
-        )
+        self.__class__.bulk_update_subcategories_and_items([self])
+
+    @classmethod
+    def bulk_update_subcategories_and_items(cls, nodes):
+        """
+        MEH: Set status of nodes to all subcategories & products with 1 tree query (locked branch skipped)
+        """
+        for new_status, group in group_nodes_by(nodes, 'status'):
+            allowed_ids = get_cascade_ids(cls, group, lock_field='status_lock')
+            cls.objects.filter(id__in=allowed_ids).update(status=new_status)
+            Product.objects.filter(
+                parent_category_id__in=allowed_ids,
+                status_lock=False
+            ).update(status=new_status)
+            post_bulk_update.send(sender=Product, fields={'status': new_status}, cascade=True) # MEH: Cached product data
 
 
 class ProductType(models.TextChoices):
@@ -299,9 +292,8 @@ class Size(models.Model):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        paper_list = self.paper_list.all()
-        for paper in paper_list:
-            paper.save()
+        from product.services.paper_pricing import reprice_papers
+        reprice_papers(self.paper_list.all()) # MEH: All related papers with 1 query & 1 bulk update
 
 
 class Duration(models.Model):
@@ -477,9 +469,8 @@ class SheetPaper(models.Model):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        paper_list = self.paper_list.all()
-        for paper in paper_list:
-            paper.save()
+        from product.services.paper_pricing import reprice_papers
+        reprice_papers(self.paper_list.all()) # MEH: All related papers with 1 query & 1 bulk update
 
 
 class Paper(models.Model):
@@ -516,19 +507,11 @@ class Paper(models.Model):
         super().save(*args, **kwargs)
 
     def calculate_paper_price_per_size(self):
-        fit_along_length = self.sheet_paper.length // self.size.length
-        fit_along_width = self.sheet_paper.width //  self.size.width
-        rotated_fit_along_length = self.sheet_paper.length //  self.size.width
-        rotated_fit_along_width = self.sheet_paper.width //  self.size.length
-        total_fit = max(
-            fit_along_length * fit_along_width,
-            rotated_fit_along_length * rotated_fit_along_width
-        )
-        if total_fit == 0:
-            return 0  # MEH: can't cut this size from the sheet
-        price_per_piece = self.sheet_paper.purchase_price / self.sheet_paper.sheet_paper_number / total_fit
-        price_per_piece += self.sheet_paper.cutting_price / self.sheet_paper.sheet_paper_number / total_fit
-        return price_per_piece # MEH: Calculated base price per piece
+        from product.services.paper_pricing import calculate_paper_price
+        sheet_paper, size = self.sheet_paper, self.size
+        return calculate_paper_price(sheet_paper.length, sheet_paper.width, sheet_paper.purchase_price,
+                                     sheet_paper.cutting_price, sheet_paper.sheet_paper_number,
+                                     size.length, size.width) # MEH: Calculated base price per piece
 
 
 class Folding(models.Model):
@@ -666,7 +649,7 @@ class OptionInputType(models.TextChoices):
     FILE = 'FIL', 'فایل'
 
 
-class OptionCategory(MPTTModel):
+class OptionCategory(TreePathModel, MPTTModel):
     title = models.CharField(max_length=23, unique=True, validators=[validators.MinLengthValidator(3)],
                              blank=False, null=False)
     description = models.TextField(max_length=236,
@@ -714,15 +697,18 @@ class OptionCategory(MPTTModel):
                 raise ValidationError("You cannot assign a descendant as the parent category.")
 
     def update_all_subcategories_and_items(self): # MEH: Call when update is_active of a category
-        new_is_active = self.is_active
-        descendants = self.get_descendants()
-        descendants.update(is_active=new_is_active)
-        Option.objects.filter(parent_category__in=[self] + list(descendants)).update(is_active=new_is_active)
+        self.__class__.bulk_update_subcategories_and_items([self])
 
-    def get_slug_path(self):
-        return ' - '.join(
-            [cat.title for cat in self.get_ancestors(include_self=True)]
-        )
+    @classmethod
+    def bulk_update_subcategories_and_items(cls, nodes):
+        """
+        MEH: Set is_active of nodes to all subcategories & options with 1 tree query
+        """
+        for new_is_active, group in group_nodes_by(nodes, 'is_active'):
+            category_ids = get_cascade_ids(cls, group)
+            cls.objects.filter(id__in=category_ids).update(is_active=new_is_active)
+            Option.objects.filter(parent_category_id__in=category_ids).update(is_active=new_is_active)
+            post_bulk_update.send(sender=Option, fields={'is_active': new_is_active}, cascade=True) # MEH: Cached prices
 
 
 class PriceAmountType(models.TextChoices):
@@ -784,50 +770,26 @@ class ProductOption(models.Model):
         super().clean()
         if not self.option_id:
             return  # MEH: Skip if not fully initialized
-
-        def has_cycle(current_id, visited):
-            if current_id in visited:
-                return True
-            visited.add(current_id)
-            deps = ProductOption.objects.filter(product=self.product, option_id=current_id).values_list('dependent_option__id', flat=True)
-            for dep_id in deps:
-                if dep_id == self.option_id:  # MEH: direct cycle
-                    return True
-                if has_cycle(dep_id, visited.copy()):
-                    return True
-            return False
-
-        for dep in self.dependent_option.all():
-            if dep.id == self.option_id:
-                raise ValidationError("Option cannot depend on itself.")
-            if has_cycle(dep.id, {self.option_id}):
-                raise ValidationError(f"Circular dependency detected via Option {dep.id}.")
+        from product.services.option_graph import load_option_graph, get_topological_order, OptionCycleError
+        dependency_map, _ = load_option_graph(self.product_id) # MEH: 1 query for all edges of product
+        dependency_map[self.option_id] = [dep.id for dep in self.dependent_option.all()] if self.pk else []
+        if self.option_id in dependency_map[self.option_id]:
+            raise ValidationError("Option cannot depend on itself.")
+        try:
+            get_topological_order(dependency_map)
+        except OptionCycleError as e:
+            if self.option_id not in e.nodes: # MEH: Cycle of other options, not reachable from this one
+                return
+            dep_id = next(dep for dep in dependency_map[self.option_id] if dep in e.nodes)
+            raise ValidationError(f"Circular dependency detected via Option {dep_id}.")
 
     @staticmethod
     def detect_cycle(dependency_map): # MEH: Detects cycles in a dependency graph represented as a dict: { option_id: [dependent_option_ids] }
-        visited = set()
-        stack = set()
-
-        def dfs(option_id):
-            if option_id in stack:
-                return True  # MEH: Cycle detected
-            if option_id in visited:
-                return False
-            visited.add(option_id)
-            stack.add(option_id)
-            for dep in dependency_map.get(option_id, []):
-                if dfs(dep):
-                    return True
-            stack.remove(option_id)
-            return False
-
-        for opt_id in dependency_map:
-            if dfs(opt_id):
-                return True
-        return False # MEH: It's ok
-
-
-class GalleryCategory(MPTTModel):
+        from product.services.option_graph import detect_cycle
+        return detect_cycle(dependency_map)
+
+
+class GalleryCategory(TreePathModel, MPTTModel):
     name = models.CharField(max_length=78, unique=True, validators=[validators.MinLengthValidator(3)],
                             blank=False, null=False)
     sort_number = models.SmallIntegerField(default=0,
@@ -845,9 +807,11 @@ class GalleryCategory(MPTTModel):
         order_insertion_by = ['sort_number', 'name']
         parent_attr = 'parent_category'
 
+    path_label_field = 'name'
+
     def __str__(self):
-        if self.parent_category:
-            return f"{self.parent_category}/{self.name}/"
+        if self.parent_category_id:
+            return f"{self.get_slug_path(separator='/')}/"
         else:
             return f"{self.name}"
 
@@ -858,11 +822,6 @@ class GalleryCategory(MPTTModel):
             if self.pk and self.parent_category.is_descendant_of(self):
                 raise ValidationError("You cannot assign a descendant as the parent category.")
 
-    def get_slug_path(self):
-        return ' - '.join(
-            [category.name for category in self.get_ancestors(include_self=True)]
-        )
-
 
 def get_random_basename(instance): # MEH: With this image and thumbnail get equal name
     if not hasattr(instance, "_random_basename"):
@@ -922,7 +881,7 @@ class GalleryImage(models.Model):
         return self.image_file.url
 
 
-class PriceListCategory(MPTTModel):
+class PriceListCategory(TreePathModel, MPTTModel):
     title = models.CharField(max_length=23, unique=True, validators=[validators.MinLengthValidator(3)],
                              blank=False, null=False)
     description = models.TextField(max_length=236,
@@ -960,15 +919,18 @@ class PriceListCategory(MPTTModel):
                 raise ValidationError("You cannot assign a descendant as the parent category.")
 
     def update_all_subcategories_and_items(self): # MEH: Call when update is_active of a category
-        new_is_active = self.is_active
-        descendants = self.get_descendants()
-        descendants.update(is_active=new_is_active)
-        PriceListTable.objects.filter(price_list_categories__in=[self] + list(descendants)).update(is_active=new_is_active)
-
-    def get_slug_path(self):
-        return ' - '.join(
-            [cat.title for cat in self.get_ancestors(include_self=True)]
-        )
+        self.__class__.bulk_update_subcategories_and_items([self])
+
+    @classmethod
+    def bulk_update_subcategories_and_items(cls, nodes):
+        """
+        MEH: Set is_active of nodes to all subcategories & tables with 1 tree query
+        """
+        for new_is_active, group in group_nodes_by(nodes, 'is_active'):
+            category_ids = get_cascade_ids(cls, group)
+            cls.objects.filter(id__in=category_ids).update(is_active=new_is_active)
+            PriceListTable.objects.filter(price_list_categories__in=category_ids).update(is_active=new_is_active)
+            post_bulk_update.send(sender=PriceListTable, fields={'is_active': new_is_active}, cascade=True)
 
     def delete(self, *args, **kwargs):
         table_deleted_count = self.delete_recursive()
@@ -983,6 +945,15 @@ class PriceListCategory(MPTTModel):
             deleted_count += 1
         return deleted_count
 
+    @classmethod
+    def get_recursive_delete_querysets(cls, queryset):
+        """
+        MEH: Tables of list of category for bulk delete (same as delete_recursive, in 1 collector)
+        """
+        table_ids = (cls.sub_price_list_tables.through.objects
+                     .filter(pricelistcategory__in=queryset).values_list('pricelisttable_id', flat=True))
+        return [PriceListTable.objects.filter(pk__in=list(table_ids))]
+
 
 class SizeUnit(models.TextChoices):
     CM = 'CM', 'سانتی متر'
@@ -1051,6 +1022,9 @@ class PriceListTable(models.Model):
                              blank=True, null=True,
                              choices=Column.choices)
     show_category = models.BooleanField(default=True)
+    cells = models.JSONField(default=dict, blank=True, null=True, editable=False,
+                             verbose_name='Cells') # MEH: Materialized grid {dims, labels, products: {id: {version, rows}}}
+    cells_update = models.DateTimeField(blank=True, null=True, editable=False, verbose_name='Cells Update')
 
     class Meta:
         verbose_name = 'Price List Table'
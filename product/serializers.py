@@ -7,7 +7,10 @@ from .models import Product, OffsetProduct, LargeFormatProduct, SolidProduct, Di
     Size, Duration, SheetPaper, Paper, Banner, Color, Folding, OptionCategory, Option, ProductOption, \
     PriceListCategory, PriceListTable
 from api.responses import *
-from api.mixins import CustomModelSerializer, CustomChoiceField
+from api.mixins import CustomModelSerializer, CustomChoiceField, CustomTreeListSerializer, CustomSlugPathListSerializer, \
+    get_context_path
+from api.explorer import resolve_has_children
+from .services.formula import compile_formula, FormulaError
 import json
 
 
@@ -38,7 +41,7 @@ class ProductCategoryBriefSerializer(CustomModelSerializer):
 
     @staticmethod
     def get_has_children(obj):
-        return obj.sub_categories.exists()
+        return resolve_has_children(obj, 'sub_categories')
 
     @staticmethod
     def get_status_display(obj):
@@ -86,7 +89,7 @@ class ProductCategorySerializer(CustomModelSerializer):
 
     class Meta:
         model = ProductCategory
-        fields = '__all__'
+        exclude = ['path_titles', 'path_ids']
 
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -134,6 +137,8 @@ class ProductCategoryTreeSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'parent_category', 'parent_path', 'has_children', 'children'
         ]
+        list_serializer_class = CustomTreeListSerializer # MEH: Whole tree with 1 query
+        tree_label_field = 'title'
 
     @staticmethod
     def get_children(obj):
@@ -472,6 +477,14 @@ class ProductFormulaPriceSerializer(DigitalProductSerializer):
             if field.name != 'formula'
         }
 
+    @staticmethod
+    def validate_formula(value):
+        try:
+            compile_formula(value) # MEH: Parse, check variables & number result (not bool) at save time (not in price quote)
+        except FormulaError as e:
+            raise serializers.ValidationError(f'{TG_FORMULA_INVALID} {e}')
+        return value.strip()
+
 
 class SizeSerializer(CustomModelSerializer):
     """
@@ -589,7 +602,7 @@ class GalleryCategoryBriefSerializer(CustomModelSerializer):
 
     @staticmethod
     def get_has_children(obj):
-        return obj.sub_galleries.exists()
+        return resolve_has_children(obj, 'sub_galleries')
 
     @staticmethod
     def get_parent_category(obj):
@@ -632,6 +645,8 @@ class GalleryCategoryTreeSerializer(CustomModelSerializer):
         fields = [
             'id', 'name', 'parent_category', 'parent_path', 'has_children', 'children'
         ]
+        list_serializer_class = CustomTreeListSerializer # MEH: Whole tree with 1 query
+        tree_label_field = 'name'
 
     @staticmethod
     def get_children(obj):
@@ -656,7 +671,7 @@ class GalleryCategorySerializer(CustomModelSerializer):
 
     class Meta:
         model = GalleryCategory
-        fields = '__all__'
+        exclude = ['path_titles', 'path_ids']
 
     @staticmethod
     def get_type(obj):
@@ -723,7 +738,7 @@ class OptionCategoryBriefSerializer(CustomModelSerializer):
 
     @staticmethod
     def get_has_children(obj):
-        return obj.sub_categories.exists()
+        return resolve_has_children(obj, 'sub_categories')
 
     @staticmethod
     def get_parent_category(obj):
@@ -760,7 +775,7 @@ class OptionCategorySerializer(CustomModelSerializer):
 
     class Meta:
         model = OptionCategory
-        fields = '__all__'
+        exclude = ['path_titles', 'path_ids']
 
     @staticmethod
     def get_type(obj):
@@ -819,6 +834,8 @@ class OptionCategoryTreeSerializer(CustomModelSerializer):
     class Meta:
         model = OptionCategory
         fields = ['id', 'title', 'children', 'parent_path', 'has_children', 'parent_category']
+        list_serializer_class = CustomTreeListSerializer # MEH: Whole tree with 1 query
+        tree_label_field = 'title'
 
     @staticmethod
     def get_children(obj):
@@ -865,10 +882,15 @@ class OptionProductListSerializer(CustomModelSerializer):
     class Meta:
         model = ProductOption
         fields = ['product', 'product_display', 'product_category']
+        list_serializer_class = CustomSlugPathListSerializer # MEH: Category path of all rows with 1 query
+        slug_path_model = ProductCategory
+        slug_path_source = 'product.parent_category_id'
 
-    @staticmethod
-    def get_product_category(obj):
-        return str(obj.product.get_category_path())
+    def get_product_category(self, obj):
+        titles = get_context_path(self, obj)
+        if titles is None:
+            return str(obj.product.get_category_path())
+        return ' - '.join(titles)
 
 
 class ProductInCategorySerializer(CustomModelSerializer):
@@ -876,15 +898,26 @@ class ProductInCategorySerializer(CustomModelSerializer):
     MEH: for Table of product in category (with fields)
     """
     parent_path = serializers.SerializerMethodField()
-    parent_category = serializers.StringRelatedField()
+    parent_category = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = ['id', 'title', 'parent_path', 'parent_category', 'type']
+        list_serializer_class = CustomSlugPathListSerializer # MEH: Category path of all rows with 1 query
+        slug_path_model = ProductCategory
+        slug_path_source = 'parent_category_id'
 
-    @staticmethod
-    def get_parent_path(obj):
-        return obj.get_category_path()
+    def get_parent_path(self, obj):
+        titles = get_context_path(self, obj)
+        if titles is None:
+            return obj.get_category_path()
+        return ' - '.join(titles)
+
+    def get_parent_category(self, obj):
+        titles = get_context_path(self, obj)
+        if titles is None:
+            return str(obj.parent_category)
+        return titles[-1] if titles else None
 
 
 class PriceListCategoryBriefSerializer(CustomModelSerializer):
@@ -921,7 +954,7 @@ class PriceListCategorySerializer(CustomModelSerializer):
 
     class Meta:
         model = PriceListCategory
-        fields = '__all__'
+        exclude = ['path_titles', 'path_ids']
 
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -959,7 +992,7 @@ class PriceListTableSerializer(CustomModelSerializer):
 
     class Meta:
         model = PriceListTable
-        fields = '__all__'
+        exclude = ['cells']
 
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -967,3 +1000,40 @@ class PriceListTableSerializer(CustomModelSerializer):
             url = obj.image.file.url
             return request.build_absolute_uri(url) if request else url
         return None
+
+
+class ProductEnabledOptionSerializer(serializers.Serializer):
+    """
+    MEH: Selected options of customer (for find enabled options of product)
+    """
+    options = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+
+class ProductQuoteSerializer(serializers.Serializer):
+    """
+    MEH: Input of 1 price quote (each product type use its own fields)
+    """
+    tirage = serializers.IntegerField(min_value=1, required=True)
+    size = serializers.IntegerField(required=False, allow_null=True)
+    face = serializers.ChoiceField(choices=[1, 2], default=1)
+    duration = serializers.IntegerField(required=False, allow_null=True)
+    page = serializers.IntegerField(min_value=1, default=1)
+    paper = serializers.IntegerField(required=False, allow_null=True)
+    folding = serializers.IntegerField(required=False, allow_null=True)
+    width = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    height = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    options = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+
+class ProductQuoteLineSerializer(ProductQuoteSerializer):
+    """
+    MEH: 1 line of cart for batch quote
+    """
+    product = serializers.IntegerField(required=True)
+
+
+class ProductBatchQuoteSerializer(serializers.Serializer):
+    """
+    MEH: All lines of cart for batch quote
+    """
+    lines = ProductQuoteLineSerializer(many=True, allow_empty=False, max_length=500)
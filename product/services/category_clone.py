@@ -1,84 +1,139 @@
-from copy import deepcopy
-from django.db.models import ManyToManyField
-from django.core.exceptions import ObjectDoesNotExist
-from django.utils import timezone
-from product.models import ProductCategory
-
-PRODUCT_INFO_MAP = {
-    'OFF': 'offset_info',
-    'LAR': 'large_format_info',
-    'SLD': 'solid_info',
-    'DIG': 'digital_info',
-}
-
-def clone_product(original_product, new_category):
+from copy import copy
+from itertools import groupby
+from operator import attrgetter
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, When, F, Q
+from api.tree import get_tree_attrs, get_subtree_filter, refresh_subtree_paths, mark_tree_changed
+from product.models import ProductCategory, Product
+from product.services.product_copy import copy_products
+
+CLONE_BATCH_SIZE = 500
+CLONE_ASYNC_THRESHOLD = 300 # MEH: Categories + Products, bigger tree cloned in celery job
+CLONE_JOB_TIMEOUT = 60 * 60 * 24 # MEH: Keep job progress 1 day
+
+
+def get_clone_job_key(job_id):
+    return f'product:clone:{job_id}'
+
+
+def get_clone_job(job_id):
+    return cache.get(get_clone_job_key(job_id))
+
+
+def set_clone_job(job_id, **values):
     """
-    Clone a Product object fully (including product info model and M2M fields),
-    using the exact logic from your copy_product view.
+    MEH: Update progress of clone job in cache (status, done, total, new_category_id, detail)
     """
-    # 1) Copy base product
-    product_copy = deepcopy(original_product)
-    product_copy.pk = None
-    product_copy.parent_category = new_category
-
-    timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
-    product_copy.title = f"{original_product.title} (copy: {timestamp})"
-    product_copy.save()
-
-    # 2) Copy product ManyToMany
-    for field in original_product._meta.get_fields():
-        if isinstance(field, ManyToManyField) and not field.auto_created:
-            values = getattr(original_product, field.name).all()
-            getattr(product_copy, field.name).set(values)
-
-    # 3) Copy related product info (offset_info, large_format_info, etc.)
-    info_field = PRODUCT_INFO_MAP.get(original_product.type)
-    if not info_field:
-        product_copy.delete()
-        return None
-
-    try:
-        original_info = getattr(original_product, info_field)
-    except ObjectDoesNotExist:
-        product_copy.delete()
-        return None
-
-    info_copy = deepcopy(original_info)
-    info_copy.pk = None
-    info_copy.product_info = product_copy
-    info_copy.save()
-
-    # 4) Copy M2M inside product-info model
-    for field in original_info._meta.get_fields():
-        if isinstance(field, ManyToManyField) and not field.auto_created:
-            values = getattr(original_info, field.name).all()
-            getattr(info_copy, field.name).set(values)
-
-    return product_copy
-
-def clone_category_tree(original, parent_copy=None):
+    job = get_clone_job(job_id) or {}
+    job.update(values)
+    cache.set(get_clone_job_key(job_id), job, timeout=CLONE_JOB_TIMEOUT)
+    return job
+
+
+def get_subtree_size(category):
     """
-    Recursively clone a category tree including all subcategories AND
-    all products inside each category using full product clone logic.
+    MEH: Count of Categories & Products in subtree (for choose inline or celery clone)
     """
+    tree_attr, left_attr, right_attr = get_tree_attrs(ProductCategory)
+    category_count = (getattr(category, right_attr) - getattr(category, left_attr) + 1) // 2
+    product_count = Product.objects.filter(
+        parent_category__in=ProductCategory.objects.filter(get_subtree_filter(ProductCategory, [category]))
+    ).count()
+    return category_count + product_count
+
 
-    # --- Clone category ---
-    new_cat = deepcopy(original)
-    new_cat.pk = None
-    new_cat.parent_category = parent_copy
-    new_cat.title = f"{original.title} (copy)"
-    new_cat.landing = None     # OneToOne cannot be reused
-    new_cat.save()
+def get_sort_key(node):
+    return tuple(getattr(node, field_name) for field_name in node._mptt_meta.order_insertion_by)
 
-    # --- Clone products inside this category ---
-    from product.models import Product
-    original_products = Product.objects.filter(parent_category=original)
 
-    for product in original_products:
-        clone_product(product, new_cat)
+def open_tree_space(model, parent, node, width):
+    """
+    MEH: Find place of new subtree like MPTT insert (order_insertion_by) & open space for it with 1 UPDATE
+    return (tree_id, lft, level) of new subtree root
+    """
+    tree_attr, left_attr, right_attr = get_tree_attrs(model)
+    level_attr = model._mptt_meta.level_attr
+    if parent is None:
+        siblings = model._tree_manager.root_nodes().order_by(tree_attr)
+    else:
+        parent = model._tree_manager.get(pk=parent.pk) # MEH: Fresh lft & rght
+        siblings = model._tree_manager.filter(**{model._mptt_meta.parent_attr: parent}).order_by(left_attr)
+    sort_key = get_sort_key(node)
+    previous = None
+    for sibling in siblings:
+        if get_sort_key(sibling) <= sort_key:
+            previous = sibling
+    if parent is None: # MEH: New tree after previous root (shift next trees)
+        tree_id = getattr(previous, tree_attr) + 1 if previous else 1
+        model._tree_manager.filter(**{f'{tree_attr}__gte': tree_id}).update(**{tree_attr: F(tree_attr) + 1})
+        return tree_id, 1, 0
+    tree_id = getattr(parent, tree_attr)
+    new_left = getattr(previous, right_attr) + 1 if previous else getattr(parent, left_attr) + 1
+    model._tree_manager.filter(
+        Q(**{f'{left_attr}__gte': new_left}) | Q(**{f'{right_attr}__gte': new_left}), **{tree_attr: tree_id}
+    ).update(**{
+        left_attr: Case(When(**{f'{left_attr}__gte': new_left}, then=F(left_attr) + width), default=F(left_attr)),
+        right_attr: Case(When(**{f'{right_attr}__gte': new_left}, then=F(right_attr) + width), default=F(right_attr)),
+    })
+    return tree_id, new_left, getattr(parent, level_attr) + 1
 
-    # --- Recursively clone children ---
-    for child in original.get_children():
-        clone_category_tree(child, parent_copy=new_cat)
 
-    return new_cat
\ No newline at end of file
+def clone_category_tree(original, parent_copy=None, progress=None):
+    """
+    MEH: Clone category subtree with all products (info, M2M, options) in a few bulk statement:
+    1 read for subtree, 1 UPDATE for tree space, categories created level by level with precomputed lft, rght & tree_id
+    progress(done, total) called after each batch (celery job)
+    """
+    model = ProductCategory
+    tree_attr, left_attr, right_attr = get_tree_attrs(model)
+    level_attr = model._mptt_meta.level_attr
+    with transaction.atomic():
+        original = model._tree_manager.get(pk=original.pk) # MEH: Fresh tree fields
+        categories = list(model._tree_manager.filter(get_subtree_filter(model, [original])).order_by(left_attr))
+        products = list(Product.objects.filter(parent_category_id__in=[category.pk for category in categories])
+                        .order_by('pk'))
+        total, done = len(categories) + len(products), 0
+        category_copies = {}
+        for category in categories:
+            category_copy = copy(category)
+            category_copy.pk = None
+            category_copy.title = f"{category.title} (copy)"
+            category_copy.landing = None # MEH: OneToOne cannot be reused
+            category_copy.path_titles, category_copy.path_ids = [], []
+            category_copies[category.pk] = category_copy
+        tree_id, new_left, new_level = open_tree_space(model, parent_copy, category_copies[original.pk],
+                                                       width=len(categories) * 2)
+        left_delta = new_left - getattr(original, left_attr)
+        level_delta = new_level - getattr(original, level_attr)
+        category_map = {}
+        for level, group in groupby(sorted(categories, key=attrgetter(level_attr)), key=attrgetter(level_attr)):
+            group = list(group)
+            copies = []
+            for category in group:
+                category_copy = category_copies[category.pk]
+                if category.pk == original.pk:
+                    category_copy.parent_category_id = parent_copy.pk if parent_copy else None
+                else:
+                    category_copy.parent_category_id = category_map[category.parent_category_id]
+                setattr(category_copy, tree_attr, tree_id)
+                setattr(category_copy, left_attr, getattr(category, left_attr) + left_delta)
+                setattr(category_copy, right_attr, getattr(category, right_attr) + left_delta)
+                setattr(category_copy, level_attr, level + level_delta)
+                copies.append(category_copy)
+            created = model._tree_manager.bulk_create(copies, batch_size=CLONE_BATCH_SIZE) # MEH: 1 level each time (parent id needed)
+            category_map.update({old.pk: new.pk for old, new in zip(group, created)})
+            done += len(created)
+            if progress:
+                progress(done, total)
+        new_root = model._tree_manager.get(pk=category_map[original.pk])
+        refresh_subtree_paths(new_root)
+        for start in range(0, len(products), CLONE_BATCH_SIZE):
+            batch = products[start:start + CLONE_BATCH_SIZE]
+            copy_products(batch, category_map=category_map)
+            done += len(batch)
+            if progress:
+                progress(done, total)
+    mark_tree_changed(model) # MEH: bulk_create don't send post_save
+    return new_root
+
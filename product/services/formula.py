@@ -0,0 +1,198 @@
+import ast
+import hashlib
+import math
+from functools import lru_cache
+from itertools import product as grid_product
+
+FORMULA_VARIABLES = {
+    'tirage': 'Count of copies',
+    'page': 'Count of pages',
+    'face': 'Print faces (1 or 2)',
+    'length': 'Size length',
+    'width': 'Size width',
+    'paper_price': 'Per-Paper price of paper',
+    'color_print_price': 'Color print price of paper',
+    'baw_print_price': 'Black & White print price of paper',
+    'cutting_price': 'Cutting price of paper',
+    'folding_price': 'Folding price of paper',
+    'folding': 'Folding number',
+}
+
+FORMULA_FUNCTIONS = {
+    'min': min,
+    'max': max,
+    'abs': abs,
+    'round': round,
+    'ceil': math.ceil,
+    'floor': math.floor,
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.Name, ast.Load,
+    ast.Constant, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub,
+    ast.Not, ast.And, ast.Or, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+MAX_POWER = 10 # MEH: Prevent huge number (like 9 ** 9 ** 9) in formula
+SAFE_GLOBALS = {'__builtins__': {}, **FORMULA_FUNCTIONS}
+
+
+class FormulaError(ValueError):
+    """
+    MEH: Invalid formula (syntax, not allowed node, unknown variable or function)
+    """
+
+
+class CompiledFormula:
+    """
+    MEH: Formula parsed & checked 1 time, evaluate with python code object (no parse for each price)
+    """
+    def __init__(self, formula, code, variables):
+        self.formula = formula
+        self.code = code
+        self.variables = variables
+
+    def evaluate(self, **values):
+        missing = self.variables - values.keys()
+        if missing:
+            raise FormulaError(f'Missing variable: {", ".join(sorted(missing))}')
+        try:
+            result = eval(self.code, SAFE_GLOBALS, values)
+            if isinstance(result, bool) or not isinstance(result, (int, float)) or not math.isfinite(result):
+                raise FormulaError('Result is not a finite number') # MEH: bool (True -> price 1), complex, inf, nan
+            return result
+        except (ArithmeticError, TypeError, ValueError) as e: # MEH: OverflowError of huge result too
+            raise FormulaError(str(e))
+
+    def evaluate_grid(self, axes, **fixed):
+        """
+        MEH: Price of all combination of axes in 1 call, axes -> {'tirage': [100, 200], 'paper': [{...}], 'size': [{...}]}
+        scalar axis value bound to axis name, dict axis value merged in variables (its 'id' used in result key)
+        return [(key tuple, price), ...] in axes order
+        """
+        names = list(axes)
+        namespace = dict(fixed)
+        result = []
+        for combination in grid_product(*(axes[name] for name in names)):
+            key = []
+            for name, value in zip(names, combination):
+                if isinstance(value, dict):
+                    namespace.update(value)
+                    key.append(value.get('id'))
+                else:
+                    namespace[name] = value
+                    key.append(value)
+            result.append((tuple(key), self.evaluate(**namespace)))
+        return result
+
+
+class FormulaValidator(ast.NodeVisitor):
+    """
+    MEH: Walk on AST & reject any node, name or call not in white list
+    """
+    def __init__(self):
+        self.variables = set()
+
+    def generic_visit(self, node):
+        if not isinstance(node, ALLOWED_NODES):
+            raise FormulaError(f'Not allowed: {node.__class__.__name__}')
+        super().generic_visit(node)
+
+    def visit_Name(self, node):
+        if node.id in FORMULA_VARIABLES:
+            self.variables.add(node.id)
+        elif node.id not in FORMULA_FUNCTIONS:
+            raise FormulaError(f'Unknown variable: {node.id}')
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise FormulaError(f'Not allowed value: {node.value!r}')
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FORMULA_FUNCTIONS or node.keywords:
+            raise FormulaError('Not allowed function')
+        for arg in node.args:
+            self.visit(arg)
+
+    def visit_BinOp(self, node):
+        if isinstance(node.op, ast.Pow):
+            exponent = node.right.operand if isinstance(node.right, ast.UnaryOp) and \
+                isinstance(node.right.op, (ast.USub, ast.UAdd)) else node.right
+            if not isinstance(exponent, ast.Constant) or isinstance(exponent.value, bool) or \
+                    not isinstance(exponent.value, (int, float)) or abs(exponent.value) > MAX_POWER:
+                raise FormulaError(f'Power must be a number until {MAX_POWER}')
+            if any(isinstance(child, ast.BinOp) and isinstance(child.op, ast.Pow) for child in ast.walk(node.left)):
+                raise FormulaError('Nested power not allowed') # MEH: (9 ** 10) ** 10 ** ... -> huge number
+        self.generic_visit(node)
+
+
+def is_bool_result(node):
+    """
+    MEH: Result node always/maybe bool (tirage > 5, not page, a and b > 1, x if c else y < 2)
+    """
+    if isinstance(node, ast.Compare) or isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return True
+    if isinstance(node, ast.BoolOp):
+        return any(is_bool_result(value) for value in node.values)
+    if isinstance(node, ast.IfExp):
+        return is_bool_result(node.body) or is_bool_result(node.orelse)
+    return False
+
+
+def get_formula_hash(formula):
+    return hashlib.md5(formula.encode()).hexdigest()
+
+
+def compile_formula(formula):
+    """
+    MEH: Parse & validate formula, return CompiledFormula (raise FormulaError)
+    """
+    formula = (formula or '').strip()
+    if not formula:
+        raise FormulaError('Empty formula')
+    try:
+        tree = ast.parse(formula, mode='eval')
+    except SyntaxError as e:
+        raise FormulaError(f'Syntax error: {e.msg}')
+    validator = FormulaValidator()
+    validator.visit(tree)
+    if is_bool_result(tree.body):
+        raise FormulaError('Result must be a number, not condition')
+    return CompiledFormula(formula, compile(tree, '<formula>', 'eval'), frozenset(validator.variables))
+
+
+@lru_cache(maxsize=1024)
+def _get_cached_formula(product_id, formula_hash, formula):
+    return compile_formula(formula)
+
+
+def get_product_formula(product_id, formula):
+    """
+    MEH: Compiled formula of product per process, keyed by product id & formula hash (new formula -> new compile)
+    """
+    return _get_cached_formula(product_id, get_formula_hash(formula), formula)
+
+
+def get_paper_variables(paper):
+    """
+    MEH: Formula variables of 1 Paper (for grid axis)
+    """
+    return {
+        'id': paper.pk,
+        'paper_price': paper.per_paper_price,
+        'color_print_price': paper.color_print_price,
+        'baw_print_price': paper.baw_print_price,
+        'cutting_price': paper.cutting_price,
+        'folding_price': paper.folding_price,
+    }
+
+
+def get_size_variables(size):
+    """
+    MEH: Formula variables of 1 Size (for grid axis)
+    """
+    return {
+        'id': size.pk,
+        'length': size.length,
+        'width': size.width,
+    }
@@ -0,0 +1,140 @@
+from collections import deque
+from functools import lru_cache
+from django.core.cache import cache
+from product.models import Product, ProductOption
+from api.cache import get_generations
+from product.services.quote import get_product_resource, PRICE_INPUT_RESOURCE, PRICE_INPUT_RESOURCES, PRICE_MATRIX_TIMEOUT
+
+
+class OptionCycleError(ValueError):
+    """
+    MEH: Option dependency graph has cycle (nodes in cycle in .nodes)
+    """
+    def __init__(self, nodes):
+        self.nodes = nodes
+        super().__init__(f'Circular dependency between options: {", ".join(map(str, sorted(nodes)))}')
+
+
+def get_topological_order(dependency_map):
+    """
+    MEH: Kahn algorithm (no recursion), dependency_map -> {option_id: [dependent_option_ids]}
+    return option ids with dependencies first, raise OptionCycleError if any cycle
+    """
+    nodes = set(dependency_map)
+    for deps in dependency_map.values():
+        nodes.update(deps)
+    in_degree = {node: 0 for node in nodes}
+    users = {node: [] for node in nodes} # MEH: Reverse edge (dependency -> options need it)
+    for option_id, deps in dependency_map.items():
+        for dep in set(deps):
+            in_degree[option_id] += 1
+            users[dep].append(option_id)
+    queue = deque(sorted(node for node, degree in in_degree.items() if degree == 0))
+    order = []
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        for user in users[node]:
+            in_degree[user] -= 1
+            if in_degree[user] == 0:
+                queue.append(user)
+    if len(order) != len(nodes):
+        raise OptionCycleError(nodes - set(order)) # MEH: Remain nodes are in (or after) a cycle
+    return order
+
+
+def detect_cycle(dependency_map):
+    try:
+        get_topological_order(dependency_map)
+    except OptionCycleError:
+        return True
+    return False
+
+
+def get_dependency_closure(dependency_map, order):
+    """
+    MEH: All direct & indirect dependencies of each option in 1 pass on topological order
+    """
+    closure = {}
+    for option_id in order:
+        deps = set(dependency_map.get(option_id, ()))
+        for dep in dependency_map.get(option_id, ()):
+            deps |= closure[dep]
+        closure[option_id] = frozenset(deps)
+    return closure
+
+
+def load_option_graph(product_id):
+    """
+    MEH: All options & dependency edges of product in 1 query (LEFT JOIN on dependent_option)
+    return ({option_id: [dependent_option_ids]}, {option_id: always_show})
+    """
+    dependency_map, always_show = {}, {}
+    rows = ProductOption.objects.filter(product_id=product_id).order_by().values_list(
+        'option_id', 'always_show', 'dependent_option'
+    )
+    for option_id, show, dep in rows:
+        always_show[option_id] = show
+        deps = dependency_map.setdefault(option_id, [])
+        if dep is not None:
+            deps.append(dep)
+    return dependency_map, always_show
+
+
+def build_option_graph(product_id):
+    """
+    MEH: Plain data of product option graph for cache (topological order & closure), cycle saved as error
+    None if product not found
+    """
+    dependency_map, always_show = load_option_graph(product_id)
+    if not dependency_map and not Product.objects.filter(pk=product_id).exists(): # MEH: Only for product without option
+        return None
+    try:
+        order = get_topological_order(dependency_map)
+    except OptionCycleError as e:
+        return {'dependencies': dependency_map, 'always_show': always_show, 'order': [], 'closure': {},
+                'cycle': sorted(e.nodes)}
+    closure = get_dependency_closure(dependency_map, order)
+    return {
+        'dependencies': dependency_map,
+        'always_show': always_show,
+        'order': [option_id for option_id in order if option_id in always_show], # MEH: Only options of product
+        'closure': {option_id: sorted(deps) for option_id, deps in closure.items() if option_id in always_show},
+        'cycle': [],
+    }
+
+
+@lru_cache(maxsize=2048)
+def _get_option_graph(product_id, version):
+    cache_key = f'product:option_graph:{product_id}:{"-".join(map(str, version))}'
+    graph = cache.get(cache_key)
+    if graph is None:
+        graph = build_option_graph(product_id)
+        if graph is not None:
+            cache.set(cache_key, graph, timeout=PRICE_MATRIX_TIMEOUT)
+    return graph
+
+
+def get_option_graph(product_id):
+    """
+    MEH: Cached option graph of product, keyed by product & option input version (Paper, Size changes not rebuild it),
+    None if not found
+    """
+    version = get_generations([get_product_resource(product_id), PRICE_INPUT_RESOURCE, PRICE_INPUT_RESOURCES['option']])
+    return _get_option_graph(int(product_id), version)
+
+
+def get_enabled_options(graph, selected=()):
+    """
+    MEH: Options can be shown for selected options (no query): always_show option or option that all its
+    dependencies are selected & enabled, checked in topological order (dependencies first)
+    """
+    if graph['cycle']:
+        raise OptionCycleError(set(graph['cycle']))
+    selected = set(selected)
+    enabled = set()
+    for option_id in graph['order']:
+        deps = graph['dependencies'].get(option_id, [])
+        if graph['always_show'][option_id] or all(dep in selected and dep in enabled for dep in deps):
+            enabled.add(option_id)
+    return [option_id for option_id in graph['order'] if option_id in enabled]
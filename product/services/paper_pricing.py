@@ -0,0 +1,44 @@
+from product.models import Paper
+from product.services.quote import invalidate_price_input
+from product.services.price_table import schedule_price_table_refresh
+
+REPRICE_BATCH_SIZE = 500
+PAPER_PRICE_FIELDS = (
+    'sheet_paper__length', 'sheet_paper__width', 'sheet_paper__purchase_price', 'sheet_paper__cutting_price',
+    'sheet_paper__sheet_paper_number', 'size__length', 'size__width',
+)
+
+
+def calculate_paper_price(sheet_length, sheet_width, purchase_price, cutting_price, sheet_paper_number,
+                          size_length, size_width):
+    """
+    MEH: Base price per piece of size cut from sheet paper (best of normal & rotated fit),
+    rounded to integer here (per_paper_price is integer) -> same value in Paper.save & reprice_papers
+    """
+    if not size_length or not size_width or not sheet_paper_number:
+        return 0 # MEH: Not complete data
+    total_fit = max(
+        (sheet_length // size_length) * (sheet_width // size_width),
+        (sheet_length // size_width) * (sheet_width // size_length)
+    )
+    if total_fit == 0:
+        return 0 # MEH: can't cut this size from the sheet
+    return round((purchase_price + cutting_price) / sheet_paper_number / total_fit)
+
+
+def reprice_papers(queryset=None, dry_run=False):
+    """
+    MEH: Compute per_paper_price of all papers (or queryset) with 1 read (paper, sheet & size together)
+    & 1 bulk update only for changed rows, return count of changed papers
+    """
+    queryset = Paper.objects.all() if queryset is None else queryset
+    changed = []
+    for pk, current_price, *values in queryset.order_by().values_list('pk', 'per_paper_price', *PAPER_PRICE_FIELDS):
+        new_price = calculate_paper_price(*values)
+        if new_price != current_price:
+            changed.append(Paper(pk=pk, per_paper_price=new_price))
+    if changed and not dry_run:
+        Paper.objects.bulk_update(changed, ['per_paper_price'], batch_size=REPRICE_BATCH_SIZE)
+        invalidate_price_input('paper') # MEH: bulk_update don't send post_save
+        schedule_price_table_refresh()
+    return len(changed)
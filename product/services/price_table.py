@@ -0,0 +1,163 @@
+from itertools import product as grid_product
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from product.models import PriceListTable, Column, Label, Size, Paper, Product, ProductCategory, Duration
+from product.services.quote import get_price_matrix, get_product_version, get_quote, check_active_product, QuoteError
+
+PRICE_TABLE_MAX_TIRAGE_ROWS = 20 # MEH: Digital tirage is a range, only first steps in table
+PRICE_TABLE_REFRESH_DELAY = 10 # MEH: Second, many change in a short time -> 1 refresh
+PRICE_TABLE_REFRESH_KEY = 'product:price_table:refresh_scheduled'
+FACE_LABELS = {1: 'یک رو', 2: 'دو رو'}
+
+COLUMN_QUOTE_FIELDS = {
+    Column.SIZE: 'size',
+    Column.PAPER: 'paper',
+    Column.FACE: 'face',
+    Column.TIRAGE: 'tirage',
+    Column.DURATION: 'duration',
+}
+
+
+def get_table_dims(table):
+    """
+    MEH: Pivot dimensions of table in order (side bar, label if duration, columns)
+    """
+    dims = [table.side_bar]
+    if table.label == Label.DURATION:
+        dims.append(Column.DURATION)
+    dims += [table.col_1, table.col_2, table.col_3]
+    return [dim for dim in dims if dim]
+
+
+def get_product_axes(matrix):
+    """
+    MEH: Values of each quote field that product accept (from price matrix, no query)
+    """
+    info = matrix['info']
+    if matrix['type'] == 'OFF':
+        return {
+            'size': sorted(info['sizes']) or [None],
+            'face': sorted(info['faces']),
+            'tirage': sorted(info['tirage']),
+            'duration': sorted(info['durations']) or [None],
+        }
+    if matrix['type'] == 'DIG':
+        min_tirage, max_tirage = info['tirage']
+        step = max(min_tirage, 1)
+        return {
+            'size': sorted(info['sizes']),
+            'paper': sorted(info['papers']),
+            'face': sorted(info['faces']),
+            'tirage': list(range(step, max_tirage + 1, step))[:PRICE_TABLE_MAX_TIRAGE_ROWS],
+        }
+    return { # MEH: Large format -> price of 1 square meter (or min size)
+        'tirage': [max(matrix['min_copies'], 1)],
+        'width': [max(info['min_width'], 100)],
+        'height': [max(info['min_height'], 100)],
+    }
+
+
+def build_product_rows(product_id, category_id, dims):
+    """
+    MEH: All cells of 1 product -> [[dim values..., price], ...] (empty cell price is None)
+    """
+    try:
+        matrix = get_price_matrix(product_id, check_active_product(product_id)) # MEH: Inactive product has no public price
+    except QuoteError:
+        return []
+    axes = get_product_axes(matrix)
+    dim_values = []
+    for dim in dims:
+        if dim == Column.PRODUCT:
+            dim_values.append([product_id])
+        elif dim == Column.CATEGORY:
+            dim_values.append([category_id])
+        else:
+            dim_values.append(axes.get(COLUMN_QUOTE_FIELDS[dim]) or [None])
+    defaults = {field: values[0] for field, values in axes.items() if values}
+    rows = []
+    for combination in grid_product(*dim_values):
+        values = dict(defaults)
+        for dim, value in zip(dims, combination):
+            if dim in COLUMN_QUOTE_FIELDS:
+                values[COLUMN_QUOTE_FIELDS[dim]] = value
+        try:
+            price = get_quote(product_id, **values)['total_price']
+        except QuoteError:
+            price = None
+        rows.append([*combination, price])
+    return rows
+
+
+def build_labels(dims, rows):
+    """
+    MEH: Display name of all ids in rows (1 query for each dimension)
+    """
+    label_sources = {
+        Column.SIZE: (Size.objects, 'display_name'),
+        Column.PRODUCT: (Product.objects, 'title'),
+        Column.CATEGORY: (ProductCategory.objects, 'title'),
+        Column.DURATION: (Duration.objects, 'title'),
+    }
+    labels = {}
+    for index, dim in enumerate(dims):
+        ids = {row[index] for row in rows if row[index] is not None}
+        if dim in label_sources:
+            manager, field_name = label_sources[dim]
+            names = dict(manager.filter(pk__in=ids).values_list('pk', field_name))
+        elif dim == Column.PAPER:
+            names = {pk: f'{sheet_name} #{size_name}' for pk, sheet_name, size_name in
+                     Paper.objects.filter(pk__in=ids).values_list('pk', 'sheet_paper__display_name', 'size__display_name')}
+        elif dim == Column.FACE:
+            names = {face: FACE_LABELS.get(face, str(face)) for face in ids}
+        else:
+            names = {value: str(value) for value in ids}
+        labels[dim] = {str(key): value for key, value in names.items()} # MEH: JSON key
+    return labels
+
+
+def refresh_price_table(table, force=False):
+    """
+    MEH: Rebuild cells only for products with new price version (version of product & inputs of its type, others reused),
+    1 UPDATE if anything changed
+    return True if cells changed
+    """
+    dims = get_table_dims(table)
+    cells = table.cells or {}
+    old_fragments = cells.get('products', {}) if not force and cells.get('dims') == dims else {}
+    fragments = {}
+    changed = set(old_fragments) != {str(pk) for pk in table.product_list.values_list('pk', flat=True)}
+    for product_id, category_id, product_type in (table.product_list.order_by('sort_number', 'pk')
+                                                  .values_list('pk', 'parent_category_id', 'type')):
+        version = list(get_product_version(product_id, product_type))
+        fragment = old_fragments.get(str(product_id))
+        if fragment is None or fragment['version'] != version:
+            fragment = {'version': version, 'rows': build_product_rows(product_id, category_id, dims)}
+            changed = True
+        fragments[str(product_id)] = fragment
+    if not changed and cells.get('dims') == dims:
+        return False
+    rows = [row for fragment in fragments.values() for row in fragment['rows']]
+    table.cells = {'dims': dims, 'labels': build_labels(dims, rows), 'products': fragments}
+    table.cells_update = timezone.now()
+    PriceListTable.objects.filter(pk=table.pk).update(cells=table.cells, cells_update=table.cells_update) # MEH: No save signal
+    return True
+
+
+def get_table_rows(cells):
+    """
+    MEH: All rows of materialized table in product order (for public read & pdf)
+    """
+    return [row for fragment in (cells or {}).get('products', {}).values() for row in fragment['rows']]
+
+
+def schedule_price_table_refresh():
+    """
+    MEH: Debounced refresh after commit (many price change in a short time -> 1 celery task)
+    """
+    def schedule():
+        if cache.add(PRICE_TABLE_REFRESH_KEY, True, timeout=PRICE_TABLE_REFRESH_DELAY * 6):
+            from product.tasks import refresh_price_list_tables
+            refresh_price_list_tables.apply_async(countdown=PRICE_TABLE_REFRESH_DELAY)
+    transaction.on_commit(schedule)
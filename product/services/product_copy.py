@@ -0,0 +1,113 @@
+from copy import copy
+from itertools import groupby
+from operator import attrgetter
+from django.db import transaction
+from django.utils import timezone
+from product.models import Product, ProductOption, OffsetProduct, LargeFormatProduct, SolidProduct, DigitalProduct
+
+PRODUCT_INFO_MODEL_MAP = {
+    'OFF': OffsetProduct,
+    'LAR': LargeFormatProduct,
+    'SLD': SolidProduct,
+    'DIG': DigitalProduct,
+}
+
+COPY_BATCH_SIZE = 500
+
+
+def copy_m2m_rows(model, id_map):
+    """
+    MEH: Copy rows of all auto created M2M tables of model for old -> new ids (1 read & 1 bulk create for each field),
+    custom through (like ProductOption) must copy itself
+    """
+    if not id_map:
+        return
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        if not through._meta.auto_created:
+            continue
+        source_attname = through._meta.get_field(field.m2m_field_name()).attname
+        target_attname = through._meta.get_field(field.m2m_reverse_field_name()).attname
+        rows = through.objects.filter(**{f'{source_attname}__in': list(id_map)}).values_list(source_attname, target_attname)
+        through.objects.bulk_create(
+            [through(**{source_attname: id_map[source_id], target_attname: target_id}) for source_id, target_id in rows],
+            batch_size=COPY_BATCH_SIZE
+        )
+
+
+def copy_product_options(product_map):
+    """
+    MEH: Copy ProductOption rows (with base_multiply, count_discount, ...) & their dependent_option rows
+    """
+    options = list(ProductOption.objects.filter(product_id__in=list(product_map)))
+    copies = []
+    for product_option in options:
+        option_copy = copy(product_option)
+        option_copy.pk = None
+        option_copy.product_id = product_map[product_option.product_id]
+        copies.append(option_copy)
+    created = ProductOption.objects.bulk_create(copies, batch_size=COPY_BATCH_SIZE)
+    copy_m2m_rows(ProductOption, {old.pk: new.pk for old, new in zip(options, created)})
+
+
+def invalidate_copied_products(product_ids):
+    """
+    MEH: bulk_create send no post_save -> same cache bumps of Product signals for new ids (after commit)
+    """
+    from product.services.quote import invalidate_product_price, invalidate_product_status
+    from product.services.product_detail import invalidate_product_detail
+    from product.services.price_table import schedule_price_table_refresh # MEH: Local import (quote import this module)
+
+    def invalidate():
+        for product_id in product_ids:
+            invalidate_product_price(product_id)
+        invalidate_product_detail(product_ids)
+        invalidate_product_status() # MEH: Active copies must be quotable
+    transaction.on_commit(invalidate)
+    schedule_price_table_refresh()
+
+
+def copy_products(products, category_map=None, parent_category_id=None):
+    """
+    MEH: Copy N products with bulk insert for base rows, info rows, M2M rows, ProductOption rows & dependency edges
+    category_map {old_category_id: new_category_id} (category clone) or parent_category_id for all copies (copy-many)
+    return {old_id: new_id}, product without info skipped (not in map)
+    """
+    products = list(products)
+    category_map = category_map or {}
+    info_rows = {}
+    for product_type, info_model in PRODUCT_INFO_MODEL_MAP.items():
+        ids = [product.pk for product in products if product.type == product_type]
+        if ids:
+            info_rows.update({info.pk: info for info in info_model.objects.filter(pk__in=ids)})
+    products = [product for product in products if product.pk in info_rows]
+    timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    copies = []
+    for product in products:
+        product_copy = copy(product)
+        product_copy.pk = None
+        if parent_category_id:
+            product_copy.parent_category_id = parent_category_id
+        else:
+            product_copy.parent_category_id = category_map.get(product.parent_category_id, product.parent_category_id)
+        product_copy.title = f"{product.title} (copy: {timestamp})"
+        if product_copy.image_id and not product_copy.alt: # MEH: Same as Product.save
+            product_copy.alt = f'{product_copy.title}عکس محصول '
+        copies.append(product_copy)
+    with transaction.atomic():
+        created = Product.objects.bulk_create(copies, batch_size=COPY_BATCH_SIZE)
+        product_map = {old.pk: new.pk for old, new in zip(products, created)}
+        copy_m2m_rows(Product, product_map)
+        for info_model, group in groupby(sorted(info_rows.values(), key=lambda info: info.__class__.__name__),
+                                         key=attrgetter('__class__')):
+            group = list(group)
+            info_copies = []
+            for info in group:
+                info_copy = copy(info)
+                info_copy.pk = product_map[info.pk] # MEH: pk is product_info (OneToOne)
+                info_copies.append(info_copy)
+            info_model.objects.bulk_create(info_copies, batch_size=COPY_BATCH_SIZE)
+            copy_m2m_rows(info_model, {info.pk: product_map[info.pk] for info in group})
+        copy_product_options(product_map)
+        invalidate_copied_products(list(product_map.values()))
+    return product_map
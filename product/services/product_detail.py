@@ -0,0 +1,151 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from api.cache import get_generations, bump_generation
+from product.models import Product, ProductOption, OffsetProduct, LargeFormatProduct, SolidProduct, DigitalProduct, \
+    Paper
+from product.services.quote import get_product_resource, get_price_input_resources
+
+PRODUCT_DETAIL_TIMEOUT = 60 * 60 * 24
+
+PRODUCT_DETAIL_SECTIONS = ['info', 'detail', 'gallery', 'designs', 'files', 'options', 'price']
+
+PRODUCT_SECTION_PLAN = { # MEH: select_related & prefetch_related of Product for each section
+    'info': (['image', 'template', 'parent_category'], []),
+    'gallery': ([], []),
+    'designs': ([], ['designs__category', 'designs__image']),
+    'files': ([], ['files__depend_on']),
+    'options': ([], [Prefetch('option_list', queryset=ProductOption.objects.select_related('option')
+                              .prefetch_related('dependent_option'))]),
+}
+
+PAPER_QUERYSET = Paper.objects.select_related('size', 'sheet_paper')
+
+PRODUCT_INFO_PLAN = { # MEH: Info model, select & prefetch (no N+1 in *_display fields)
+    'OFF': (OffsetProduct, ['lat_size'], ['size_list', 'folding_list', 'duration_list']),
+    'LAR': (LargeFormatProduct, [], ['banner_list']),
+    'SLD': (SolidProduct, [], []),
+    'DIG': (DigitalProduct, [], [
+        'size_list', 'folding_list',
+        Prefetch('paper_list', queryset=PAPER_QUERYSET),
+        Prefetch('cover_paper_list', queryset=PAPER_QUERYSET),
+    ]),
+}
+
+
+def get_product_detail_resource(product_id):
+    return f'product:detail:{product_id}' # MEH: Editor only data of product (Design, File Field, Category) not used in price
+
+
+def invalidate_product_detail(product_ids):
+    for product_id in set(product_ids):
+        bump_generation(get_product_detail_resource(product_id))
+
+
+def invalidate_related_product_detail(*conditions):
+    """
+    MEH: Only products that use changed row (Design, File, Category), ids read now (before delete remove relation)
+    & bumped after commit (no rebuild with old data in the middle of transaction)
+    """
+    product_ids = list(Product.objects.filter(*conditions).values_list('pk', flat=True).distinct())
+    if product_ids:
+        transaction.on_commit(lambda: invalidate_product_detail(product_ids))
+
+
+def get_detail_sections(fields=None):
+    """
+    MEH: Sparse fieldset (?fields=info,options) -> valid sections in fixed order (all if empty)
+    """
+    if not fields:
+        return list(PRODUCT_DETAIL_SECTIONS)
+    requested = {field.strip() for field in fields.split(',')}
+    return [section for section in PRODUCT_DETAIL_SECTIONS if section in requested]
+
+
+def get_detail_cache_key(product_id, sections, base_url):
+    version = get_generations([get_product_resource(product_id), *get_price_input_resources(),
+                               get_product_detail_resource(product_id)])
+    return f'product:full:{product_id}:{"-".join(map(str, version))}:{",".join(sections)}:{base_url}'
+
+
+def load_product(product_id, sections):
+    """
+    MEH: Product with only related rows needed for asked sections (1 query + 1 for each prefetch)
+    """
+    select, prefetch = set(), []
+    for section in sections:
+        section_select, section_prefetch = PRODUCT_SECTION_PLAN.get(section, ([], []))
+        select.update(section_select)
+        prefetch.extend(section_prefetch)
+    queryset = Product.objects.prefetch_related(*prefetch).filter(pk=product_id)
+    if select: # MEH: Empty select_related() follow all FK
+        queryset = queryset.select_related(*select)
+    return queryset.first()
+
+
+def load_product_info(product):
+    plan = PRODUCT_INFO_PLAN.get(product.type)
+    if plan is None:
+        return None
+    model, select, prefetch = plan
+    queryset = model.objects.prefetch_related(*prefetch).filter(pk=product.pk)
+    if select:
+        queryset = queryset.select_related(*select)
+    return queryset.first()
+
+
+def build_product_detail(product_id, sections, serializer_context):
+    """
+    MEH: All asked sections of product editor with same serializers of each page
+    return None if product not found
+    """
+    from product.serializers import ProductInfoSerializer, OffsetProductSerializer, LargeFormatProductSerializer, \
+        SolidProductSerializer, DigitalProductSerializer, ProductGallerySerializer, ProductDesignSerializer, \
+        ProductFileSerializer, ProductOptionSerializer
+    detail_serializers = {
+        'OFF': OffsetProductSerializer,
+        'LAR': LargeFormatProductSerializer,
+        'SLD': SolidProductSerializer,
+        'DIG': DigitalProductSerializer,
+    }
+    product = load_product(product_id, sections)
+    if product is None:
+        return None
+    info = load_product_info(product) if {'detail', 'price'} & set(sections) else None
+    data = {'id': product.pk, 'type': product.type}
+    for section in sections:
+        if section == 'info':
+            data[section] = ProductInfoSerializer(product, context=serializer_context).data
+        elif section == 'detail':
+            serializer_class = detail_serializers.get(product.type)
+            data[section] = serializer_class(info, context=serializer_context).data if info and serializer_class else None
+        elif section == 'gallery':
+            data[section] = ProductGallerySerializer(product, context=serializer_context).data
+        elif section == 'designs':
+            data[section] = ProductDesignSerializer(product, context=serializer_context).data['designs_info']
+        elif section == 'files':
+            data[section] = ProductFileSerializer(product, context=serializer_context).data
+        elif section == 'options':
+            data[section] = ProductOptionSerializer(product.option_list.all(), many=True, context=serializer_context).data
+        elif section == 'price': # MEH: Offset -> manual price, Digital -> formula
+            data[section] = {
+                'manual_price': getattr(info, 'manual_price', None),
+                'formula': getattr(info, 'formula', None),
+            }
+    return data
+
+
+def get_product_detail(product_id, fields=None, serializer_context=None):
+    """
+    MEH: Cached full product editor data, keyed by product version (new key on any product, price or editor data change)
+    """
+    sections = get_detail_sections(fields)
+    request = (serializer_context or {}).get('request')
+    # MEH: Scheme & host of absolute file urls (http & https response not shared)
+    cache_key = get_detail_cache_key(product_id, sections, request.build_absolute_uri('/') if request else '')
+    data = cache.get(cache_key)
+    if data is None:
+        data = build_product_detail(product_id, sections, serializer_context or {})
+        if data is not None:
+            cache.set(cache_key, data, timeout=PRODUCT_DETAIL_TIMEOUT)
+    return data
@@ -0,0 +1,332 @@
+from bisect import bisect_right
+from functools import lru_cache
+from django.core.cache import cache
+from api.cache import get_generation, get_generations, bump_generation
+from product.models import Product, ProductOption, PriceAmountType, ProductStatus
+from product.services.formula import get_product_formula, get_paper_variables, get_size_variables, FormulaError
+from product.services.product_copy import PRODUCT_INFO_MODEL_MAP
+
+PRICE_INPUT_RESOURCE = 'product:price_input' # MEH: All shared inputs (changed from a side that may touch any input)
+PRICE_INPUT_RESOURCES = {
+    'size': 'product:price_input:size',
+    'paper': 'product:price_input:paper',
+    'duration': 'product:price_input:duration',
+    'folding': 'product:price_input:folding',
+    'option': 'product:price_input:option',
+}
+PRODUCT_TYPE_PRICE_INPUTS = { # MEH: Shared inputs read by price matrix of each product type
+    'OFF': ('size', 'duration', 'option'),
+    'DIG': ('size', 'paper', 'folding', 'option'),
+    'LAR': ('option',),
+    'SLD': ('option',),
+}
+PRICE_MATRIX_TIMEOUT = 60 * 60 * 24 * 7 # MEH: 1 week (new version on any change before that)
+PRODUCT_STATUS_RESOURCE = 'product:status' # MEH: Active product ids (1 generation, bumped on any product change)
+
+
+class QuoteError(ValueError):
+    """
+    MEH: Quote input not valid for this product (size, tirage, paper, option, ...)
+    """
+
+
+class ProductNotFoundError(QuoteError):
+    """
+    MEH: Product not exist or not active (no public price)
+    """
+
+
+def get_product_resource(product_id):
+    return f'product:{product_id}'
+
+
+def invalidate_product_price(product_id):
+    """
+    MEH: New version of 1 product (product, info, options changed)
+    """
+    if product_id:
+        bump_generation(get_product_resource(product_id))
+
+
+def invalidate_all_prices():
+    """
+    MEH: New version for all products (unknown shared input or many products changed)
+    """
+    bump_generation(PRICE_INPUT_RESOURCE)
+
+
+def invalidate_price_input(name):
+    """
+    MEH: New version only for product types that read this shared input (Paper change not rebuild offset products)
+    """
+    bump_generation(PRICE_INPUT_RESOURCES[name])
+
+
+def get_price_input_resources(product_type=None):
+    inputs = PRODUCT_TYPE_PRICE_INPUTS.get(product_type, PRICE_INPUT_RESOURCES) # MEH: Unknown type -> all inputs
+    return [PRICE_INPUT_RESOURCE, *(PRICE_INPUT_RESOURCES[name] for name in inputs)]
+
+
+def invalidate_product_status():
+    bump_generation(PRODUCT_STATUS_RESOURCE)
+
+
+@lru_cache(maxsize=8)
+def _get_active_product_types(generation):
+    cache_key = f'{PRODUCT_STATUS_RESOURCE}:{generation}'
+    product_types = cache.get(cache_key)
+    if product_types is None:
+        product_types = dict(Product.objects.filter(status=ProductStatus.ACTIVE).values_list('pk', 'type'))
+        cache.set(cache_key, product_types, timeout=PRICE_MATRIX_TIMEOUT)
+    return product_types
+
+
+def check_active_product(product_id):
+    """
+    MEH: Only active product has public price, checked before any per-product generation key
+    (random id from anonymous caller never create cache key), return product type
+    """
+    try:
+        return _get_active_product_types(get_generation(PRODUCT_STATUS_RESOURCE))[product_id]
+    except KeyError:
+        raise ProductNotFoundError('Product not found')
+
+
+def get_product_version(product_id, product_type=None):
+    """
+    MEH: Generation of product & only shared inputs its type read (1 round-trip)
+    """
+    return get_generations([get_product_resource(product_id), *get_price_input_resources(product_type)])
+
+
+def get_thresholds(values):
+    """
+    MEH: {"<min count>": percent} JSON -> (sorted thresholds, percents) for bisect
+    """
+    rows = []
+    for key, value in (values or {}).items():
+        try:
+            rows.append((float(key), float(value)))
+        except (TypeError, ValueError):
+            continue
+    rows.sort()
+    return tuple(row[0] for row in rows), tuple(row[1] for row in rows)
+
+
+def get_threshold_percent(thresholds, value):
+    keys, percents = thresholds
+    index = bisect_right(keys, value)
+    return percents[index - 1] if index else 0
+
+
+def flatten_manual_price(manual_price):
+    """
+    MEH: Offset manual price {size_id: {tirage: price or {face: price}}} -> {(size, tirage, face): price}
+    """
+    prices = {}
+    for size_key, tirage_prices in (manual_price or {}).items():
+        if not isinstance(tirage_prices, dict):
+            continue
+        for tirage_key, value in tirage_prices.items():
+            face_prices = value if isinstance(value, dict) else {None: value}
+            for face_key, price in face_prices.items():
+                try:
+                    prices[(str(size_key), str(tirage_key), None if face_key is None else str(face_key))] = float(price)
+                except (TypeError, ValueError):
+                    continue
+    return prices
+
+
+def build_offset_matrix(info):
+    tirage_list = info.tirage_list.get('items', []) if isinstance(info.tirage_list, dict) else info.tirage_list
+    return {
+        'tirage': frozenset(int(tirage) for tirage in tirage_list or []),
+        'faces': frozenset(face for face, allowed in ((1, info.one_face), (2, info.two_face)) if allowed),
+        'sizes': frozenset(size.pk for size in info.size_list.all()),
+        'durations': frozenset(duration.pk for duration in info.duration_list.all()),
+        'prices': flatten_manual_price(info.manual_price),
+    }
+
+
+def build_large_format_matrix(info):
+    return {
+        'min_width': info.min_width,
+        'min_height': info.min_height,
+        'print_price': info.print_price,
+        'length_discount': get_thresholds(info.print_length_discount),
+    }
+
+
+def build_digital_matrix(info):
+    return {
+        'formula': info.formula or '',
+        'faces': frozenset(face for face, allowed in ((1, info.one_face), (2, info.tow_face)) if allowed),
+        'page': (info.min_page, info.max_page),
+        'tirage': (info.min_tirage, info.max_tirage),
+        'sizes': {size.pk: get_size_variables(size) for size in info.size_list.all()},
+        'papers': {paper.pk: get_paper_variables(paper)
+                   for paper in [*info.paper_list.all(), *info.cover_paper_list.all()]},
+        'foldings': {folding.pk: folding.folding_number for folding in info.folding_list.all()},
+    }
+
+
+PRODUCT_MATRIX_BUILDERS = {
+    'OFF': build_offset_matrix,
+    'LAR': build_large_format_matrix,
+    'DIG': build_digital_matrix,
+}
+
+
+def build_price_matrix(product_id):
+    """
+    MEH: Read all price inputs of product 1 time (product, info, M2M, options) -> compact matrix (plain data for cache)
+    """
+    try:
+        product = Product.objects.get(pk=product_id)
+    except Product.DoesNotExist:
+        raise QuoteError('Product not found')
+    build = PRODUCT_MATRIX_BUILDERS.get(product.type)
+    if build is None:
+        raise QuoteError('Product has no price')
+    info = PRODUCT_INFO_MODEL_MAP[product.type].objects.filter(pk=product_id).first()
+    if info is None:
+        raise QuoteError('Product has no price')
+    options = {}
+    for product_option in ProductOption.objects.filter(product_id=product_id, option__is_active=True).select_related('option'):
+        option = product_option.option
+        options[option.pk] = (
+            option.price_type,
+            option.base_amount * (product_option.base_multiply if product_option.base_multiply is not None else 1),
+            option.is_numberize,
+            get_thresholds(product_option.count_discount),
+        )
+    return {
+        'product_id': product.pk,
+        'type': product.type,
+        'accept_copies': product.accept_copies,
+        'min_copies': product.min_copies,
+        'info': build(info),
+        'options': options,
+    }
+
+
+@lru_cache(maxsize=2048)
+def _get_price_matrix(product_id, version):
+    """
+    MEH: Per process matrix for each product version (old version never asked again & leave LRU)
+    """
+    cache_key = f'product:price_matrix:{product_id}:{"-".join(map(str, version))}'
+    matrix = cache.get(cache_key)
+    if matrix is None:
+        matrix = build_price_matrix(product_id)
+        cache.set(cache_key, matrix, timeout=PRICE_MATRIX_TIMEOUT)
+    return matrix
+
+
+def get_price_matrix(product_id, product_type=None):
+    return _get_price_matrix(int(product_id), get_product_version(product_id, product_type))
+
+
+def get_offset_price(matrix, product_id, tirage, size=None, face=1, duration=None, **kwargs):
+    info = matrix['info']
+    if tirage not in info['tirage']:
+        raise QuoteError('Tirage not valid')
+    if face not in info['faces']:
+        raise QuoteError('Face not valid')
+    if info['sizes'] and size not in info['sizes']:
+        raise QuoteError('Size not valid')
+    if duration is not None and duration not in info['durations']:
+        raise QuoteError('Duration not valid')
+    prices = info['prices']
+    price = prices.get((str(size), str(tirage), str(face)), prices.get((str(size), str(tirage), None)))
+    if price is None:
+        raise QuoteError('No price for this size & tirage')
+    return price
+
+
+def get_large_format_price(matrix, product_id, tirage, width=None, height=None, **kwargs):
+    """
+    MEH: Print area price with length discount, waste_price & gap_price not in quote
+    (depend on banner roll & nesting chosen in production, no rule for them in product data)
+    """
+    info = matrix['info']
+    if not width or not height or width < info['min_width'] or height < info['min_height']:
+        raise QuoteError('Width & Height not valid')
+    price = width * height / 10000 * info['print_price'] * tirage # MEH: cm -> square meter
+    return price * (1 - get_threshold_percent(info['length_discount'], height) / 100)
+
+
+def get_digital_price(matrix, product_id, tirage, size=None, face=1, page=1, paper=None, folding=None, **kwargs):
+    info = matrix['info']
+    if not info['tirage'][0] <= tirage <= info['tirage'][1]:
+        raise QuoteError('Tirage not valid')
+    if not info['page'][0] <= page <= info['page'][1]:
+        raise QuoteError('Page not valid')
+    if face not in info['faces'] or size not in info['sizes'] or paper not in info['papers']:
+        raise QuoteError('Face, Size or Paper not valid')
+    if folding is not None and folding not in info['foldings']:
+        raise QuoteError('Folding not valid')
+    try:
+        formula = get_product_formula(product_id, info['formula'])
+        return formula.evaluate(
+            tirage=tirage, page=page, face=face, folding=info['foldings'].get(folding, 0),
+            **info['sizes'][size], **info['papers'][paper]
+        )
+    except FormulaError as e:
+        raise QuoteError(str(e))
+
+
+PRODUCT_PRICE_GETTERS = {
+    'OFF': get_offset_price,
+    'LAR': get_large_format_price,
+    'DIG': get_digital_price,
+}
+
+
+def get_option_price(matrix, option_id, base_price, tirage):
+    try:
+        price_type, amount, is_numberize, count_discount = matrix['options'][option_id]
+    except KeyError:
+        raise QuoteError(f'Option {option_id} not valid')
+    if price_type == PriceAmountType.PERCENT:
+        price = base_price * amount / 100
+    else:
+        price = amount * (tirage if is_numberize else 1)
+    return price * (1 - get_threshold_percent(count_discount, tirage) / 100)
+
+
+def get_quote(product_id, tirage, options=(), **values):
+    """
+    MEH: Price of 1 line from in-memory matrix (no query after first build of this product version)
+    """
+    matrix = get_price_matrix(product_id, check_active_product(product_id))
+    if tirage < matrix['min_copies']:
+        raise QuoteError('Tirage less than min copies')
+    values = {name: value for name, value in values.items() if value is not None}
+    base_price = PRODUCT_PRICE_GETTERS[matrix['type']](matrix, matrix['product_id'], tirage, **values)
+    option_price = sum(get_option_price(matrix, option_id, base_price, tirage) for option_id in set(options))
+    return {
+        'product': matrix['product_id'],
+        'tirage': tirage,
+        'base_price': round(base_price),
+        'option_price': round(option_price),
+        'total_price': round(base_price + option_price),
+    }
+
+
+def get_batch_quote(lines):
+    """
+    MEH: Quote of all cart lines (each product matrix loaded 1 time), error of each line in its own result
+    """
+    result = []
+    for line in lines:
+        line = dict(line)
+        product_id = line.pop('product')
+        try:
+            result.append(get_quote(product_id, **line))
+        except QuoteError as e:
+            result.append({'product': product_id, 'tirage': line.get('tirage'), 'error': str(e)})
+    return {
+        'lines': result,
+        'total_price': sum(line.get('total_price', 0) for line in result),
+    }
@@ -0,0 +1,193 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from api.bulk import post_bulk_update
+from file_manager.models import FileItem
+from .models import ProductCategory, OptionCategory, PriceListCategory, Product, OffsetProduct, LargeFormatProduct, SolidProduct, DigitalProduct, ProductOption, \
+    Size, Paper, Duration, Folding, Option, PriceListTable, Design, ProductFileField
+from .services.quote import invalidate_product_price, invalidate_all_prices, invalidate_price_input, invalidate_product_status
+from .services.price_table import schedule_price_table_refresh
+from .services.product_detail import invalidate_product_detail, invalidate_related_product_detail
+
+PRICE_INPUT_SENDERS = {
+    Size: 'size',
+    Paper: 'paper',
+    Duration: 'duration',
+    Folding: 'folding',
+    Option: 'option',
+    OptionCategory: 'option',
+    OffsetProduct.size_list.through: 'size',
+    OffsetProduct.duration_list.through: 'duration',
+    DigitalProduct.size_list.through: 'size',
+    DigitalProduct.paper_list.through: 'paper',
+    DigitalProduct.cover_paper_list.through: 'paper',
+    DigitalProduct.folding_list.through: 'folding',
+}
+PRODUCT_DETAIL_M2M_FIELDS = {
+    Product.designs.through: 'designs',
+    Product.files.through: 'files',
+}
+
+
+@receiver([post_save, post_delete], sender=Product)
+def clear_product_price_cache(sender, instance, **kwargs):
+    """
+    MEH: New version of product price matrix (product, info or options changed) & active product ids
+    """
+    invalidate_product_price(instance.pk)
+    invalidate_product_status()
+    schedule_price_table_refresh()
+
+
+@receiver([post_save, post_delete], sender=OffsetProduct)
+@receiver([post_save, post_delete], sender=LargeFormatProduct)
+@receiver([post_save, post_delete], sender=SolidProduct)
+@receiver([post_save, post_delete], sender=DigitalProduct)
+def clear_product_info_price_cache(sender, instance, **kwargs):
+    invalidate_product_price(instance.pk) # MEH: pk is product_info_id
+    schedule_price_table_refresh()
+
+
+@receiver([post_save, post_delete], sender=ProductOption)
+def clear_product_option_price_cache(sender, instance, **kwargs):
+    invalidate_product_price(instance.product_id)
+    schedule_price_table_refresh()
+
+
+@receiver(m2m_changed, sender=OffsetProduct.size_list.through)
+@receiver(m2m_changed, sender=OffsetProduct.duration_list.through)
+@receiver(m2m_changed, sender=DigitalProduct.size_list.through)
+@receiver(m2m_changed, sender=DigitalProduct.paper_list.through)
+@receiver(m2m_changed, sender=DigitalProduct.cover_paper_list.through)
+@receiver(m2m_changed, sender=DigitalProduct.folding_list.through)
+def clear_product_info_list_price_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse: # MEH: Changed from other side (Size, Paper, ...) -> may be many products of types read this input
+        invalidate_price_input(PRICE_INPUT_SENDERS[sender])
+    else:
+        invalidate_product_price(instance.pk)
+    schedule_price_table_refresh()
+
+
+@receiver(m2m_changed, sender=ProductOption.dependent_option.through)
+def clear_product_option_dependency_cache(sender, instance, action, reverse, **kwargs):
+    """
+    MEH: Option dependency changed -> new version of product (cached option graph rebuilt)
+    """
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        invalidate_price_input('option')
+    else:
+        invalidate_product_price(instance.product_id)
+
+
+@receiver([post_save, post_delete], sender=Size)
+@receiver([post_save, post_delete], sender=Paper)
+@receiver([post_save, post_delete], sender=Duration)
+@receiver([post_save, post_delete], sender=Folding)
+@receiver([post_save, post_delete], sender=Option)
+def clear_price_input_cache(sender, instance, **kwargs):
+    """
+    MEH: Shared price input changed -> new version for products of types read it with 1 INCR
+    """
+    invalidate_price_input(PRICE_INPUT_SENDERS[sender])
+    schedule_price_table_refresh()
+
+
+@receiver(post_save, sender=PriceListTable)
+def refresh_price_table_cells(sender, instance, **kwargs):
+    """
+    MEH: Table columns changed -> rebuild its cells (cells saved with UPDATE, no new signal)
+    """
+    schedule_price_table_refresh()
+
+
+@receiver(post_bulk_update, sender=ProductCategory)
+@receiver(post_bulk_update, sender=Product)
+@receiver(post_bulk_update, sender=OptionCategory)
+@receiver(post_bulk_update, sender=Option)
+def clear_bulk_update_price_cache(sender, **kwargs):
+    """
+    MEH: Products or Options changed with 1 UPDATE (no post_save) -> new version for all products with 1 INCR
+    """
+    if sender in (ProductCategory, Product): # MEH: Status of products may changed
+        invalidate_all_prices()
+        invalidate_product_status()
+    else:
+        invalidate_price_input(PRICE_INPUT_SENDERS[sender])
+    schedule_price_table_refresh()
+
+
+@receiver(post_bulk_update, sender=PriceListCategory)
+@receiver(post_bulk_update, sender=PriceListTable)
+def refresh_bulk_update_price_tables(sender, **kwargs):
+    schedule_price_table_refresh()
+
+
+@receiver(m2m_changed, sender=PriceListTable.product_list.through)
+def refresh_price_table_product_list(sender, instance, action, **kwargs):
+    if action.startswith('post_'):
+        schedule_price_table_refresh()
+
+
+@receiver(post_save, sender=Design)
+@receiver(pre_delete, sender=Design)
+def clear_design_detail_cache(sender, instance, created=False, **kwargs):
+    """
+    MEH: Editor only data changed -> new version of cached full data of products use it (price matrix not touched)
+    """
+    if not created:
+        invalidate_related_product_detail(Q(designs=instance))
+
+
+@receiver(post_save, sender=ProductFileField)
+@receiver(pre_delete, sender=ProductFileField)
+def clear_file_field_detail_cache(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_related_product_detail(Q(files=instance) | Q(files__depend_on=instance))
+
+
+@receiver(m2m_changed, sender=Product.designs.through)
+@receiver(m2m_changed, sender=Product.files.through)
+def clear_product_detail_list_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_product_detail([instance.pk])
+    elif action == 'pre_clear': # MEH: pk_set of clear is None -> products read before remove
+        invalidate_related_product_detail(Q(**{PRODUCT_DETAIL_M2M_FIELDS[sender]: instance}))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_product_detail(pk_set)
+
+
+@receiver(m2m_changed, sender=Design.category.through)
+def clear_design_category_detail_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_related_product_detail(Q(designs=instance))
+    elif action == 'pre_clear':
+        invalidate_related_product_detail(Q(designs__category=instance))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_related_product_detail(Q(designs__in=pk_set))
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(pre_delete, sender=ProductCategory)
+def clear_product_category_detail_cache(sender, instance, created=False, **kwargs):
+    """
+    MEH: Category renamed or deleted -> parent_category_display & design categories of its products
+    """
+    if not created:
+        invalidate_related_product_detail(Q(parent_category=instance) | Q(designs__category=instance))
+
+
+@receiver(post_save, sender=FileItem)
+@receiver(pre_delete, sender=FileItem)
+def clear_file_item_detail_cache(sender, instance, created=False, **kwargs):
+    """
+    MEH: File replaced or deleted -> image_url, template_url & design image of cached data of products use it
+    (new file not used by any product yet, relation read before delete set it null)
+    """
+    if not created:
+        invalidate_related_product_detail(Q(image=instance) | Q(template=instance) | Q(designs__image=instance))
@@ -0,0 +1,41 @@
+from celery import shared_task
+from django.core.cache import cache
+from .models import ProductCategory, PriceListTable
+from .services.category_clone import clone_category_tree, set_clone_job
+from .services.price_table import refresh_price_table, PRICE_TABLE_REFRESH_KEY
+
+
+@shared_task
+def clone_category_tree_task(job_id, category_id, parent_id=None):
+    """
+    MEH: Clone big category tree out of request, progress in cache (copy-status endpoint)
+    """
+    set_clone_job(job_id, status='running')
+    try:
+        original = ProductCategory.objects.get(pk=category_id)
+        parent = ProductCategory.objects.get(pk=parent_id) if parent_id else None
+        new_root = clone_category_tree(
+            original, parent_copy=parent,
+            progress=lambda done, total: set_clone_job(job_id, done=done, total=total)
+        )
+    except Exception as e:
+        set_clone_job(job_id, status='failed', detail=str(e))
+        raise
+    set_clone_job(job_id, status='done', new_category_id=new_root.pk)
+    return new_root.pk
+
+
+@shared_task
+def refresh_price_list_tables(table_ids=None, force=False):
+    """
+    MEH: Refresh materialized cells of price list tables (only products with new price version rebuilt)
+    """
+    cache.delete(PRICE_TABLE_REFRESH_KEY) # MEH: Change after this point schedule next refresh
+    tables = PriceListTable.objects.all()
+    if table_ids:
+        tables = tables.filter(pk__in=table_ids)
+    changed = [table.pk for table in tables.iterator() if refresh_price_table(table, force=force)]
+    if changed:
+        from config.tasks import generate_price_list_pdf_task
+        generate_price_list_pdf_task.delay() # MEH: Only changed tables rendered again
+    return changed
@@ -1,3 +1,170 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from api.tree import verify_tree
+from .models import ProductCategory, Product, ProductType, SolidProduct, OffsetProduct, Size, Duration, OptionCategory, \
+    Option, ProductOption
+from .services.category_clone import clone_category_tree
+from .services.price_table import PRICE_TABLE_REFRESH_KEY
+from .services.product_copy import copy_products
+from .services.quote import check_active_product
+from .services.formula import compile_formula, FormulaError
 
-# Create your tests here.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}} # MEH: No redis in tests
+
+
+class FormulaSandboxTest(SimpleTestCase):
+    """
+    MEH: Formula run on public quote endpoint -> any bad input must be FormulaError (never 500, never huge CPU)
+    """
+    def assertRejected(self, formula, **values):
+        with self.assertRaises(FormulaError):
+            compile_formula(formula).evaluate(**values)
+
+    def test_valid_formula(self):
+        formula = compile_formula('tirage * paper_price + 2 ** 3 + ceil(page / 2)')
+        self.assertEqual(formula.evaluate(tirage=10, paper_price=5, page=3), 60)
+
+    def test_negative_power(self):
+        self.assertEqual(compile_formula('tirage * 2 ** -1').evaluate(tirage=4), 2)
+
+    def test_not_number_power(self):
+        self.assertRejected("2 ** 'a'")
+        self.assertRejected('2 ** True')
+        self.assertRejected('2 ** (not 5)')
+
+    def test_big_power(self):
+        self.assertRejected('2 ** 11')
+        self.assertRejected('9 ** 10 ** 10')
+        self.assertRejected('2 ** tirage', tirage=3)
+        self.assertRejected('2 ** -tirage', tirage=3)
+
+    def test_nested_power(self):
+        self.assertRejected('((((9 ** 10) ** 10) ** 10) ** 10) ** 10')
+        self.assertRejected('max(9 ** 10, 1) ** 10')
+        self.assertRejected('(tirage ** 2) ** 2', tirage=3)
+
+    def test_not_finite_result(self):
+        self.assertRejected('1e308 * 10 * tirage', tirage=1)
+        self.assertRejected('1e308 ** 2 + tirage', tirage=1)
+        self.assertRejected('ceil(1e308 * 10) + tirage', tirage=1)
+        self.assertRejected('(0 - 8) ** 0.5 * tirage', tirage=1) # MEH: complex number
+
+    def test_zero_division(self):
+        self.assertRejected('tirage / 0', tirage=1)
+
+    def test_not_allowed_node(self):
+        self.assertRejected('__import__("os")')
+        self.assertRejected('tirage.__class__', tirage=1)
+        self.assertRejected('[tirage]', tirage=1)
+        self.assertRejected('lambda: 1')
+        self.assertRejected('unknown + 1')
+        self.assertRejected("'a' * 10")
+
+    def test_missing_variable(self):
+        self.assertRejected('tirage * page', tirage=1)
+
+    def test_bool_result(self):
+        self.assertRejected('tirage > 5', tirage=10)
+        self.assertRejected('not page', page=0)
+        self.assertRejected('tirage and page > 1', tirage=1, page=2)
+        self.assertRejected('tirage if page else page > 1', tirage=1, page=0)
+        self.assertRejected('max(tirage > 5, 0)', tirage=10) # MEH: bool from function only seen at evaluate
+
+    def test_condition_in_number_result(self):
+        self.assertEqual(compile_formula('tirage * (2 if page > 10 else 3)').evaluate(tirage=2, page=20), 4)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CategoryCloneTest(TestCase):
+    """
+    MEH: Subtree cloned with precomputed tree fields (valid MPTT), stored paths & products under cloned categories
+    """
+    def setUp(self):
+        self.root = ProductCategory.objects.create(title='Root category')
+        self.child = ProductCategory.objects.create(title='Child category', parent_category=self.root)
+        self.grandchild = ProductCategory.objects.create(title='Grandchild category', parent_category=self.child)
+        self.other_root = ProductCategory.objects.create(title='Other root category')
+        self.product = Product.objects.create(title='Child product', type=ProductType.SOLID, parent_category=self.child)
+        SolidProduct.objects.create(product_info=self.product, sizable=True)
+
+    def test_clone_root(self):
+        new_root = clone_category_tree(self.root)
+        self.assertEqual(verify_tree(ProductCategory), {})
+        self.assertEqual(new_root.title, 'Root category (copy)')
+        self.assertIsNone(new_root.parent_category_id)
+        new_child = ProductCategory.objects.get(title='Child category (copy)')
+        new_grandchild = ProductCategory.objects.get(title='Grandchild category (copy)')
+        self.assertEqual(new_child.parent_category_id, new_root.pk)
+        self.assertEqual(new_grandchild.parent_category_id, new_child.pk)
+        self.assertEqual(new_grandchild.path_ids, [new_root.pk, new_child.pk, new_grandchild.pk])
+        product_copy = Product.objects.get(parent_category=new_child)
+        self.assertNotEqual(product_copy.pk, self.product.pk)
+        self.assertTrue(SolidProduct.objects.get(pk=product_copy.pk).sizable)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).parent_category_id, self.child.pk) # MEH: Original kept
+
+    def test_clone_under_parent(self):
+        new_child = clone_category_tree(self.child, parent_copy=self.other_root)
+        self.assertEqual(verify_tree(ProductCategory), {})
+        self.assertEqual(new_child.parent_category_id, self.other_root.pk)
+        self.assertEqual(list(new_child.get_descendants().values_list('title', flat=True)),
+                         ['Grandchild category (copy)'])
+        self.assertEqual(ProductCategory.objects.get(pk=self.root.pk).get_descendant_count(), 2) # MEH: Source not touched
+
+    def test_clone_progress(self):
+        progress = []
+        clone_category_tree(self.root, progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual(progress[-1], (4, 4)) # MEH: 3 categories & 1 product
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductCopyTest(TestCase):
+    """
+    MEH: Bulk copy of product, info, M2M, options & dependency edges, cache of new ids bumped after commit
+    """
+    def setUp(self):
+        cache.clear()
+        cache.set(PRICE_TABLE_REFRESH_KEY, True) # MEH: Refresh already scheduled (no celery call on commit)
+        self.category = ProductCategory.objects.create(title='Product category')
+        self.other_category = ProductCategory.objects.create(title='Other category')
+        self.size = Size.objects.create(name='A4', display_name='A4')
+        self.duration = Duration.objects.create(title='Normal', day=3)
+        option_category = OptionCategory.objects.create(title='Finishing')
+        self.option = Option.objects.create(title='Lamination', parent_category=option_category, base_amount=10)
+        self.dependent = Option.objects.create(title='Glossy', parent_category=option_category)
+        self.product = Product.objects.create(title='Offset product', type=ProductType.OFFSET,
+                                              parent_category=self.category)
+        info = OffsetProduct.objects.create(product_info=self.product, tirage_list={'items': [100]},
+                                            manual_price={str(self.size.pk): {'100': 5000}})
+        info.size_list.add(self.size)
+        info.duration_list.add(self.duration)
+        product_option = ProductOption.objects.create(product=self.product, option=self.option, base_multiply=2,
+                                                      count_discount={'100': 5})
+        product_option.dependent_option.add(self.dependent)
+        self.no_info_product = Product.objects.create(title='No info product', type=ProductType.OFFSET,
+                                                      parent_category=self.category)
+
+    def test_copy_product(self):
+        product_map = copy_products([self.product], parent_category_id=self.other_category.pk)
+        product_copy = Product.objects.get(pk=product_map[self.product.pk])
+        self.assertEqual(product_copy.parent_category_id, self.other_category.pk)
+        self.assertTrue(product_copy.title.startswith('Offset product (copy: '))
+        info_copy = OffsetProduct.objects.get(pk=product_copy.pk)
+        self.assertEqual(info_copy.manual_price, {str(self.size.pk): {'100': 5000}})
+        self.assertEqual(list(info_copy.size_list.values_list('pk', flat=True)), [self.size.pk])
+        self.assertEqual(list(info_copy.duration_list.values_list('pk', flat=True)), [self.duration.pk])
+        option_copy = ProductOption.objects.get(product=product_copy)
+        self.assertEqual((option_copy.option_id, option_copy.base_multiply, option_copy.count_discount),
+                         (self.option.pk, 2, {'100': 5}))
+        self.assertEqual(list(option_copy.dependent_option.values_list('pk', flat=True)), [self.dependent.pk])
+        self.assertEqual(ProductOption.objects.filter(product=self.product).count(), 1) # MEH: Original kept
+
+    def test_skip_product_without_info(self):
+        product_map = copy_products([self.product, self.no_info_product])
+        self.assertEqual(list(product_map), [self.product.pk])
+        self.assertEqual(Product.objects.get(pk=product_map[self.product.pk]).parent_category_id, self.category.pk)
+
+    def test_copy_quotable_after_commit(self):
+        self.assertEqual(check_active_product(self.product.pk), ProductType.OFFSET) # MEH: Active ids cached now
+        with self.captureOnCommitCallbacks(execute=True):
+            product_map = copy_products([self.product])
+        self.assertEqual(check_active_product(product_map[self.product.pk]), ProductType.OFFSET)
@@ -5,13 +5,19 @@ from api.permissions import ApiAccess
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
 from api.serializers import CombineBulkDeleteSerializer, CombineBulkUpdateActivateSerializer, \
-    CombineBulkUpdateProductStatusSerializer, CopyWithIdSerializer
+    CombineBulkUpdateProductStatusSerializer, CopyWithIdSerializer, CopyListWithIdSerializer
 from .filters import OptionFilter
 from .models import ProductCategory, Product, GalleryCategory, GalleryImage, ProductFileField, \
     Size, SheetPaper, Paper, Duration, Banner, Color, Folding, \
     Design, OffsetProduct, LargeFormatProduct, SolidProduct, DigitalProduct, Option, OptionCategory, ProductOption, \
     PriceListCategory, PriceListTable
-from .services.category_clone import clone_category_tree
+from .services.category_clone import clone_category_tree, get_subtree_size, get_clone_job, set_clone_job, \
+    CLONE_ASYNC_THRESHOLD
+from .services.product_copy import copy_products, PRODUCT_INFO_MODEL_MAP
+from .services.quote import get_quote, get_batch_quote, check_active_product, QuoteError, ProductNotFoundError
+from .services.product_detail import get_product_detail, PRODUCT_DETAIL_SECTIONS
+from .services.option_graph import get_option_graph, get_enabled_options, OptionCycleError
+from .tasks import clone_category_tree_task
 from .serializers import (ProductCategorySerializer, ProductCategoryBriefSerializer, ProductBriefSerializer, \
                           GalleryCategorySerializer, GalleryImageSerializer, GalleryCategoryBriefSerializer,
                           GalleryImageBriefSerializer, GalleryDropDownSerializer, ProductGallerySerializer, \
@@ -28,17 +34,17 @@ from .serializers import (ProductCategorySerializer, ProductCategoryBriefSeriali
                           ProductManualPriceSerializer, ProductFormulaPriceSerializer, ProductInCategorySerializer, \
                           PriceListCategorySerializer, PriceListTableSerializer, PriceListCategoryBriefSerializer,
                           PriceListTableBriefSerializer, ProductCategoryTreeSerializer, GalleryCategoryTreeSerializer,
-                          ProductCategoryListSerializer, OptionCategoryTreeSerializer)
+                          ProductCategoryListSerializer, OptionCategoryTreeSerializer, ProductQuoteSerializer, \
+                          ProductBatchQuoteSerializer, ProductEnabledOptionSerializer)
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 from api.responses import *
 from api.mixins import CustomMixinModelViewSet
 from file_manager.excel_handler import ExcelHandler
 from django.core.exceptions import ObjectDoesNotExist
-from rest_framework.exceptions import NotFound
-from copy import deepcopy
-from django.db.models import ManyToManyField
-from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError, PermissionDenied
+from config.models import PriceListConfig
 from django.db import transaction
+import uuid
 
 
 @extend_schema(tags=['Product-Category'])
@@ -116,10 +122,7 @@ class ProductCategoryViewSet(CustomMixinModelViewSet):
         MEH: Delete List of Category & Product Item Objects (use POST ACTION for sending ids list in request body)
         """
         itm_qs, cat_qs = self.explorer_bulk_queryset(request, ProductCategory, Product)
-        parents = {cat.parent_category for cat in cat_qs if cat.parent_category}
-        response = self.custom_list_destroy([itm_qs, cat_qs])
-        ProductCategory.objects.rebuild()
-        return response
+        return self.custom_list_destroy([itm_qs, cat_qs]) # MEH: MPTT gap closed only in affected trees
 
     @extend_schema(
         summary='Change Status list of Categories & Products',
@@ -151,13 +154,27 @@ class ProductCategoryViewSet(CustomMixinModelViewSet):
             original_category = ProductCategory.objects.get(pk=category_id)
         except ObjectDoesNotExist:
             raise NotFound(TG_DATA_NOT_FOUND)
-        # category_copy = deepcopy(original_category)
-        # category_copy.pk = None
-        # category_copy.title += " (copy)"
-        # category_copy.save()
-        new_root = clone_category_tree(original_category, parent_copy=original_category.parent_category)
+        size = get_subtree_size(original_category)
+        if size > CLONE_ASYNC_THRESHOLD: # MEH: Big tree -> celery job & check progress with copy-status
+            job_id = uuid.uuid4().hex
+            set_clone_job(job_id, status='pending', done=0, total=size, category_id=original_category.pk)
+            clone_category_tree_task.delay(job_id, original_category.pk, original_category.parent_category_id)
+            return Response({"detail": TG_JOB_QUEUED, "job_id": job_id}, status=status.HTTP_202_ACCEPTED)
+        clone_category_tree(original_category, parent_copy=original_category.parent_category)
         return Response({"detail": TG_DATA_COPIED}, status=status.HTTP_201_CREATED)
 
+    @extend_schema(summary="Get progress of Category copy job")
+    @action(detail=False, methods=['get'],
+            url_path='copy-status/(?P<job_id>[0-9a-f]{32})', filter_backends=[None])
+    def copy_category_status(self, request, job_id=None):
+        """
+        MEH: Progress of big category copy (status, done, total, new_category_id)
+        """
+        job = get_clone_job(job_id)
+        if job is None:
+            raise NotFound(TG_DATA_NOT_FOUND)
+        return Response(job, status=status.HTTP_200_OK)
+
     @extend_schema(summary="Get list of Product in Category")
     @action(detail=True, methods=['get'], serializer_class=ProductInCategorySerializer,
             url_path='product-list', filter_backends=[None])
@@ -167,7 +184,7 @@ class ProductCategoryViewSet(CustomMixinModelViewSet):
         """
         category = self.get_object(pk=pk)
         all_category_ids = category.get_descendants(include_self=True).values_list('id', flat=True)
-        products = Product.objects.filter(parent_category_id__in=all_category_ids).select_related('parent_category').order_by('type')
+        products = Product.objects.filter(parent_category_id__in=all_category_ids).order_by('type') # MEH: Path resolved in list serializer
         return self.custom_get(products)
 
 
@@ -187,7 +204,8 @@ class ProductViewSet(CustomMixinModelViewSet):
     permission_classes = [ApiAccess]
     required_api_keys = {
         '__all__': ['product_manager', 'create_product'],
-        **dict.fromkeys(['create', 'copy_product'], ['create_product'])
+        **dict.fromkeys(['create', 'copy_product', 'copy_many_product'], ['create_product']),
+        **dict.fromkeys(['quote', 'batch_quote', 'enabled_options'], ['allow_any'])
     }
 
     def get_queryset(self, *args, **kwargs):
@@ -209,6 +227,33 @@ class ProductViewSet(CustomMixinModelViewSet):
     def create(self, request, *args, **kwargs): # MEH: override -> to set id in response
         return self.custom_create(request, response_data_back=True, **kwargs)
 
+    @extend_schema(
+        summary='All pages of Product Edit in 1 request',
+        parameters=[
+            OpenApiParameter(
+                name='fields',
+                type=str,
+                required=False,
+                description=f'Comma separated sections: {", ".join(PRODUCT_DETAIL_SECTIONS)} (all if empty)'
+            ),
+        ],
+    )
+    @action(detail=True, methods=['get'], url_path='full', filter_backends=[None])
+    def full_detail(self, request, pk=None):
+        """
+        MEH: Product editor data (info, detail, gallery, designs, files, options, price) with planned prefetch,
+        cached per product version
+        """
+        try:
+            product_id = int(pk)
+        except ValueError:
+            raise NotFound(TG_EXPECTED_ID_NUMBER)
+        data = get_product_detail(product_id, fields=request.query_params.get('fields'),
+                                  serializer_context=self.get_serializer_context())
+        if data is None:
+            raise NotFound(TG_DATA_NOT_FOUND)
+        return Response(data, status=status.HTTP_200_OK)
+
     @extend_schema(summary="Page 2 of Product Edit (Offset)")
     @action(detail=True, methods=['get', 'put', 'patch'], serializer_class=OffsetProductSerializer,
             url_path='offset', filter_backends=[None])
@@ -400,39 +445,78 @@ class ProductViewSet(CustomMixinModelViewSet):
             original_product = Product.objects.get(pk=product_id)
         except ObjectDoesNotExist:
             raise NotFound(TG_DATA_NOT_FOUND)
-        product_copy = deepcopy(original_product)
-        product_copy.pk = None
-        timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
-        product_copy.title = f"{original_product.title} (copy: {timestamp})"
-        product_copy.save()
-        for field in original_product._meta.get_fields():
-            if isinstance(field, ManyToManyField) and not field.auto_created:
-                value = getattr(original_product, field.name).all()
-                getattr(product_copy, field.name).set(value)
-        related_info_model = {
-            'OFF': 'offset_info',
-            'LAR': 'large_format_info',
-            'SLD': 'solid_info',
-            'DIG': 'digital_info',
-        }.get(original_product.type)
-        if not related_info_model:
-            product_copy.delete()
+        if original_product.type not in PRODUCT_INFO_MODEL_MAP:
             return Response({"detail": "Invalid product type"}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            original_data = getattr(original_product, related_info_model)
-        except ObjectDoesNotExist:
-            product_copy.delete()
+        product_map = copy_products([original_product])
+        if original_product.pk not in product_map:
             return Response({"detail": "Related product info not found"}, status=status.HTTP_404_NOT_FOUND)
-        data_copy = deepcopy(original_data)
-        data_copy.pk = None
-        data_copy.product_info = product_copy
-        data_copy.save()
-        for field in original_data._meta.get_fields():
-            if isinstance(field, ManyToManyField) and not field.auto_created:
-                value = getattr(original_data, field.name).all()
-                getattr(data_copy, field.name).set(value)
         return Response({"detail": TG_DATA_COPIED}, status=status.HTTP_201_CREATED)
 
+    @extend_schema(summary="Copy list of Product (with info, options & M2M)")
+    @action(detail=False, methods=['post'], serializer_class=CopyListWithIdSerializer,
+            url_path='copy-many', filter_backends=[None])
+    def copy_many_product(self, request):
+        """
+        MEH: Copy list of Product (product family) with bulk insert, return old ID -> new ID
+        """
+        validated_data = self.get_validate_data(request.data)
+        parent_id = validated_data.get('parent_id', None)
+        if parent_id and not ProductCategory.objects.filter(pk=parent_id).exists():
+            raise NotFound(TG_DATA_NOT_FOUND)
+        products = Product.objects.filter(pk__in=validated_data.get('ids'))
+        product_map = copy_products(products, parent_category_id=parent_id)
+        if not product_map:
+            raise NotFound(TG_DATA_NOT_FOUND)
+        return Response({"detail": TG_DATA_COPIED, "id_map": product_map}, status=status.HTTP_201_CREATED)
+
+    @extend_schema(summary="Enabled options of Product for selected options")
+    @action(detail=True, methods=['post'], serializer_class=ProductEnabledOptionSerializer,
+            url_path='enabled-options', filter_backends=[None])
+    def enabled_options(self, request, pk=None):
+        """
+        MEH: Options can be shown for customer selection from cached option graph (topological order & closure)
+        """
+        product_id = self.get_lookup_id(pk)
+        validated_data = self.get_validate_data(request.data)
+        try:
+            check_active_product(product_id) # MEH: Before any generation key of product
+        except ProductNotFoundError:
+            raise NotFound(TG_DATA_NOT_FOUND)
+        graph = get_option_graph(product_id)
+        if graph is None:
+            raise NotFound(TG_DATA_NOT_FOUND)
+        try:
+            enabled = get_enabled_options(graph, validated_data.get('options'))
+        except OptionCycleError:
+            return Response({'detail': TG_PREVENT_CIRCULAR_OPTION}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'enabled': enabled, 'closure': graph['closure']}, status=status.HTTP_200_OK)
+
+    @extend_schema(summary="Price quote of Product")
+    @action(detail=True, methods=['post'], serializer_class=ProductQuoteSerializer,
+            url_path='quote', filter_backends=[None])
+    def quote(self, request, pk=None):
+        """
+        MEH: Price of Product from cached price matrix (no query until product or price input change)
+        """
+        product_id = self.get_lookup_id(pk)
+        validated_data = self.get_validate_data(request.data)
+        try:
+            return Response(get_quote(product_id, **validated_data), status=status.HTTP_200_OK)
+        except ProductNotFoundError:
+            raise NotFound(TG_DATA_NOT_FOUND)
+        except QuoteError as e:
+            raise ValidationError(f'{TG_DATA_WRONG} {e}')
+
+    @extend_schema(summary="Price quote of list of Product (cart)")
+    @action(detail=False, methods=['post'], serializer_class=ProductBatchQuoteSerializer,
+            url_path='batch-quote', filter_backends=[None])
+    def batch_quote(self, request):
+        """
+        MEH: Price of all cart lines in 1 request (error of each line in its own result)
+        """
+        validated_data = self.get_validate_data(request.data)
+        return Response(get_batch_quote(validated_data.get('lines')), status=status.HTTP_200_OK)
+
 
 @extend_schema(tags=['Gallery'])
 class GalleryCategoryViewSet(CustomMixinModelViewSet):
@@ -881,7 +965,7 @@ class OptionViewSet(CustomMixinModelViewSet):
         MEH: Full list of related Product to Option
         """
         option = self.get_object(pk=pk)
-        return self.custom_get(option.product_list)
+        return self.custom_get(option.product_list.select_related('product')) # MEH: Category path resolved in list serializer
 
 
 @extend_schema(tags=['Price-List'])
@@ -973,5 +1057,42 @@ class PriceListTableViewSet(CustomMixinModelViewSet):
     pagination_class = None
     permission_classes = [ApiAccess]
     required_api_keys = {
-        '__all__': ['price_list_manager']
+        '__all__': ['price_list_manager'],
+        'public_cells': ['allow_any'],
+        'public_list': ['allow_any'],
     }
+    public_fields = ['id', 'title', 'description', 'alt', 'type', 'size_unit', 'label', 'label_text',
+                     'cells', 'cells_update']
+
+    @staticmethod
+    def check_public_access(request):
+        """
+        MEH: Public price list only if config is active (& user logged in or not blocked by role if needed)
+        """
+        config = PriceListConfig.objects.only('is_active', 'auth_need').first()
+        if config is None or not config.is_active:
+            raise NotFound(TG_DATA_NOT_FOUND)
+        if config.auth_need and not request.user.is_authenticated:
+            raise PermissionDenied(TG_PERMISSION_DENIED)
+        if request.user.is_authenticated and config.block_role.filter(pk=request.user.role_id).exists():
+            raise PermissionDenied(TG_PERMISSION_DENIED)
+
+    @extend_schema(summary="Materialized cells of 1 active Price List Table")
+    @action(detail=True, methods=['get'], url_path='cells', filter_backends=[None])
+    def public_cells(self, request, pk=None):
+        """
+        MEH: Public table with 1 indexed read (cells built in celery on price change)
+        """
+        table_id = self.get_lookup_id(pk)
+        self.check_public_access(request)
+        table = PriceListTable.objects.filter(pk=table_id, is_active=True).values(*self.public_fields).first()
+        if not table:
+            raise NotFound(TG_DATA_NOT_FOUND)
+        return Response(table, status=status.HTTP_200_OK)
+
+    @extend_schema(summary="Materialized cells of all active Price List Table")
+    @action(detail=False, methods=['get'], url_path='public', filter_backends=[None])
+    def public_list(self, request):
+        self.check_public_access(request)
+        tables = PriceListTable.objects.filter(is_active=True).order_by('sort_number', 'pk').values(*self.public_fields)
+        return Response(list(tables), status=status.HTTP_200_OK)
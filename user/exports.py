@@ -0,0 +1,27 @@
+from django.db.models import Subquery, OuterRef
+from file_manager.excel_export import ExportColumn, format_jalali_datetime, format_number, make_label_formatter, \
+    BOOLEAN_ACTIVE_LABELS
+from .models import GENDER, Address
+
+DEFAULT_PROVINCE = Subquery(Address.objects.filter(user=OuterRef('pk'), is_default=True).values('province__name')[:1])
+
+USER_EXPORT_COLUMNS = [ # MEH: Same columns & order of UserDownloadDataSerializer
+    ExportColumn('first_name', 'نام'),
+    ExportColumn('last_name', 'نام خانوادگی'),
+    ExportColumn('phone_number', 'شماره موبایل'),
+    ExportColumn('date_joined', 'تاریخ عضویت', formatter=format_jalali_datetime),
+    ExportColumn('national_id', 'کد ملی'),
+    ExportColumn('order_count', 'تعداد سفارش‌ها', formatter=format_number),
+    ExportColumn('last_order_date', 'آخرین سفارش', formatter=format_jalali_datetime),
+    ExportColumn('credit', 'اعتبار کاربر', 'credit__total_amount', format_number),
+    ExportColumn('email', 'ایمیل'),
+    ExportColumn('province', 'استان', DEFAULT_PROVINCE), # MEH: Own subquery (not depend on get_queryset branch)
+    ExportColumn('is_active', 'وضعیت', formatter=BOOLEAN_ACTIVE_LABELS),
+    ExportColumn('role', 'نقش', 'role__title'),
+    ExportColumn('introduce_from', 'نحوه آشنایی', 'introduce_from__title'),
+    ExportColumn('invite_user_count', 'تعداد معرفی‌شدگان', formatter=format_number),
+    ExportColumn('accounting_id', 'کد حسابداری'),
+    ExportColumn('accounting_name', 'نام حسابداری'),
+    ExportColumn('gender', 'جنسیت', 'user_profile__gender', make_label_formatter(dict(GENDER.choices))),
+    ExportColumn('job', 'شغل', 'user_profile__job'),
+]
@@ -1,5 +1,6 @@
 from datetime import datetime
 from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
 from django.core import validators
 from django.utils import timezone
@@ -8,8 +9,8 @@ from django.contrib.gis.db import models as gis_models
 from city.models import City, Province
 from api.responses import *
 from api.models import ApiItem
+from api.access import has_api_access, ROLE, EMPLOYEE_LEVEL
 import string, random
-from django.core.cache import cache
 
 
 class Role(models.Model):
@@ -25,6 +26,8 @@ class Role(models.Model):
     cashback_active = models.BooleanField(default=False,
                                           blank=False, null=False, verbose_name='Cashback Active')
 
+    delete_protected_fields = ('is_default', 'cashback_active') # MEH: Never deleted (bulk delete skip them too)
+
     class Meta:
         ordering = ['sort_number']
         verbose_name = 'Role'
@@ -45,11 +48,17 @@ class Role(models.Model):
             super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
-        if self.is_default or self.cashback_active:
+        if any(getattr(self, field_name) for field_name in self.delete_protected_fields):
             raise ValidationError(TG_PREVENT_DELETE_DEFAULT)
         super().delete(*args, **kwargs)
 
 
+KEY_CHARS = string.ascii_lowercase + string.digits
+PUBLIC_KEY_PREFIX = 'tg-'
+PUBLIC_KEY_LENGTH = 8
+PRIVATE_KEY_LENGTH = 16
+
+
 class User(AbstractUser):
     phone_number = models.CharField(max_length=11, unique=True, validators=[validators.MinLengthValidator(11), validators.RegexValidator(regex=r'^09\d{9}$')],
                                     blank=False, null=False, verbose_name='Phone Number')
@@ -95,22 +104,45 @@ class User(AbstractUser):
         self._original_introduce_from_id = self.introduce_from_id  # cache old FK
 
     @staticmethod
-    def generate_unique_key(self, field_name, length, prefix=''):
-        chars = string.ascii_lowercase + string.digits
-        while True:
-            prefix += ''.join(random.choices(chars, k=length-len(prefix)))
-            if not self.objects.filter(**{field_name: prefix}).exists():
-                return prefix
+    def make_key(length, prefix=''):
+        return prefix + ''.join(random.choices(KEY_CHARS, k=length - len(prefix)))
+
+    @classmethod
+    def allocate_key_pairs(cls, count):
+        """
+        MEH: count unique (public_key, private_key) pairs, candidates of each batch checked with 1 query (both field)
+        for signup (1 pair) & bulk import (pair for each row)
+        """
+        pairs, used_public, used_private = [], set(), set()
+        while len(pairs) < count:
+            size = (count - len(pairs)) * 2 # MEH: Extra candidates, collision is rare
+            public_keys = {cls.make_key(PUBLIC_KEY_LENGTH, PUBLIC_KEY_PREFIX) for _ in range(size)} - used_public
+            private_keys = {cls.make_key(PRIVATE_KEY_LENGTH) for _ in range(size)} - used_private
+            existing = cls.objects.filter(Q(public_key__in=public_keys) | Q(private_key__in=private_keys))
+            for public_key, private_key in existing.values_list('public_key', 'private_key'):
+                public_keys.discard(public_key)
+                private_keys.discard(private_key)
+            for public_key, private_key in zip(public_keys, private_keys):
+                if len(pairs) == count:
+                    break
+                pairs.append((public_key, private_key))
+                used_public.add(public_key)
+                used_private.add(private_key)
+        return pairs
 
     def save(self, *args, **kwargs):
         if self.pk and self.introduce_from_id != self._original_introduce_from_id:
             self._changed_introduce_from = True
         else:
             self._changed_introduce_from = False
-        if not self.public_key or 'tg-' not in self.public_key:
-            self.public_key = self.generate_unique_key(User,'public_key', 8, 'tg-')
-        if not self.private_key or len(self.private_key) != 16:
-            self.private_key = self.generate_unique_key(User, 'private_key', 16)
+        need_public_key = not self.public_key or PUBLIC_KEY_PREFIX not in self.public_key
+        need_private_key = not self.private_key or len(self.private_key) != PRIVATE_KEY_LENGTH
+        if need_public_key or need_private_key: # MEH: 1 query for both key
+            public_key, private_key = User.allocate_key_pairs(1)[0]
+            if need_public_key:
+                self.public_key = public_key
+            if need_private_key:
+                self.private_key = private_key
         if not self.phone_number:
             self.phone_number = self.username
         if str(self.phone_number) != str(self.username):
@@ -122,21 +154,10 @@ class User(AbstractUser):
         if not keys:
             return False
         if self.is_employee: # MEH: Check Access for this Employee
-            level = getattr(getattr(self, "employee_profile", None), "level", None)
-            if level:
-                cache_key = f"employee_level_api_keys:{level.pk}"
-                api_keys = cache.get(cache_key)
-                if api_keys is None: # MEH: Check if already Cached or not
-                    api_keys = list(level.api_items.values_list("key", flat=True))
-                    cache.set(cache_key, api_keys, timeout=None) # MEH: Cache it forever (only changed when m2m changed signal receive!)
-                return any(key in api_keys for key in keys)
-        elif self.role: # MEH: Check Access for customer depend on their Role...
-            cache_key = f"role_api_keys:{self.role.pk}"
-            api_keys = cache.get(cache_key)
-            if api_keys is None: # MEH: Check if already Cached or not
-                api_keys = list(self.role.api_items.values_list("key", flat=True))
-                cache.set(cache_key, api_keys, timeout=None) # MEH: Cache it forever (only changed when m2m changed signal receive!)
-            return any(key in api_keys for key in keys)
+            level_id = getattr(getattr(self, "employee_profile", None), "level_id", None)
+            return has_api_access(EMPLOYEE_LEVEL, level_id, frozenset(keys))
+        if self.role_id: # MEH: Check Access for customer depend on their Role...
+            return has_api_access(ROLE, self.role_id, frozenset(keys))
         return False
 
 
@@ -455,6 +455,24 @@ class UserImportDataSerializer(UserSerializer):
         list_serializer_class = CustomBulkListSerializer # MEH: for validate all data and response with number
 
 
+class UserBulkImportDataSerializer(UserImportDataSerializer):
+    """
+    MEH: Excel import row validation without query (unique & related ids checked for each chunk in user_import service)
+    """
+    role = serializers.IntegerField(required=False, allow_null=True)
+    introduce_from = serializers.IntegerField(required=False, allow_null=True)
+    accounting_id = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+
+    class Meta(UserImportDataSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
+
+    def validate_phone_number(self, value):
+        return value
+
+    def validate_national_id(self, value):
+        return value
+
+
 class UserImportFieldDataSerializer(CustomModelSerializer):
     """
     MEH: temporary Serializer Class for handle Excel & user role -> (User import list)
@@ -0,0 +1,153 @@
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q
+from rest_framework import serializers
+from api.responses import TG_UNIQUE_PROTECT
+from financial.models import Credit, CashBack
+from user.models import User, UserProfile, Role, Introduction
+from user.serializers import UserBulkImportDataSerializer
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_ROWS = 50000
+IMPORT_UNIQUE_FIELDS = { # MEH: Field -> name in error
+    'phone_number': 'شماره موبایل',
+    'national_id': 'کد ملی',
+    'accounting_id': 'کد حسابداری',
+}
+PROFILE_FIELDS = ['gender', 'job', 'description']
+
+
+def iter_chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class UserImporter:
+    """
+    MEH: Excel rows -> Users in chunks: validate each row with 1 serializer (no query), unique check with 1 query for
+    each chunk & bulk create of Profile, User, Credit & CashBack together (no post_save signal for each User)
+    """
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.serializer = UserBulkImportDataSerializer()
+        self.roles = {role.pk: role for role in Role.objects.all()}
+        self.default_role = next((role for role in self.roles.values() if role.is_default), None)
+        self.introductions = set(Introduction.objects.values_list('pk', flat=True))
+        self.seen = {field_name: set() for field_name in IMPORT_UNIQUE_FIELDS} # MEH: Duplicate inside same file
+        self.created = 0
+        self.errors = {}
+
+    def add_error(self, row_number, error):
+        self.errors[f'row-{row_number}'] = error
+
+    def validate_row(self, row_number, data):
+        try:
+            validated_data = self.serializer.run_validation(data)
+        except serializers.ValidationError as e:
+            self.add_error(row_number, e.detail)
+            return None
+        role_id = validated_data.get('role')
+        if role_id and role_id not in self.roles:
+            self.add_error(row_number, {'role': [str(role_id)]})
+            return None
+        introduce_from_id = validated_data.get('introduce_from')
+        if introduce_from_id and introduce_from_id not in self.introductions:
+            self.add_error(row_number, {'introduce_from': [str(introduce_from_id)]})
+            return None
+        return validated_data
+
+    def check_unique(self, chunk):
+        """
+        MEH: Phone, National ID & Accounting ID of chunk checked with 1 query (and with previous rows of file)
+        return (row number, data) of unique rows
+        """
+        values = {field_name: {data[field_name] for _, data in chunk if data.get(field_name)}
+                  for field_name in IMPORT_UNIQUE_FIELDS}
+        query = Q()
+        for field_name, field_values in values.items():
+            if field_values:
+                query |= Q(**{f'{field_name}__in': field_values})
+        existing = {field_name: set() for field_name in IMPORT_UNIQUE_FIELDS}
+        if query:
+            for row in User.objects.filter(query).values_list(*IMPORT_UNIQUE_FIELDS):
+                for field_name, value in zip(IMPORT_UNIQUE_FIELDS, row):
+                    existing[field_name].add(value)
+        valid = []
+        for row_number, data in chunk:
+            duplicate = next((field_name for field_name in IMPORT_UNIQUE_FIELDS if data.get(field_name) and (
+                data[field_name] in existing[field_name] or data[field_name] in self.seen[field_name])), None)
+            if duplicate:
+                self.add_error(row_number, {duplicate: [f'{IMPORT_UNIQUE_FIELDS[duplicate]} {TG_UNIQUE_PROTECT}']})
+                continue
+            for field_name in IMPORT_UNIQUE_FIELDS:
+                if data.get(field_name):
+                    self.seen[field_name].add(data[field_name])
+            valid.append((row_number, data))
+        return valid
+
+    def create_chunk(self, chunk):
+        """
+        MEH: Chunk saved all or nothing in its own transaction (savepoint if called in outer transaction),
+        DB unique conflict (user created after check_unique) -> rows of chunk reported as error, next chunks continue
+        """
+        try:
+            with transaction.atomic():
+                return self.insert_rows([data for _, data in chunk])
+        except IntegrityError as e:
+            for row_number, _ in chunk:
+                self.add_error(row_number, {'detail': [str(e)]})
+            return 0
+
+    def insert_rows(self, rows):
+        """
+        MEH: 1 bulk insert for each table (Profile, User, Credit, CashBack) & 1 UPDATE for each Introduction
+        """
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(**{field_name: value for field_name, value in (data.get('user_profile') or {}).items()
+                           if field_name in PROFILE_FIELDS})
+            for data in rows
+        ])
+        users = []
+        for data, profile, (public_key, private_key) in zip(rows, profiles, User.allocate_key_pairs(len(rows))):
+            data = {field_name: value for field_name, value in data.items() if field_name != 'user_profile'}
+            role_id = data.pop('role', None) or getattr(self.default_role, 'pk', None)
+            introduce_from_id = data.pop('introduce_from', None)
+            users.append(User(
+                **data, username=data['phone_number'], password=make_password(None), user_profile=profile,
+                role_id=role_id, introduce_from_id=introduce_from_id, public_key=public_key, private_key=private_key,
+            ))
+        users = User.objects.bulk_create(users)
+        credits = Credit.objects.bulk_create([Credit(owner=user) for user in users])
+        CashBack.objects.bulk_create([
+            CashBack(credit=credit) for user, credit in zip(users, credits)
+            if user.role_id in self.roles and self.roles[user.role_id].cashback_active
+        ])
+        introduce_counts = {}
+        for user in users:
+            if user.introduce_from_id:
+                introduce_counts[user.introduce_from_id] = introduce_counts.get(user.introduce_from_id, 0) + 1
+        for introduction_id, count in introduce_counts.items():
+            Introduction.objects.filter(pk=introduction_id).update(number=F('number') + count)
+        return len(users)
+
+    def run(self, rows):
+        """
+        MEH: rows -> (excel row number, clean data), each chunk saved in its own transaction
+        return {'created': count, 'errors': {'row-<n>': errors}}
+        """
+        for chunk in iter_chunks(rows, self.chunk_size):
+            validated = []
+            for row_number, data in chunk:
+                validated_data = self.validate_row(row_number, data)
+                if validated_data is not None:
+                    validated.append((row_number, validated_data))
+            valid_rows = self.check_unique(validated)
+            if valid_rows:
+                self.created += self.create_chunk(valid_rows)
+        return {'created': self.created, 'errors': self.errors}
+
+
+def import_users(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    return UserImporter(chunk_size=chunk_size).run(rows)
@@ -1,9 +1,10 @@
 from django.db.models.signals import post_delete, post_save, pre_save, m2m_changed
 from django.dispatch import receiver
 from django.db.models import F
-from django.core.cache import cache
 from .models import Role, User, UserProfile, Introduction
 from financial.models import Credit, CashBack
+from api.authentication import invalidate_principal, invalidate_all_principals
+from api.access import invalidate_api_access
 
 
 @receiver(post_save, sender=User)
@@ -92,7 +93,23 @@ def user_post_delete(sender, instance, **kwargs):
         pass
 
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def clear_user_principal_cache(sender, instance, **kwargs):
+    """
+    MEH: User snapshot (role, is_employee, is_active, ...) most be built again
+    """
+    invalidate_principal(instance.pk)
+
+
+@receiver(post_delete, sender=Role)
+def clear_role_principal_cache(sender, instance, **kwargs):
+    """
+    MEH: Users role changed to default with SET_DEFAULT (no User signal for them)
+    """
+    invalidate_all_principals()
+
+
 @receiver(m2m_changed, sender=Role.api_items.through)
 def clear_role_api_keys_cache(sender, instance, **kwargs):
-    cache_key = f"role_api_keys:{instance.pk}"
-    cache.delete(cache_key)
+    invalidate_api_access() # MEH: All workers compile access matrix again
@@ -1,3 +1,73 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from financial.models import Credit, CashBack
+from .models import User, Role, Introduction
+from .services.user_import import UserImporter, import_users
 
-# Create your tests here.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}} # MEH: No redis in tests
+
+
+class NoUniqueCheckImporter(UserImporter):
+    """
+    MEH: Same as user created by other request between check_unique & insert of chunk
+    """
+    def check_unique(self, chunk):
+        return chunk
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserImporterTest(TestCase):
+    """
+    MEH: Valid rows created in chunks with profile, credit & cashback, bad rows reported with excel row number
+    """
+    def setUp(self):
+        self.default_role = Role.objects.create(title='Default role', is_default=True)
+        self.cashback_role = Role.objects.create(title='Cashback role', cashback_active=True)
+        self.introduction = Introduction.objects.create(title='Instagram')
+
+    def make_row(self, row_number, phone_number, **values):
+        return row_number, {'phone_number': phone_number, 'first_name': f'User {row_number}', **values}
+
+    def test_import_rows(self):
+        result = import_users([
+            self.make_row(2, '09120000001', role=self.cashback_role.pk, introduce_from=self.introduction.pk,
+                          user_profile={'job': 'Designer'}),
+            self.make_row(3, '09120000002', national_id='0012345678'),
+        ], chunk_size=1)
+        self.assertEqual(result, {'created': 2, 'errors': {}})
+        cashback_user = User.objects.get(phone_number='09120000001')
+        self.assertEqual(cashback_user.username, '09120000001')
+        self.assertEqual(cashback_user.user_profile.job, 'Designer')
+        self.assertTrue(cashback_user.public_key.startswith('tg-'))
+        self.assertTrue(CashBack.objects.filter(credit__owner=cashback_user).exists())
+        default_user = User.objects.get(phone_number='09120000002')
+        self.assertEqual(default_user.role_id, self.default_role.pk)
+        self.assertFalse(CashBack.objects.filter(credit__owner=default_user).exists())
+        self.assertEqual(Credit.objects.filter(owner__in=[cashback_user, default_user]).count(), 2)
+        self.introduction.refresh_from_db()
+        self.assertEqual(self.introduction.number, 1)
+
+    def test_row_errors(self):
+        User.objects.create(username='09120000009', phone_number='09120000009')
+        result = import_users([
+            self.make_row(2, '123'),
+            self.make_row(3, '09120000001', role=999999),
+            self.make_row(4, '09120000002', introduce_from=999999),
+            self.make_row(5, '09120000009'), # MEH: Exist in DB
+            self.make_row(6, '09120000003', national_id='0012345678'),
+            self.make_row(7, '09120000004', national_id='0012345678'), # MEH: Duplicate in same file
+        ])
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(set(result['errors']), {'row-2', 'row-3', 'row-4', 'row-5', 'row-7'})
+        self.assertTrue(User.objects.filter(phone_number='09120000003').exists())
+
+    def test_integrity_error_reported_as_row_errors(self):
+        User.objects.create(username='09120000009', phone_number='09120000009')
+        result = NoUniqueCheckImporter(chunk_size=2).run([
+            self.make_row(2, '09120000001'),
+            self.make_row(3, '09120000009'), # MEH: Conflict -> all rows of this chunk rolled back
+            self.make_row(4, '09120000002'),
+        ])
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(set(result['errors']), {'row-2', 'row-3'})
+        self.assertFalse(User.objects.filter(phone_number='09120000001').exists())
+        self.assertTrue(User.objects.filter(phone_number='09120000002').exists())
@@ -1,4 +1,3 @@
-import jdatetime
 from rest_framework import status, filters
 from datetime import datetime, date
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -30,6 +29,11 @@ from api.responses import *
 from api.mixins import CustomMixinModelViewSet
 from api.serializers import BulkListSerializer, ApiCategorySerializer
 from file_manager.excel_handler import ExcelHandler
+from file_manager.excel_export import export_excel
+from file_manager.export_jobs import queue_export_job
+from file_manager.models import ExportKind
+from .exports import USER_EXPORT_COLUMNS
+from .services.user_import import import_users, IMPORT_MAX_ROWS
 from message.models import WebMessage, WebMessageType
 from message.serializers import WebMessageSerializer
 from rest_framework.pagination import PageNumberPagination
@@ -80,7 +84,7 @@ class UserViewSet(CustomMixinModelViewSet):
         'destroy': ['delete_user'],
         'activation': ['active_user'],
         **dict.fromkeys(['import_user_list', 'import_user_list_valid_field'], ['import_user_list']),
-        'download_user_list': ['download_user_list'],
+        **dict.fromkeys(['download_user_list', 'download_user_list_job'], ['download_user_list']),
         'create_address': ['create_address', 'customer_address'],
         'manually_verify_phone': ['verify_phone'],
         'web_message_list': ['message_manager'],
@@ -386,8 +390,8 @@ class UserViewSet(CustomMixinModelViewSet):
             url_path='import', serializer_class=UserImportFieldDataSerializer, filter_backends=[None], pagination_class=None)
     def import_user_list(self, request):
         """
-        MEH: Create User list from Excel File (up to 1000) (POST ACTION)
-        give any Excel file with any col and row (Handle valid col header and row data)
+        MEH: Create User list from Excel File (POST ACTION), streamed in chunks with bulk insert
+        give any Excel file with any col and row (Handle valid col header and row data), error of each row in response
         """
         check_serializer = self.get_validate_data(request.data)
         excel_file = check_serializer['excel_file']
@@ -397,20 +401,21 @@ class UserViewSet(CustomMixinModelViewSet):
             if not getattr(field, 'read_only', False)
         ]
         allowed_fields = set(UserSerializer().get_fields().keys()) # MEH: Allowed field that serializer accept
-        if getattr(check_serializer, 'role', False):
+        if check_serializer.get('role'):
             extra_fields = {'role':check_serializer['role'].pk} # MEH: Selected Role in form for all User in Excel
         else:
             extra_fields = {'role':Role.objects.filter(is_default=True).first().id}
-        user_data_list = ExcelHandler.import_excel(
+        rows = ExcelHandler.iter_import_rows(
             excel_file, allowed_fields, required_fields,
+            max_rows=IMPORT_MAX_ROWS,
             nested_fields=profile_fields,
             nested_field_category='user_profile',
             extra_fields=extra_fields,
         )
-        serializer = UserImportDataSerializer(data=user_data_list, many=True) # MEH: Change Serializer class to Validate Posted Data with Excel
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer) # MEH: Check, Validate (Raise Exception if any) & Save Data in DB 1 by 1 (CustomBulkListSerializer)
-        return Response({"detail": TG_DATA_CREATED}, status=status.HTTP_201_CREATED)
+        result = import_users(rows) # MEH: Valid rows saved even if some rows have error
+        if not result['created'] and result['errors']:
+            return Response({"detail": TG_DATA_WRONG, **result}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"detail": TG_DATA_CREATED, **result}, status=status.HTTP_201_CREATED)
 
     @extend_schema(summary = "Valid header for Import Excel")
     @action(detail=False, methods=['get'],
@@ -444,66 +449,18 @@ class UserViewSet(CustomMixinModelViewSet):
         MEH: Direct Download Excel of User List with Filter (up to 1000) (GET ACTION)
         """
         check_field = request.query_params.get('check_field')
-        queryset = self.filter_queryset(self.get_queryset())[:10000] # MEH: For apply filters/search/order like list()
-
-        persian_header = {
-            'phone_number': 'شماره موبایل',
-            'first_name': 'نام',
-            'last_name': 'نام خانوادگی',
-            'date_joined': 'تاریخ عضویت',
-            'national_id': 'کد ملی',
-            'order_count': 'تعداد سفارش‌ها',
-            'last_order_date': 'آخرین سفارش',
-            'email': 'ایمیل',
-            'province': 'استان',
-            'is_active': 'وضعیت',
-            'invite_user_count': 'تعداد معرفی‌شدگان',
-            'role': 'نقش',
-            'introduce_from': 'نحوه آشنایی',
-            'accounting_id': 'کد حسابداری',
-            'accounting_name': 'نام حسابداری',
-            'gender': 'جنسیت',
-            'job': 'شغل',
-            'credit': 'اعتبار کاربر',
-        }
-        serializer_class = UserDownloadDataSerializer
-        base_fields = list(serializer_class().get_fields().keys())
-        headers = [persian_header.get(f, f) for f in base_fields] # MEH: Get Header from Serializer
-
-        rows = []
-        for user in queryset:
-            serializer = serializer_class(user)
-            row = []
-            for field in base_fields:
-                value = serializer.data.get(field)
-
-                # Convert Gregorian to Jalali for specific fields
-                if field in ['date_joined', 'last_order_date'] and value:
-                    try:
-                        g_date = user.date_joined if field == 'date_joined' else user.last_order_date
-                        if g_date:
-                            jdate = jdatetime.datetime.fromgregorian(datetime=g_date)
-                            value = jdate.strftime('%Y/%m/%d %H:%M')
-                    except Exception:
-                        pass
-
-                # Add comma separators for numeric fields
-                if field in ['credit', 'order_count', 'invite_user_count'] and isinstance(value, (int, float)):
-                    value = f"{value:,}"
-
-                # boolean fields
-                if field in ['is_active'] and isinstance(value, bool):
-                    if value:
-                        value = 'فعال'
-                    else:
-                        value = 'غیر فعال'
-
-                # Default clean-up
-                if not value:
-                    value = '-'
-                row.append(str(value))
-            rows.append(row)
-        return ExcelHandler.generate_excel(headers, rows, file_name='users.xlsx', check_field=str(check_field))
+        queryset = self.filter_queryset(self.get_queryset()) # MEH: For apply filters/search/order like list()
+        return export_excel(queryset, USER_EXPORT_COLUMNS, file_name='users.xlsx', check_field=check_field, limit=10000)
+
+    @extend_schema(summary="Export full User list in background (same query params of download)")
+    @action(detail=False, methods=['post'],
+            url_path='download-job', serializer_class=None)
+    def download_user_list_job(self, request):
+        """
+        MEH: Queue Excel of full User List (no limit) in celery, poll progress in file-manager/export/{id}
+        """
+        job = queue_export_job(request, ExportKind.USER)
+        return Response({'detail': TG_JOB_QUEUED, 'job_id': job.pk}, status=status.HTTP_202_ACCEPTED)
 
     @extend_schema(summary="Verify User phone number manually")
     @action(detail=True, methods=['get', 'put', 'partial'],